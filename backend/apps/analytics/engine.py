@@ -0,0 +1,339 @@
+"""
+Occupancy and revenue analytics.
+
+Bookings and payments are streamed from Firestore in pages. Each page is
+converted to NumPy columns and folded into per-group accumulators with
+``bincount``/``ufunc.at``, so memory is bounded by the number of groups
+(showtimes, movies, days) rather than the number of bookings.
+
+Archiving deletes a showtime's bookings, so the archiver first stores that
+showtime's totals in ``analytics_rollups`` (see ``rollup_showtime``). Reports
+fold rollups in and ignore any hot bookings left for a rolled-up showtime.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from backend.utils.clients import get_firestore
+
+BOOKINGS_COLLECTION = 'bookings'
+PAYMENTS_COLLECTION = 'payments'
+SHOWTIMES_COLLECTION = 'showtimes'
+ROLLUPS_COLLECTION = 'analytics_rollups'
+
+BOOKING_FIELDS = ['showtime_id', 'seat_ids', 'total_amount', 'status', 'created_at', 'updated_at']
+PAYMENT_FIELDS = ['amount', 'payment_status', 'created_at']
+SHOWTIME_FIELDS = ['movie_id', 'movie_title', 'start_time', 'screen_number', 'total_seats']
+ROLLUP_FIELDS = SHOWTIME_FIELDS + [
+    'bookings', 'cancelled', 'seats_sold', 'revenue', 'first_booking', 'last_sale', 'revenue_by_day',
+]
+
+STATUS_CODES = {'pending': 0, 'confirmed': 1, 'cancelled': 2}
+
+OCCUPANCY_GROUPS = ('showtime', 'screen', 'hour')
+REVENUE_GROUPS = ('movie', 'day', 'movie_day')
+
+
+def stream_collection(collection, fields, page_size=5000):
+    """Yield pages (lists of dicts with an ``id``) of selected fields from a collection"""
+    query = (
+        get_firestore().collection(collection)
+        .select(fields)
+        .order_by('__name__')
+        .limit(page_size)
+    )
+    last = None
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        yield [{'id': doc.id, **doc.to_dict()} for doc in docs]
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def _epoch(value):
+    """Seconds since the epoch for a datetime/ISO string, NaN when missing"""
+    if value is None:
+        return float('nan')
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value.timestamp()
+
+
+def rollup_showtime(showtime, bookings):
+    """Booking totals of one showtime, stored when its bookings are archived"""
+    rollup = {field: showtime.get(field) for field in SHOWTIME_FIELDS}
+    rollup.update({
+        'bookings': 0, 'cancelled': 0, 'seats_sold': 0, 'revenue': 0.0,
+        'first_booking': None, 'last_sale': None, 'revenue_by_day': {},
+    })
+    for booking in bookings:
+        rollup['bookings'] += 1
+        created = _epoch(booking.get('created_at'))
+        if created == created and (rollup['first_booking'] is None or created < rollup['first_booking']):
+            rollup['first_booking'] = created
+        if booking.get('status') == 'cancelled':
+            rollup['cancelled'] += 1
+        if booking.get('status') != 'confirmed':
+            continue
+        amount = float(booking.get('total_amount') or 0)
+        updated = _epoch(booking.get('updated_at'))
+        if updated != updated:
+            updated = created
+        rollup['seats_sold'] += len(booking.get('seat_ids') or ())
+        rollup['revenue'] += amount
+        if updated == updated and (rollup['last_sale'] is None or updated > rollup['last_sale']):
+            rollup['last_sale'] = updated
+        # Firestore map keys are strings
+        day = str(int(updated // 86400) if updated == updated else 0)
+        rollup['revenue_by_day'][day] = rollup['revenue_by_day'].get(day, 0.0) + amount
+    return rollup
+
+
+class BookingAnalytics:
+    """Streaming accumulator for booking and payment aggregates"""
+
+    def __init__(self, showtimes, rolled_up=()):
+        import numpy as np
+
+        self.np = np
+        self.showtime_ids = [showtime['id'] for showtime in showtimes]
+        self.showtime_index = {showtime_id: i for i, showtime_id in enumerate(self.showtime_ids)}
+        n = len(self.showtime_ids) + 1  # last slot collects unknown showtimes
+
+        self.movie_ids = []
+        self.movie_titles = {}
+        movie_index = {}
+        movie_codes = []
+        # The trailing {} is the slot for bookings of unknown showtimes
+        for showtime in showtimes + [{}]:
+            movie_id = showtime.get('movie_id') or ''
+            if movie_id not in movie_index:
+                movie_index[movie_id] = len(self.movie_ids)
+                self.movie_ids.append(movie_id)
+            self.movie_titles.setdefault(movie_id, showtime.get('movie_title') or '')
+            movie_codes.append(movie_index[movie_id])
+
+        self.showtime_movie = np.array(movie_codes, dtype=np.int32)
+        self.total_seats = np.array(
+            [showtime.get('total_seats') or 0 for showtime in showtimes] + [0], dtype=np.int64
+        )
+        self.screen = np.array(
+            [showtime.get('screen_number') or 0 for showtime in showtimes] + [-1], dtype=np.int64
+        )
+        start = np.array([_epoch(showtime.get('start_time')) for showtime in showtimes] + [np.nan])
+        self.start_hour = np.where(np.isnan(start), -1, (np.nan_to_num(start) // 3600) % 24).astype(np.int64)
+
+        self.bookings = np.zeros(n, dtype=np.int64)
+        self.cancelled = np.zeros(n, dtype=np.int64)
+        self.seats_sold = np.zeros(n, dtype=np.int64)
+        self.revenue = np.zeros(n, dtype=np.float64)
+        self.first_booking = np.full(n, np.inf)
+        self.last_sale = np.full(n, -np.inf)
+
+        # Showtimes whose totals come from a rollup; their hot bookings are skipped
+        rolled_up = set(rolled_up)
+        self.rolled_up = np.array([showtime_id in rolled_up for showtime_id in self.showtime_ids] + [False])
+
+        self.movie_day_revenue = {}
+        self.payment_day_revenue = {}
+        self.rows = 0
+
+    def add_bookings(self, page):
+        """Fold one page of booking dicts into the accumulators"""
+        np = self.np
+        if not page:
+            return
+        unknown = len(self.showtime_ids)
+        showtime = np.fromiter(
+            (self.showtime_index.get(b.get('showtime_id'), unknown) for b in page),
+            dtype=np.int64, count=len(page),
+        )
+        status = np.fromiter(
+            (STATUS_CODES.get(b.get('status'), -1) for b in page), dtype=np.int8, count=len(page)
+        )
+        seats = np.fromiter((len(b.get('seat_ids') or ()) for b in page), dtype=np.int64, count=len(page))
+        amount = np.fromiter((float(b.get('total_amount') or 0) for b in page), dtype=np.float64, count=len(page))
+        created = np.fromiter((_epoch(b.get('created_at')) for b in page), dtype=np.float64, count=len(page))
+        updated = np.fromiter((_epoch(b.get('updated_at')) for b in page), dtype=np.float64, count=len(page))
+        updated = np.where(np.isnan(updated), created, updated)
+
+        hot = ~self.rolled_up[showtime]
+        if not hot.all():
+            showtime, status, seats, amount, created, updated = (
+                showtime[hot], status[hot], seats[hot], amount[hot], created[hot], updated[hot]
+            )
+
+        n = len(self.bookings)
+        confirmed = status == STATUS_CODES['confirmed']
+        self.bookings += np.bincount(showtime, minlength=n)
+        self.cancelled += np.bincount(showtime, weights=status == STATUS_CODES['cancelled'], minlength=n).astype(np.int64)
+        self.seats_sold += np.bincount(showtime, weights=seats * confirmed, minlength=n).astype(np.int64)
+        self.revenue += np.bincount(showtime, weights=amount * confirmed, minlength=n)
+        np.fmin.at(self.first_booking, showtime, np.where(np.isnan(created), np.inf, created))
+        np.fmax.at(self.last_sale, showtime[confirmed], updated[confirmed])
+
+        # Revenue by (movie, day of confirmation) for confirmed bookings
+        if confirmed.any():
+            days = (np.nan_to_num(updated[confirmed]) // 86400).astype(np.int64)
+            keys = self.showtime_movie[showtime[confirmed]].astype(np.int64) * 1_000_000 + days
+            unique, inverse = np.unique(keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=amount[confirmed])
+            for key, total in zip(unique.tolist(), sums.tolist()):
+                self.movie_day_revenue[key] = self.movie_day_revenue.get(key, 0.0) + total
+
+        self.rows += len(page)
+
+    def add_rollups(self, rollups):
+        """Fold stored totals of archived showtimes into the accumulators"""
+        unknown = len(self.showtime_ids)
+        for rollup in rollups:
+            i = self.showtime_index.get(rollup['id'], unknown)
+            self.bookings[i] += rollup.get('bookings') or 0
+            self.cancelled[i] += rollup.get('cancelled') or 0
+            self.seats_sold[i] += rollup.get('seats_sold') or 0
+            self.revenue[i] += rollup.get('revenue') or 0.0
+            if rollup.get('first_booking') is not None:
+                self.first_booking[i] = min(self.first_booking[i], rollup['first_booking'])
+            if rollup.get('last_sale') is not None:
+                self.last_sale[i] = max(self.last_sale[i], rollup['last_sale'])
+            movie = int(self.showtime_movie[i])
+            for day, amount in (rollup.get('revenue_by_day') or {}).items():
+                key = movie * 1_000_000 + int(day)
+                self.movie_day_revenue[key] = self.movie_day_revenue.get(key, 0.0) + amount
+
+    def add_payments(self, page):
+        """Fold one page of payment dicts into revenue-by-day"""
+        np = self.np
+        completed = [p for p in page if p.get('payment_status') == 'completed']
+        if not completed:
+            return
+        amount = np.fromiter((float(p.get('amount') or 0) for p in completed), dtype=np.float64)
+        days = np.fromiter((_epoch(p.get('created_at')) for p in completed), dtype=np.float64)
+        days = (np.nan_to_num(days) // 86400).astype(np.int64)
+        unique, inverse = np.unique(days, return_inverse=True)
+        sums = np.bincount(inverse, weights=amount)
+        for day, total in zip(unique.tolist(), sums.tolist()):
+            self.payment_day_revenue[day] = self.payment_day_revenue.get(day, 0.0) + total
+
+    def _grouped(self, codes, names):
+        """Sum showtime-level accumulators into the groups given by ``codes``"""
+        np = self.np
+        unique, inverse = np.unique(codes, return_inverse=True)
+        size = len(unique)
+
+        def total(values):
+            return np.bincount(inverse, weights=values, minlength=size)
+
+        bookings = total(self.bookings)
+        sold = total(self.seats_sold)
+        capacity = total(self.total_seats)
+        cancelled = total(self.cancelled)
+        revenue = total(self.revenue)
+
+        sold_out = (self.total_seats > 0) & (self.seats_sold >= self.total_seats)
+        sell_out_seconds = np.where(sold_out, self.last_sale - self.first_booking, np.nan)
+        sell_out_count = total(sold_out)
+        sell_out_sum = total(np.nan_to_num(sell_out_seconds))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fill_rate = np.where(capacity > 0, sold / capacity, np.nan)
+            cancellation_rate = np.where(bookings > 0, cancelled / bookings, np.nan)
+            time_to_sell_out = np.where(sell_out_count > 0, sell_out_sum / sell_out_count, np.nan)
+
+        rows = []
+        for i, code in enumerate(unique.tolist()):
+            if bookings[i] == 0 and capacity[i] == 0:
+                continue
+            rows.append({
+                'group': names(code),
+                'bookings': int(bookings[i]),
+                'seats_sold': int(sold[i]),
+                'capacity': int(capacity[i]),
+                'fill_rate': _round(fill_rate[i]),
+                'revenue': round(float(revenue[i]), 2),
+                'cancellation_rate': _round(cancellation_rate[i]),
+                'sold_out_showtimes': int(sell_out_count[i]),
+                'avg_time_to_sell_out_seconds': _round(time_to_sell_out[i], 0),
+            })
+        return rows
+
+    def occupancy(self, group_by='showtime'):
+        """Fill, cancellation and sell-out stats grouped by showtime, screen or start hour"""
+        np = self.np
+        if group_by == 'showtime':
+            ids = self.showtime_ids + ['unknown']
+            return self._grouped(np.arange(len(ids)), lambda code: ids[code])
+        if group_by == 'screen':
+            return self._grouped(self.screen, lambda code: code if code >= 0 else 'unknown')
+        if group_by == 'hour':
+            return self._grouped(self.start_hour, lambda code: code if code >= 0 else 'unknown')
+        raise ValueError(f'group_by must be one of {OCCUPANCY_GROUPS}')
+
+    def revenue_report(self, group_by='movie'):
+        """Confirmed revenue grouped by movie, day or movie and day"""
+        totals = {}
+        for key, amount in self.movie_day_revenue.items():
+            movie, day = divmod(key, 1_000_000)
+            movie_id = self.movie_ids[movie]
+            if group_by == 'movie':
+                group = (movie_id,)
+            elif group_by == 'day':
+                group = (day,)
+            elif group_by == 'movie_day':
+                group = (movie_id, day)
+            else:
+                raise ValueError(f'group_by must be one of {REVENUE_GROUPS}')
+            totals[group] = totals.get(group, 0.0) + amount
+
+        rows = []
+        for group, amount in sorted(totals.items()):
+            row = {}
+            if group_by in ('movie', 'movie_day'):
+                row['movie_id'] = group[0]
+                row['movie_title'] = self.movie_titles.get(group[0], '')
+            if group_by in ('day', 'movie_day'):
+                day = group[-1]
+                row['day'] = date.fromordinal(day + date(1970, 1, 1).toordinal()).isoformat()
+                if group_by == 'day':
+                    row['payments'] = round(self.payment_day_revenue.get(day, 0.0), 2)
+            row['revenue'] = round(amount, 2)
+            rows.append(row)
+        return rows
+
+
+def _round(value, digits=4):
+    value = float(value)
+    if value != value:  # NaN
+        return None
+    return round(value, digits) if digits else int(value)
+
+
+def build_report(page_size=5000, include_payments=True):
+    """Stream showtimes, rollups, bookings and payments from storage into a ``BookingAnalytics``"""
+    showtimes = [
+        showtime
+        for page in stream_collection(SHOWTIMES_COLLECTION, SHOWTIME_FIELDS, page_size)
+        for showtime in page
+    ]
+    rollups = [
+        rollup
+        for page in stream_collection(ROLLUPS_COLLECTION, ROLLUP_FIELDS, page_size)
+        for rollup in page
+    ]
+    # A showtime interrupted mid-archive can be both hot and rolled up
+    hot_ids = {showtime['id'] for showtime in showtimes}
+    analytics = BookingAnalytics(
+        showtimes + [rollup for rollup in rollups if rollup['id'] not in hot_ids],
+        rolled_up=[rollup['id'] for rollup in rollups],
+    )
+    analytics.add_rollups(rollups)
+    for page in stream_collection(BOOKINGS_COLLECTION, BOOKING_FIELDS, page_size):
+        analytics.add_bookings(page)
+    if include_payments:
+        for page in stream_collection(PAYMENTS_COLLECTION, PAYMENT_FIELDS, page_size):
+            analytics.add_payments(page)
+    return analytics
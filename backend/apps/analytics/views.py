@@ -0,0 +1,78 @@
+from django.conf import settings
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from backend.apps.analytics import engine
+from backend.utils.cache import TTLCache
+
+# Reports scan every booking, so one built report is shared for a short while,
+# and requests arriving while it is built wait for that build rather than starting their own
+_reports = TTLCache(maxsize=1, ttl=getattr(settings, 'ANALYTICS_CACHE_TTL', 300))
+
+
+def get_report():
+    return _reports.get_or_set('report', lambda: engine.build_report(
+        page_size=getattr(settings, 'ANALYTICS_PAGE_SIZE', 5000)
+    ))
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        """Get headline totals across all showtimes"""
+        try:
+            report = get_report()
+            totals = report.occupancy('screen')
+            return Response({
+                'bookings': sum(row['bookings'] for row in totals),
+                'seats_sold': sum(row['seats_sold'] for row in totals),
+                'revenue': round(sum(row['revenue'] for row in totals), 2),
+                'rows_scanned': report.rows,
+            })
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        """Get fill rate, cancellation rate and time to sell out by showtime, screen or hour"""
+        group_by = request.query_params.get('group_by', 'showtime')
+        if group_by not in engine.OCCUPANCY_GROUPS:
+            return Response(
+                {'error': f'group_by must be one of {", ".join(engine.OCCUPANCY_GROUPS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            return Response(get_report().occupancy(group_by))
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        """Get confirmed revenue by movie, day or movie and day"""
+        group_by = request.query_params.get('group_by', 'movie')
+        if group_by not in engine.REVENUE_GROUPS:
+            return Response(
+                {'error': f'group_by must be one of {", ".join(engine.REVENUE_GROUPS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            return Response(get_report().revenue_report(group_by))
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'])
+    def refresh(self, request):
+        """Discard the cached report so the next request rebuilds it"""
+        _reports.clear()
+        return Response({'status': 'report cleared'})
@@ -0,0 +1,191 @@
+"""
+Move finished showtimes and their bookings from Firestore to cold segments.
+
+For each page of showtimes that ended more than ``older_than`` ago:
+
+1. each showtime's booking totals are stored in ``analytics_rollups`` so
+   analytics keep counting them;
+2. their bookings (any status) are written to bookings segments of at most
+   ``ARCHIVE_SEGMENT_RECORDS`` records;
+3. the showtimes, with seat maps collapsed to final counts, are written to
+   showtimes segments;
+4. batches then delete the hot documents and write one pointer per record
+   to ``archive_index``, with the byte range of the record's block. Seat
+   documents, ledger events, snapshots and heads of the archived showtimes
+   are deleted too.
+
+Segments are written before anything is deleted, so an interrupted run at
+worst leaves an unreferenced segment and is safe to repeat.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend.apps.analytics import engine
+from backend.apps.archive.loader import INDEX_COLLECTION, BOOKINGS, SHOWTIMES, pointer_id
+from backend.apps.archive.storage import get_store, encode_segment
+from backend.apps.movies import layouts, seat_ledger
+from backend.utils.clients import get_firestore
+
+MAX_BATCH_WRITES = 500
+MAX_IN_FILTER = 30
+SEAT_SUBCOLLECTIONS = ['seats', seat_ledger.EVENTS_COLLECTION, seat_ledger.SNAPSHOTS_COLLECTION]
+
+
+def collapse_showtime(showtime):
+    """A finished showtime with its seat map replaced by final per-status counts"""
+    materialized = layouts.materialize(showtime) or showtime
+    counts = {}
+    for seat in materialized.get('seats', []):
+        counts[seat.get('status', 'available')] = counts.get(seat.get('status', 'available'), 0) + 1
+    collapsed = {key: value for key, value in materialized.items() if key not in ('seats', 'seat_overlay')}
+    collapsed['final_counts'] = counts
+    return collapsed
+
+
+class Archiver:
+
+    def __init__(self, older_than=timedelta(days=7), segment_size=2000, segment_records=None, dry_run=False):
+        self.older_than = older_than
+        self.segment_size = segment_size
+        self.segment_records = segment_records or getattr(settings, 'ARCHIVE_SEGMENT_RECORDS', 5000)
+        self.dry_run = dry_run
+        self.db = get_firestore()
+        self.report = {
+            'showtimes': 0, 'bookings': 0, 'segments': 0, 'deleted_docs': 0,
+            'raw_bytes': 0, 'compressed_bytes': 0, 'seconds': 0.0,
+        }
+
+    def run(self):
+        started = time.perf_counter()
+        cutoff = timezone.now() - self.older_than
+        query = (
+            self.db.collection(SHOWTIMES)
+            .where('end_time', '<', cutoff)
+            .order_by('end_time')
+            .limit(self.segment_size)
+        )
+        last = None
+        while True:
+            # Archived showtimes are deleted, so re-running the query pages
+            # forward; a dry run deletes nothing and needs a cursor
+            docs = list((query.start_after(last) if last is not None else query).stream())
+            if not docs:
+                break
+            self.archive_page([{'id': doc.id, **doc.to_dict()} for doc in docs])
+            if len(docs) < self.segment_size:
+                break
+            if self.dry_run:
+                last = docs[-1]
+        self.report['seconds'] = round(time.perf_counter() - started, 3)
+        return self.report
+
+    def archive_page(self, showtimes):
+        showtime_ids = [showtime['id'] for showtime in showtimes]
+        bookings = self.bookings_for(showtime_ids)
+        collapsed = [collapse_showtime(showtime) for showtime in showtimes]
+
+        self.report['showtimes'] += len(showtimes)
+        self.report['bookings'] += len(bookings)
+        if self.dry_run:
+            return
+
+        self.write_rollups(showtimes, bookings)
+        # Bookings first: until their showtime moves, readers still find it hot
+        if bookings:
+            locations = self.write_segments(BOOKINGS, bookings)
+            self.move(BOOKINGS, bookings, locations, lambda booking: {
+                'user_id': booking.get('user_id'),
+                'showtime_id': booking.get('showtime_id'),
+            })
+        locations = self.write_segments(SHOWTIMES, collapsed)
+        self.move(SHOWTIMES, collapsed, locations, lambda showtime: {'movie_id': showtime.get('movie_id')})
+        self.delete_seat_data(showtime_ids)
+
+    def bookings_for(self, showtime_ids):
+        bookings = []
+        for i in range(0, len(showtime_ids), MAX_IN_FILTER):
+            query = self.db.collection(BOOKINGS).where('showtime_id', 'in', showtime_ids[i:i + MAX_IN_FILTER])
+            bookings.extend({'id': doc.id, **doc.to_dict()} for doc in query.stream())
+        return bookings
+
+    def write_rollups(self, showtimes, bookings):
+        """
+        Store each showtime's booking totals for analytics.
+
+        A repeated run after an interrupted one keeps the totals it wrote
+        before, since some of the showtime's bookings may already be gone.
+        """
+        by_showtime = {}
+        for booking in bookings:
+            by_showtime.setdefault(booking.get('showtime_id'), []).append(booking)
+        rollups = self.db.collection(engine.ROLLUPS_COLLECTION)
+        existing = {
+            doc.id for doc in self.db.get_all([rollups.document(showtime['id']) for showtime in showtimes])
+            if doc.exists
+        }
+        pending = [showtime for showtime in showtimes if showtime['id'] not in existing]
+        for i in range(0, len(pending), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for showtime in pending[i:i + MAX_BATCH_WRITES]:
+                batch.set(
+                    rollups.document(showtime['id']),
+                    engine.rollup_showtime(showtime, by_showtime.get(showtime['id'], []))
+                )
+            batch.commit()
+
+    def write_segments(self, kind, records):
+        """Write ``records`` in segments of at most ``segment_records``; returns each record's location"""
+        locations = {}
+        for i in range(0, len(records), self.segment_records):
+            locations.update(self.write_segment(kind, records[i:i + self.segment_records]))
+        return locations
+
+    def write_segment(self, kind, records):
+        name = f"{kind}/{timezone.now():%Y%m%d}-{uuid.uuid4().hex[:12]}.jsonl.gz"
+        data, blocks, raw_bytes = encode_segment(records)
+        get_store().put(name, data)
+        self.report['segments'] += 1
+        self.report['compressed_bytes'] += len(data)
+        self.report['raw_bytes'] += raw_bytes
+        return {
+            record_id: {'segment': name, 'offset': offset, 'length': length}
+            for record_id, (offset, length) in blocks.items()
+        }
+
+    def move(self, kind, records, locations, pointer_fields):
+        """Delete hot documents and point their ids at their segment blocks, two writes per record"""
+        collection = self.db.collection(kind)
+        index = self.db.collection(INDEX_COLLECTION)
+        archived_at = timezone.now()
+        for i in range(0, len(records), MAX_BATCH_WRITES // 2):
+            batch = self.db.batch()
+            for record in records[i:i + MAX_BATCH_WRITES // 2]:
+                batch.delete(collection.document(record['id']))
+                batch.set(index.document(pointer_id(kind, record['id'])), {
+                    'kind': kind,
+                    'record_id': record['id'],
+                    **locations[record['id']],
+                    'archived_at': archived_at,
+                    **pointer_fields(record),
+                })
+            batch.commit()
+        self.report['deleted_docs'] += len(records)
+
+    def delete_seat_data(self, showtime_ids):
+        refs = []
+        for showtime_id in showtime_ids:
+            showtime_ref = self.db.collection(SHOWTIMES).document(showtime_id)
+            for name in SEAT_SUBCOLLECTIONS:
+                refs.extend(showtime_ref.collection(name).list_documents())
+            refs.append(self.db.collection(seat_ledger.HEADS_COLLECTION).document(showtime_id))
+
+        for i in range(0, len(refs), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for ref in refs[i:i + MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
+        self.report['deleted_docs'] += len(refs)
@@ -0,0 +1,106 @@
+"""
+Lazy, cached access to archived records.
+
+Each archived record leaves a small pointer document in ``archive_index``
+naming the segment that holds it and the byte range of its block. Looking a
+record up reads the pointer, then only that block, which is decoded once and
+kept in a per-process LRU cache, so neighbouring records are served from
+memory. Pointers written before segments had blocks fall back to reading
+the whole segment.
+"""
+import copy
+
+from django.conf import settings
+
+from backend.apps.archive.storage import get_store, decode_segment
+from backend.utils.cache import TTLCache
+from backend.utils.clients import get_firestore
+
+INDEX_COLLECTION = 'archive_index'
+BOOKINGS = 'bookings'
+SHOWTIMES = 'showtimes'
+
+
+def pointer_id(kind, record_id):
+    return f'{kind}:{record_id}'
+
+
+class ArchiveLoader:
+
+    def __init__(self, store=None, segment_cache_size=32, block_cache_size=1024, ttl=3600):
+        self._store = store
+        self.segments = TTLCache(maxsize=segment_cache_size, ttl=ttl)
+        self.blocks = TTLCache(maxsize=block_cache_size, ttl=ttl)
+        self.pointers = TTLCache(maxsize=10000, ttl=ttl)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def segment(self, name):
+        return self.segments.get_or_set(name, lambda: decode_segment(self.store.get(name)))
+
+    def block(self, name, offset, length):
+        return self.blocks.get_or_set(
+            (name, offset), lambda: decode_segment(self.store.get_range(name, offset, length))
+        )
+
+    def records(self, pointer):
+        """The decoded records of the block (or whole segment) a pointer names"""
+        if pointer.get('offset') is None:
+            return self.segment(pointer['segment'])
+        return self.block(pointer['segment'], pointer['offset'], pointer['length'])
+
+    def pointer(self, kind, record_id):
+        def load():
+            doc = get_firestore().collection(INDEX_COLLECTION).document(pointer_id(kind, record_id)).get()
+            return doc.to_dict() if doc.exists else None
+        return self.pointers.get_or_set(pointer_id(kind, record_id), load)
+
+    def get(self, kind, record_id):
+        """An archived record by id, or None"""
+        pointer = self.pointer(kind, record_id)
+        if pointer is None:
+            return None
+        record = self.records(pointer).get(record_id)
+        return copy.deepcopy(record) if record is not None else None
+
+    def get_user_bookings(self, user_id):
+        """All of a user's archived bookings"""
+        query = (
+            get_firestore().collection(INDEX_COLLECTION)
+            .where('kind', '==', BOOKINGS)
+            .where('user_id', '==', user_id)
+        )
+        by_block = {}
+        for doc in query.stream():
+            pointer = doc.to_dict()
+            key = (pointer['segment'], pointer.get('offset'))
+            by_block.setdefault(key, (pointer, []))[1].append(pointer['record_id'])
+
+        bookings = []
+        for pointer, record_ids in by_block.values():
+            records = self.records(pointer)
+            bookings.extend(copy.deepcopy(records[record_id]) for record_id in record_ids if record_id in records)
+        return bookings
+
+
+loader = ArchiveLoader(
+    segment_cache_size=getattr(settings, 'ARCHIVE_CACHE_SEGMENTS', 32),
+    block_cache_size=getattr(settings, 'ARCHIVE_CACHE_BLOCKS', 1024),
+    ttl=getattr(settings, 'ARCHIVE_CACHE_TTL', 3600),
+)
+
+
+def get_booking(booking_id):
+    return loader.get(BOOKINGS, booking_id)
+
+
+def get_showtime(showtime_id):
+    return loader.get(SHOWTIMES, showtime_id)
+
+
+def get_user_bookings(user_id):
+    return loader.get_user_bookings(user_id)
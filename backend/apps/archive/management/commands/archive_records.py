@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.apps.archive.archiver import Archiver
+
+
+class Command(BaseCommand):
+    help = 'Move finished showtimes and their bookings to compressed cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=None, metavar='DAYS',
+                            help='Archive showtimes that ended this many days ago (default ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--segment-size', type=int, default=2000,
+                            help='Showtimes per page (their bookings go in segments of ARCHIVE_SEGMENT_RECORDS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would be archived without writing anything')
+
+    def handle(self, *args, **options):
+        older_than = options['older_than']
+        if older_than is None:
+            older_than = settings.ARCHIVE_AFTER_DAYS
+
+        report = Archiver(
+            older_than=timedelta(days=older_than),
+            segment_size=options['segment_size'],
+            dry_run=options['dry_run'],
+        ).run()
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Would archive {report['showtimes']} showtimes and {report['bookings']} bookings"
+            )
+            return
+
+        ratio = report['raw_bytes'] / report['compressed_bytes'] if report['compressed_bytes'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {report['showtimes']} showtimes and {report['bookings']} bookings into "
+            f"{report['segments']} segments ({report['compressed_bytes'] / 1024:.0f} KiB, {ratio:.1f}x compression); "
+            f"deleted {report['deleted_docs']} hot documents in {report['seconds']:.1f}s"
+        ))
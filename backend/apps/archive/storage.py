@@ -0,0 +1,118 @@
+"""
+Cold storage for archived records.
+
+Records are written in immutable segments: JSON lines, one record per line,
+sorted by id. Each block of ``BLOCK_RECORDS`` lines is compressed as its own
+gzip member, so a segment is still one valid gzip file, but a single record
+can be read by fetching just its block. Segments live in a Cloud Storage bucket when
+``ARCHIVE_BUCKET`` is set (normally the Firebase project's bucket) and under
+``ARCHIVE_DIR`` on local disk otherwise.
+"""
+import gzip
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from backend.utils.clients import get_firebase_app
+
+BLOCK_RECORDS = 64
+
+
+class LocalSegmentStore:
+
+    def __init__(self, root):
+        self.root = root
+
+    def put(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def get_range(self, name, offset, length):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class BucketSegmentStore:
+
+    def __init__(self, bucket_name):
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from firebase_admin import storage
+            self._bucket = storage.bucket(self.bucket_name, app=get_firebase_app())
+        return self._bucket
+
+    def put(self, name, data):
+        self.bucket.blob(f'archive/{name}').upload_from_string(data, content_type='application/gzip')
+
+    def get(self, name):
+        return self.bucket.blob(f'archive/{name}').download_as_bytes()
+
+    def get_range(self, name, offset, length):
+        # ``end`` is inclusive
+        return self.bucket.blob(f'archive/{name}').download_as_bytes(start=offset, end=offset + length - 1)
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                bucket = getattr(settings, 'ARCHIVE_BUCKET', None)
+                _store = BucketSegmentStore(bucket) if bucket else LocalSegmentStore(settings.ARCHIVE_DIR)
+    return _store
+
+
+def encode_segment(records, block_records=BLOCK_RECORDS):
+    """
+    Serialise records (dicts with an ``id``) into a compressed segment.
+
+    Returns ``(data, blocks, raw_bytes)``: ``blocks`` maps each record id to
+    the ``(offset, length)`` of the block holding it and ``raw_bytes`` is the
+    uncompressed size.
+    """
+    records = sorted(records, key=lambda record: record['id'])
+    data = bytearray()
+    blocks = {}
+    raw_bytes = 0
+    for start in range(0, len(records), block_records):
+        chunk = records[start:start + block_records]
+        raw = ''.join(
+            json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':'), sort_keys=True) + '\n'
+            for record in chunk
+        ).encode()
+        member = gzip.compress(raw, compresslevel=9)
+        for record in chunk:
+            blocks[record['id']] = (len(data), len(member))
+        data += member
+        raw_bytes += len(raw)
+    return bytes(data), blocks, raw_bytes
+
+
+def decode_segment(data):
+    """Map record id -> record for a compressed segment or one of its blocks"""
+    records = {}
+    for line in gzip.decompress(data).decode().splitlines():
+        if line:
+            record = json.loads(line)
+            records[record['id']] = record
+    return records
@@ -0,0 +1,307 @@
+"""
+Create, confirm or cancel many bookings, across showtimes, in one request.
+
+Instead of one round of reads and writes per booking:
+
+- bookings and showtimes are read with a single ``get_all`` each;
+- seats are held, booked or released with one ``apply_seat_group`` command
+  per showtime, however many bookings it covers;
+- booking, summary and payment documents are written in one Firestore batch
+  (a transaction for confirmations, see ``payments.record_payments``), which
+  ``limits.MAX_ITEMS`` keeps under the 500-write limit.
+
+Seats are held or booked before bookings are created or confirmed, so an item
+whose seats could not be taken leaves its booking as it was; cancellations go
+the other way round, see ``cancel_bookings``. Every item gets its own result,
+``{'index', 'booking_id', 'status_code', ...}`` with ``result`` on success or
+``error`` otherwise, so one taken seat does not fail the rest of the order.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend.apps.bookings import payments, summaries, tasks
+from backend.apps.movies.seat_sharding import apply_seat_group, HOLD, BOOK, RELEASE, EXPIRE
+from backend.utils.clients import get_firestore, get_stripe
+from backend.utils.firebase_utils import FirestoreService
+from backend.utils.resilience import dependency, DependencyUnavailable, on_late_success
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_COLLECTION = 'bookings'
+SHOWTIMES_COLLECTION = 'showtimes'
+
+
+
+def _result(item, status_code, **fields):
+    return {'index': item['index'], 'booking_id': item.get('booking_id'), 'status_code': status_code, **fields}
+
+
+def _get_all(collection, doc_ids):
+    """``{doc_id: document}`` for the documents that exist, read in one call"""
+    db = get_firestore()
+    refs = [db.collection(collection).document(doc_id) for doc_id in dict.fromkeys(doc_ids)]
+    return {doc.id: {'id': doc.id, **doc.to_dict()} for doc in db.get_all(refs) if doc.exists}
+
+
+def _load_showtimes(showtime_ids):
+    showtimes = _get_all(SHOWTIMES_COLLECTION, showtime_ids)
+    for showtime in showtimes.values():
+        # Summaries need the title; look each movie up once rather than per booking
+        if not showtime.get('movie_title') and showtime.get('movie_id'):
+            showtime['movie_title'] = (FirestoreService.get_movie(showtime['movie_id']) or {}).get('title', '')
+    return showtimes
+
+
+def _load_bookings(user_id, booking_ids, results):
+    """Items for the caller's bookings; sets 404/403 results for the rest"""
+    bookings = _get_all(BOOKINGS_COLLECTION, booking_ids)
+    items = []
+    for index, booking_id in enumerate(booking_ids):
+        item = {'index': index, 'booking_id': booking_id}
+        booking = bookings.get(booking_id)
+        if booking is None:
+            results[index] = _result(item, 404, error='Booking not found')
+        elif booking.get('user_id') != user_id:
+            results[index] = _result(item, 403, error='Not authorized to modify this booking')
+        else:
+            items.append({**item, 'booking': booking,
+                          'showtime_id': booking['showtime_id'], 'seat_ids': booking['seat_ids']})
+    return items
+
+
+def _apply_seats(command, items, user_id, results):
+    """One seat command per showtime; returns the items it applied to and sets results for the rest"""
+    by_showtime = {}
+    for item in items:
+        by_showtime.setdefault(item['showtime_id'], []).append(item)
+
+    applied = []
+    for showtime_id, group in by_showtime.items():
+        try:
+            conflicts = dependency('seats').call(
+                apply_seat_group, showtime_id, command,
+                [(item['booking_id'], item['seat_ids']) for item in group],
+                user_id=user_id
+            )
+        except DependencyUnavailable as e:
+            if command == HOLD:
+                # The abandoned hold may still land, for bookings that will never be written
+                on_late_success(e, lambda conflicts, showtime_id=showtime_id, group=group: _expire_late_hold(
+                    showtime_id, group, conflicts, user_id
+                ))
+            for item in group:
+                results[item['index']] = _result(item, 503, error=str(e), retry_after=e.retry_after)
+            continue
+        except Exception as e:
+            logger.warning('Seat %s failed for showtime %s: %s', command, showtime_id, e)
+            for item in group:
+                results[item['index']] = _result(item, 500, error=str(e))
+            continue
+        for item in group:
+            if item['booking_id'] in conflicts:
+                results[item['index']] = _result(
+                    item, 409, error='Seats are not available', seat_ids=conflicts[item['booking_id']]
+                )
+            else:
+                applied.append(item)
+    return applied
+
+
+def _expire_late_hold(showtime_id, group, conflicts, user_id):
+    held = [(item['booking_id'], item['seat_ids']) for item in group if item['booking_id'] not in conflicts]
+    if held:
+        apply_seat_group(showtime_id, EXPIRE, held, user_id=user_id)
+
+
+def _release_quietly(items, user_id):
+    try:
+        _apply_seats(RELEASE, items, user_id, {})
+    except Exception as e:
+        logger.error('Could not release seats after a failed bulk write: %s', e)
+
+
+def create_bookings(user_id, requests):
+    """
+    Create bookings for validated ``requests`` (``showtime_id``, ``seat_ids``,
+    ``total_amount``), holding their seats.
+
+    Seats are held first under pre-allocated booking ids, and only bookings
+    whose seats were held are written, so failed items leave nothing behind;
+    a hold given up at the seats deadline is expired if it lands later.
+    """
+    results = [None] * len(requests)
+    db = get_firestore()
+    bookings_ref = db.collection(BOOKINGS_COLLECTION)
+    showtimes = dependency('catalog').call(_load_showtimes, [request['showtime_id'] for request in requests])
+
+    items = []
+    for index, request in enumerate(requests):
+        item = {'index': index, **request}
+        if request['showtime_id'] not in showtimes:
+            results[index] = _result(item, 404, error='Showtime not found')
+            continue
+        items.append({**item, 'booking_id': bookings_ref.document().id})
+
+    held = _apply_seats(HOLD, items, user_id, results)
+    # Ids of bookings that were never written mean nothing to the caller
+    for item in items:
+        if results[item['index']] is not None:
+            results[item['index']]['booking_id'] = None
+    if not held:
+        return results
+
+    now = timezone.now()
+    batch = db.batch()
+    created = []
+    for item in held:
+        booking = {
+            'user_id': user_id,
+            'showtime_id': item['showtime_id'],
+            'seat_ids': item['seat_ids'],
+            'total_amount': float(item['total_amount']),
+            'status': 'pending',
+            'payment_status': 'pending',
+            'created_at': now,
+            'updated_at': now,
+        }
+        batch.set(bookings_ref.document(item['booking_id']), booking)
+        summaries.save_summary({'id': item['booking_id'], **booking}, showtimes[item['showtime_id']], batch=batch)
+        created.append((item, {'id': item['booking_id'], **booking}))
+    try:
+        batch.commit()
+    except Exception as e:
+        _release_quietly(held, user_id)
+        for item in held:
+            results[item['index']] = _result(item, 500, error=str(e))
+        return results
+
+    for item, booking in created:
+        results[item['index']] = _result(item, 201, booking=booking)
+    return results
+
+
+def confirm_bookings(user_id, booking_ids):
+    """Confirm paid bookings: check their PaymentIntents, book the seats and record the payments"""
+    results = [None] * len(booking_ids)
+    items = []
+    for item in _load_bookings(user_id, booking_ids, results):
+        booking = item['booking']
+        if booking['status'] == 'confirmed':
+            results[item['index']] = _result(item, 200, result='payment confirmed')
+        elif booking['status'] == 'cancelled':
+            results[item['index']] = _result(item, 400, error='Booking is cancelled')
+        elif not booking.get('payment_intent_id'):
+            results[item['index']] = _result(item, 400, error='No payment intent found for this booking')
+        else:
+            items.append(item)
+    if not items:
+        return results
+
+    def retrieve(item):
+        try:
+            return dependency('payments').call(get_stripe().PaymentIntent.retrieve, item['booking']['payment_intent_id'])
+        except Exception as e:
+            return e
+
+    concurrency = getattr(settings, 'BOOKING_BULK_CONCURRENCY', 8)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+        intents = list(pool.map(retrieve, items))
+
+    paid = []
+    for item, intent in zip(items, intents):
+        if isinstance(intent, DependencyUnavailable):
+            results[item['index']] = _result(item, 503, error=str(intent), retry_after=intent.retry_after)
+        elif isinstance(intent, Exception):
+            results[item['index']] = _result(item, 500, error=str(intent))
+        elif intent.status != 'succeeded':
+            results[item['index']] = _result(item, 400, error='Payment not succeeded')
+        else:
+            paid.append({**item, 'intent': intent})
+
+    booked = _apply_seats(BOOK, paid, user_id, results)
+    if not booked:
+        return results
+
+    try:
+        confirmed = set(payments.record_payments({item['booking_id']: item['intent'] for item in booked}))
+    except Exception as e:
+        # Seats stay booked; the payment reconciler confirms these bookings later
+        logger.error('Bulk confirmation write failed for %d bookings: %s', len(booked), e)
+        for item in booked:
+            results[item['index']] = _result(item, 500, error=str(e))
+        return results
+
+    # Bookings confirmed or cancelled concurrently were left alone
+    raced = _get_all(BOOKINGS_COLLECTION, [item['booking_id'] for item in booked if item['booking_id'] not in confirmed])
+    lost = []
+    for item in booked:
+        if item['booking_id'] not in confirmed:
+            if raced.get(item['booking_id'], {}).get('status') == 'confirmed':
+                results[item['index']] = _result(item, 200, result='payment confirmed')
+            else:
+                results[item['index']] = _result(item, 400, error='Booking is cancelled')
+                lost.append(item)
+            continue
+        results[item['index']] = _result(item, 200, result='payment confirmed')
+        tasks.enqueue_post_payment(item['booking_id'])
+    if lost:
+        # The cancellation may have released the seats before they were booked here
+        _release_quietly(lost, user_id)
+    return results
+
+
+def cancel_bookings(user_id, booking_ids):
+    """
+    Cancel pending bookings and release their seats.
+
+    Bookings are cancelled first, through ``payments.cancel_pending``, and
+    seats are released only for bookings that ended up cancelled, so a booking
+    confirmed concurrently keeps its seats. Cancelling an already cancelled
+    booking releases its seats again, which finishes a release that failed.
+    """
+    results = [None] * len(booking_ids)
+    items = []
+    for item in _load_bookings(user_id, booking_ids, results):
+        if item['booking']['status'] == 'confirmed':
+            results[item['index']] = _result(item, 400, error='Cannot cancel confirmed booking')
+        else:
+            items.append(item)
+    if not items:
+        return results
+
+    pending = [item for item in items if item['booking']['status'] == 'pending']
+    try:
+        cancelled = set(payments.cancel_pending([item['booking_id'] for item in pending]))
+    except Exception as e:
+        logger.error('Bulk cancellation write failed for %d bookings: %s', len(pending), e)
+        for item in pending:
+            results[item['index']] = _result(item, 500, error=str(e))
+        pending, cancelled = [], set()
+
+    # Bookings confirmed concurrently keep their seats
+    raced = _get_all(BOOKINGS_COLLECTION, [
+        item['booking_id'] for item in pending if item['booking_id'] not in cancelled
+    ])
+    for item in pending:
+        if raced.get(item['booking_id'], {}).get('status') == 'confirmed':
+            results[item['index']] = _result(item, 400, error='Cannot cancel confirmed booking')
+    items = [item for item in items if results[item['index']] is None]
+
+    released = _apply_seats(RELEASE, items, user_id, results)
+    # Seats another booking has taken since are no longer this booking's to free
+    remaining = []
+    for item in items:
+        result = results[item['index']]
+        if result is not None and result['status_code'] == 409:
+            remaining.append({**item, 'seat_ids': [
+                seat_id for seat_id in item['seat_ids'] if seat_id not in result['seat_ids']
+            ]})
+    released.extend(item for item in remaining if not item['seat_ids'])
+    released.extend(_apply_seats(RELEASE, [item for item in remaining if item['seat_ids']], user_id, results))
+
+    for item in released:
+        results[item['index']] = _result(item, 200, result='booking cancelled')
+    return results
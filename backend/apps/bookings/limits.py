@@ -0,0 +1,6 @@
+"""Request size limits shared by the bulk booking endpoints and their serializers."""
+from django.conf import settings
+
+MAX_BATCH_WRITES = 500
+# Confirming writes three documents per booking
+MAX_ITEMS = min(getattr(settings, 'BOOKING_BULK_MAX_ITEMS', 100), MAX_BATCH_WRITES // 3)
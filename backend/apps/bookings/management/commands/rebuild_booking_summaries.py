@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from backend.apps.bookings import summaries
+from backend.utils.clients import get_firestore
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user booking summary projection from bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users',
+                            help='User id to rebuild (repeatable); defaults to all users')
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if not user_ids:
+            user_ids = (
+                doc.id for doc in
+                get_firestore().collection(summaries.USERS_COLLECTION).list_documents()
+            )
+
+        users = bookings = 0
+        for user_id in user_ids:
+            bookings += len(summaries.rebuild_user_summaries(user_id))
+            users += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {bookings} booking summaries for {users} users'
+        ))
@@ -0,0 +1,48 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from backend.apps.bookings.reconciliation import Reconciler
+
+
+class Command(BaseCommand):
+    help = 'Confirm or release pending bookings according to their Stripe PaymentIntents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=500,
+                            help='Pending bookings read per Firestore page')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Concurrent Stripe requests')
+        parser.add_argument('--abandon-after', type=float, default=60, metavar='MINUTES',
+                            help='Cancel intents still awaiting payment after this long')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing anything')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = Reconciler(
+            page_size=options['page_size'],
+            concurrency=options['concurrency'],
+            abandon_after=timedelta(minutes=options['abandon_after']),
+            dry_run=options['dry_run'],
+        ).run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        timings = ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in report['timings'].items())
+        prefix = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            f"Scanned {report['scanned']} pending bookings, {report['with_intent']} with a payment intent "
+            f"({report['missing_intents']} intents not found in Stripe)"
+        )
+        for conflict in report['conflicts']:
+            self.stderr.write(
+                f"Booking {conflict['booking_id']} paid but seats unavailable: {', '.join(conflict['seat_ids'])}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: {report['confirmed']} confirmed, {report['released']} released, "
+            f"{report['abandoned']} abandoned; {report['unchanged']} unchanged [{timings}]"
+        ))
@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.apps.bookings import tickets
+
+
+class Command(BaseCommand):
+    help = 'Pre-render tickets for every confirmed booking of one or more showtimes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--showtime', action='append', dest='showtimes',
+                            help='Showtime id to render (repeatable)')
+        parser.add_argument('--starting-within', type=float, metavar='HOURS',
+                            help='Render every showtime starting in the next HOURS hours')
+        parser.add_argument('--format', choices=sorted(tickets.FORMATS), default='png', dest='fmt')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Render processes (defaults to TICKET_RENDER_PROCESSES or one per CPU)')
+
+    def handle(self, *args, **options):
+        showtime_ids = list(options['showtimes'] or [])
+        if options['starting_within'] is not None:
+            showtime_ids += tickets.upcoming_showtime_ids(timedelta(hours=options['starting_within']))
+        if not showtime_ids:
+            raise CommandError('Pass --showtime or --starting-within')
+
+        rendered = cached = 0
+        started = time.perf_counter()
+        for showtime_id in dict.fromkeys(showtime_ids):
+            try:
+                result = tickets.render_showtime(showtime_id, options['fmt'], options['processes'])
+            except ValueError as e:
+                self.stderr.write(str(e))
+                continue
+            rendered += result['rendered']
+            cached += result['cached']
+            self.stdout.write(
+                f"{showtime_id}: {result['rendered']} rendered, {result['cached']} already cached"
+            )
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} tickets ({cached} cached) in {elapsed:.1f}s ({rate:.1f} tickets/s)'
+        ))
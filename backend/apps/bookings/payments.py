@@ -0,0 +1,92 @@
+"""
+Booking transitions that several paths can race on.
+
+A paid booking can be confirmed by ``confirm_payment``, by bulk confirmation
+and by the payment reconciler at the same time. ``record_payments`` confirms
+bookings and writes their payments in one transaction, only for bookings that
+are still ``pending``, and keys each payment by its PaymentIntent id, so
+racing confirmations produce a single payment and only the winner queues the
+follow-up tasks. ``cancel_pending`` does the same for cancellations.
+"""
+from django.utils import timezone
+
+from backend.apps.bookings import summaries
+from backend.utils.clients import get_firestore
+
+BOOKINGS_COLLECTION = 'bookings'
+PAYMENTS_COLLECTION = 'payments'
+
+MAX_TRANSACTION_WRITES = 500
+
+
+def _transition(booking_ids, fields, extra_writes=None, writes_per_booking=2):
+    """
+    Apply ``fields`` to those of ``booking_ids`` still pending; returns their ids.
+
+    ``extra_writes(transaction, booking, now)`` adds writes for each booking
+    that is transitioned, in the same transaction.
+    """
+    from firebase_admin import firestore
+
+    db = get_firestore()
+    bookings_ref = db.collection(BOOKINGS_COLLECTION)
+    chunk = MAX_TRANSACTION_WRITES // writes_per_booking
+    changed = []
+
+    @firestore.transactional
+    def _apply(transaction, refs):
+        now = timezone.now()
+        applied = []
+        for doc in db.get_all(refs, transaction=transaction):
+            if not doc.exists:
+                continue
+            booking = {**doc.to_dict(), 'id': doc.id}
+            if booking.get('status') != 'pending':
+                continue
+            transaction.update(doc.reference, {**fields, 'updated_at': now})
+            summaries.update_summary(booking['user_id'], doc.id, fields, batch=transaction)
+            if extra_writes:
+                extra_writes(transaction, booking, now)
+            applied.append(doc.id)
+        return applied
+
+    booking_ids = list(dict.fromkeys(booking_ids))
+    for start in range(0, len(booking_ids), chunk):
+        refs = [bookings_ref.document(booking_id) for booking_id in booking_ids[start:start + chunk]]
+        changed.extend(_apply(db.transaction(), refs))
+    return changed
+
+
+def record_payments(intents):
+    """
+    Confirm pending bookings and record their payments.
+
+    ``intents`` maps booking id to its succeeded PaymentIntent. Returns the ids
+    of the bookings this call confirmed; bookings already confirmed (or
+    cancelled) by someone else are left alone.
+    """
+    payments_ref = get_firestore().collection(PAYMENTS_COLLECTION)
+
+    def write_payment(transaction, booking, now):
+        intent = intents[booking['id']]
+        # One document per PaymentIntent, so a repeated confirmation overwrites rather than duplicates
+        transaction.set(payments_ref.document(intent.id), {
+            'booking_id': booking['id'],
+            'stripe_payment_intent_id': intent.id,
+            'amount': booking['total_amount'],
+            'currency': 'usd',
+            'payment_status': 'completed',
+            'payment_method': intent.payment_method,
+            'created_at': now,
+            'updated_at': now,
+        })
+
+    return _transition(
+        list(intents), {'status': 'confirmed', 'payment_status': 'completed'},
+        extra_writes=write_payment, writes_per_booking=3
+    )
+
+
+def cancel_pending(booking_ids):
+    """Cancel the bookings that are still pending; returns the ids cancelled"""
+    return _transition(booking_ids, {'status': 'cancelled'})
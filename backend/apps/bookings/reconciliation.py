@@ -0,0 +1,256 @@
+"""
+Reconcile pending bookings with their Stripe PaymentIntents.
+
+Bookings only become ``confirmed`` when the client calls ``confirm_payment``,
+so a user who pays and closes the tab leaves the booking ``pending`` with its
+seats held. ``Reconciler`` fixes these in three phases:
+
+1. scan: page through pending bookings that have a ``payment_intent_id``;
+2. fetch: page through the intents created since the oldest of these
+   bookings, 100 per call, keeping the ones the bookings refer to; intents
+   the listing missed are retrieved by id, concurrently through the
+   ``payments`` bulkhead;
+3. apply: book or release seats with one grouped command per showtime, then
+   confirm or cancel the bookings that are still pending, in transactions
+   (see ``payments``), so a booking confirmed concurrently by the app gets
+   one payment and one set of follow-up tasks.
+
+Intents that succeeded confirm their booking; canceled intents release it;
+intents still awaiting payment after ``abandon_after`` are canceled in Stripe
+and released.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from backend.apps.bookings import payments, tasks
+from backend.apps.movies.seat_sharding import apply_seat_group, BOOK, RELEASE, EXPIRE
+from backend.utils.clients import get_firestore, get_stripe
+from backend.utils.resilience import dependency
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_COLLECTION = 'bookings'
+BOOKING_FIELDS = ['user_id', 'showtime_id', 'seat_ids', 'total_amount', 'payment_intent_id', 'created_at']
+
+LIST_PAGE_SIZE = 100  # Stripe's maximum
+
+AWAITING_PAYMENT = ('requires_payment_method', 'requires_confirmation', 'requires_action')
+
+CONFIRM = 'confirm'
+RELEASE_BOOKING = 'release'
+ABANDON = 'abandon'
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.timestamp()
+
+
+class Reconciler:
+
+    def __init__(self, page_size=500, concurrency=4, abandon_after=timedelta(hours=1), dry_run=False):
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.abandon_after = abandon_after
+        self.dry_run = dry_run
+        self.report = {
+            'scanned': 0, 'with_intent': 0, 'confirmed': 0, 'released': 0, 'abandoned': 0,
+            'unchanged': 0, 'listed_intents': 0, 'missing_intents': 0, 'conflicts': [], 'timings': {},
+        }
+
+    def run(self):
+        bookings = self._phase('scan', self.scan)
+        intents = self._phase('fetch', self.fetch_intents, bookings)
+        self._phase('apply', self.apply, bookings, intents)
+        return self.report
+
+    def _phase(self, name, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.report['timings'][name] = round(time.perf_counter() - started, 3)
+
+    # Phase 1
+
+    def scan(self):
+        """All pending bookings that have a PaymentIntent"""
+        query = (
+            get_firestore().collection(BOOKINGS_COLLECTION)
+            .where('status', '==', 'pending')
+            .select(BOOKING_FIELDS)
+            .order_by('__name__')
+            .limit(self.page_size)
+        )
+        bookings = []
+        last = None
+        while True:
+            docs = list((query.start_after(last) if last is not None else query).stream())
+            self.report['scanned'] += len(docs)
+            for doc in docs:
+                booking = {'id': doc.id, **doc.to_dict()}
+                if booking.get('payment_intent_id'):
+                    bookings.append(booking)
+            if len(docs) < self.page_size:
+                break
+            last = docs[-1]
+        self.report['with_intent'] = len(bookings)
+        return bookings
+
+    # Phase 2
+
+    def fetch_intents(self, bookings):
+        """Map PaymentIntent id -> intent for the given bookings"""
+        wanted = {booking['payment_intent_id'] for booking in bookings}
+        intents = {}
+        created = [_timestamp(booking.get('created_at')) for booking in bookings]
+        created = [value for value in created if value is not None]
+        if wanted and created:
+            # Intents are created after their booking
+            intents = self._list_intents(wanted, int(min(created)))
+            self.report['listed_intents'] = len(intents)
+
+        stragglers = wanted - intents.keys()
+        if stragglers:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for intent in pool.map(self._retrieve, stragglers):
+                    if intent is not None:
+                        intents[intent.id] = intent
+        self.report['missing_intents'] = len(wanted - intents.keys())
+        return intents
+
+    def _list_intents(self, wanted, created_since):
+        """The intents in ``wanted`` among those created since ``created_since``"""
+        intents = {}
+        params = {'created': {'gte': created_since}, 'limit': LIST_PAGE_SIZE}
+        while len(intents) < len(wanted):
+            try:
+                page = dependency('payments').call(get_stripe().PaymentIntent.list, **params)
+            except Exception as e:
+                logger.warning('Could not list PaymentIntents: %s', e)
+                break
+            for intent in page.data:
+                if intent.id in wanted:
+                    intents[intent.id] = intent
+            if not page.has_more or not page.data:
+                break
+            params['starting_after'] = page.data[-1].id
+        return intents
+
+    def _retrieve(self, intent_id):
+        try:
+            return dependency('payments').call(get_stripe().PaymentIntent.retrieve, intent_id)
+        except Exception as e:
+            logger.warning('Could not retrieve PaymentIntent %s: %s', intent_id, e)
+            return None
+
+    # Phase 3
+
+    def decide(self, booking, intent):
+        if intent is None:
+            return None
+        if intent.status == 'succeeded':
+            return CONFIRM
+        if intent.status == 'canceled':
+            return RELEASE_BOOKING
+        created = _timestamp(booking.get('created_at')) or intent.created
+        if intent.status in AWAITING_PAYMENT and created < time.time() - self.abandon_after.total_seconds():
+            return ABANDON
+        return None
+
+    def apply(self, bookings, intents):
+        actions = {CONFIRM: [], RELEASE_BOOKING: [], ABANDON: []}
+        for booking in bookings:
+            action = self.decide(booking, intents.get(booking['payment_intent_id']))
+            if action is None:
+                self.report['unchanged'] += 1
+            else:
+                actions[action].append(booking)
+
+        if self.dry_run:
+            self.report['confirmed'] = len(actions[CONFIRM])
+            self.report['released'] = len(actions[RELEASE_BOOKING])
+            self.report['abandoned'] = len(actions[ABANDON])
+            return
+
+        # Cancel abandoned intents first so a late payment cannot succeed after release
+        if actions[ABANDON]:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                canceled = list(pool.map(self._cancel_intent, actions[ABANDON]))
+            actions[ABANDON] = [booking for booking, ok in zip(actions[ABANDON], canceled) if ok]
+
+        booked = self._apply_seats(actions[CONFIRM], BOOK)
+        confirmed = set(payments.record_payments({
+            booking['id']: intents[booking['payment_intent_id']] for booking in booked
+        }))
+        released = set(payments.cancel_pending(
+            [booking['id'] for booking in self._apply_seats(actions[RELEASE_BOOKING], RELEASE)]
+        ))
+        # Holds that lapsed are recorded as expiries rather than releases
+        expired = set(payments.cancel_pending(
+            [booking['id'] for booking in self._apply_seats(actions[ABANDON], EXPIRE)]
+        ))
+
+        # Bookings the app confirmed or cancelled in the meantime are not counted
+        self.report['confirmed'] = len(confirmed)
+        self.report['released'] = len(released)
+        self.report['abandoned'] = len(expired)
+
+        for booking_id in confirmed:
+            tasks.enqueue_post_payment(booking_id)
+
+    def _cancel_intent(self, booking):
+        try:
+            dependency('payments').call(get_stripe().PaymentIntent.cancel, booking['payment_intent_id'])
+            return True
+        except Exception as e:
+            # Most likely the user paid in the meantime; the next run confirms it
+            logger.warning('Could not cancel PaymentIntent %s: %s', booking['payment_intent_id'], e)
+            return False
+
+    def _apply_seats(self, bookings, command):
+        """Apply ``command`` with one grouped seat command per showtime; returns the bookings that succeeded"""
+        by_showtime = {}
+        for booking in bookings:
+            by_showtime.setdefault(booking['showtime_id'], []).append(booking)
+
+        applied = []
+        for showtime_id, group in by_showtime.items():
+            # Each booking is checked against the seats' holders, so seats
+            # booked by someone else are neither released nor taken
+            try:
+                conflicts = dependency('seats').call(
+                    apply_seat_group, showtime_id, command,
+                    [(booking['id'], booking['seat_ids']) for booking in group]
+                )
+            except Exception as e:
+                logger.warning('Seat %s failed for showtime %s: %s', command, showtime_id, e)
+                continue
+            if command == BOOK:
+                for booking in group:
+                    if booking['id'] in conflicts:
+                        self.report['conflicts'].append({'booking_id': booking['id'], 'seat_ids': conflicts[booking['id']]})
+                    else:
+                        applied.append(booking)
+                continue
+
+            # Seats another booking has taken since are no longer this booking's
+            # to free; release the rest and cancel the booking regardless
+            remaining = [
+                (booking['id'], [seat_id for seat_id in booking['seat_ids'] if seat_id not in conflicts[booking['id']]])
+                for booking in group if booking['id'] in conflicts
+            ]
+            remaining = [(booking_id, seat_ids) for booking_id, seat_ids in remaining if seat_ids]
+            if remaining:
+                try:
+                    dependency('seats').call(apply_seat_group, showtime_id, command, remaining)
+                except Exception as e:
+                    logger.warning('Seat %s failed for showtime %s: %s', command, showtime_id, e)
+                    continue
+            applied.extend(group)
+        return applied
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from backend.apps.bookings.limits import MAX_ITEMS
 from backend.apps.movies.serializers import ShowTimeSerializer, SeatSerializer
 
 class PaymentSerializer(serializers.Serializer):
@@ -70,21 +71,32 @@ class PaymentIntentSerializer(serializers.Serializer):
     return_url = serializers.URLField(required=False)
 
 class BookingSummarySerializer(serializers.Serializer):
+    """
+    Compact booking representation for history views, read from the
+    per-user summary projection (see ``summaries.py``)
+    """
     id = serializers.CharField()
-    movie_title = serializers.CharField(source='showtime_details.movie_title')
-    showtime = serializers.DateTimeField(source='showtime_details.start_time')
+    showtime_id = serializers.CharField()
+    movie_title = serializers.CharField()
+    showtime = serializers.DateTimeField(allow_null=True)
     seats = serializers.ListField(child=serializers.CharField())
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     status = serializers.CharField()
-    booking_date = serializers.DateTimeField(source='created_at')
+    payment_status = serializers.CharField(allow_null=True)
+    booking_date = serializers.DateTimeField()
 
-    def to_representation(self, instance):
-        """
-        Create a simplified representation of a booking
-        """
-        data = super().to_representation(instance)
-        # Format seats as a comma-separated string of seat numbers
-        if isinstance(instance, dict):
-            seats = instance.get('seats_details', [])
-            data['seats'] = [f"{seat['row']}{seat['number']}" for seat in seats]
-        return data
+class BulkBookingItemSerializer(serializers.Serializer):
+    showtime_id = serializers.CharField()
+    seat_ids = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+class BulkBookingCreateSerializer(serializers.Serializer):
+    bookings = BulkBookingItemSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+
+class BulkBookingIdsSerializer(serializers.Serializer):
+    booking_ids = serializers.ListField(child=serializers.CharField(), allow_empty=False, max_length=MAX_ITEMS)
+
+    def validate_booking_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Booking ids must be unique")
+        return value
@@ -0,0 +1,128 @@
+"""
+Denormalised per-user booking summaries.
+
+Each booking has a compact summary document at
+``users/{user_id}/booking_summaries/{booking_id}`` holding everything the
+history views display (movie title, start time, seat labels, amount, status).
+The summary is written when the booking is created and patched on every
+status transition, so listing a user's bookings is a single collection read
+with no joins against showtimes, seats or payments.
+"""
+from django.utils import timezone
+
+from backend.apps.archive import loader as archive
+from backend.apps.movies import layouts
+from backend.utils.clients import get_firestore
+from backend.utils.firebase_utils import FirestoreService
+
+USERS_COLLECTION = 'users'
+SUMMARIES_COLLECTION = 'booking_summaries'
+PROJECTIONS_COLLECTION = 'projections'
+
+
+def _summaries_ref(user_id):
+    return (
+        get_firestore()
+        .collection(USERS_COLLECTION)
+        .document(user_id)
+        .collection(SUMMARIES_COLLECTION)
+    )
+
+
+def _backfill_marker_ref(user_id):
+    return (
+        get_firestore()
+        .collection(USERS_COLLECTION)
+        .document(user_id)
+        .collection(PROJECTIONS_COLLECTION)
+        .document(SUMMARIES_COLLECTION)
+    )
+
+
+def seat_labels(showtime, seat_ids):
+    """Map seat ids to display labels such as ``C7`` using the showtime's seat map"""
+    showtime = layouts.materialize(showtime) or {}
+    seats_by_id = {seat['id']: seat for seat in showtime.get('seats', [])}
+    labels = []
+    for seat_id in seat_ids:
+        seat = seats_by_id.get(seat_id)
+        labels.append(f"{seat['row']}{seat['number']}" if seat else seat_id)
+    return labels
+
+
+def build_summary(booking, showtime=None):
+    """Build the summary document for a booking"""
+    if showtime is None:
+        showtime = FirestoreService.get_showtime(booking['showtime_id']) or {}
+
+    movie_title = showtime.get('movie_title')
+    if not movie_title and showtime.get('movie_id'):
+        movie = FirestoreService.get_movie(showtime['movie_id']) or {}
+        movie_title = movie.get('title', '')
+
+    return {
+        'id': booking['id'],
+        'showtime_id': booking['showtime_id'],
+        'movie_title': movie_title or '',
+        'showtime': showtime.get('start_time'),
+        'seats': seat_labels(showtime, booking.get('seat_ids', [])),
+        'total_amount': float(booking.get('total_amount') or 0),
+        'status': booking.get('status'),
+        'payment_status': booking.get('payment_status'),
+        'booking_date': booking.get('created_at') or timezone.now(),
+        'updated_at': timezone.now(),
+    }
+
+
+def save_summary(booking, showtime=None, batch=None):
+    """Write (or overwrite) the summary for a booking (in ``batch`` if given)"""
+    summary = build_summary(booking, showtime)
+    ref = _summaries_ref(booking['user_id']).document(booking['id'])
+    if batch is not None:
+        batch.set(ref, summary)
+    else:
+        ref.set(summary)
+    return summary
+
+
+def update_summary(user_id, booking_id, fields, batch=None):
+    """Patch a summary after a booking state transition (in ``batch`` if given)"""
+    ref = _summaries_ref(user_id).document(booking_id)
+    data = {**fields, 'updated_at': timezone.now()}
+    if batch is not None:
+        batch.set(ref, data, merge=True)
+    else:
+        ref.set(data, merge=True)
+
+
+def get_user_summaries(user_id):
+    """Get all booking summaries for a user, newest first"""
+    from firebase_admin import firestore
+
+    query = _summaries_ref(user_id).order_by(
+        'booking_date', direction=firestore.Query.DESCENDING
+    )
+    return [doc.to_dict() for doc in query.stream()]
+
+
+def is_backfilled(user_id):
+    """Whether the user's summaries have been rebuilt from their bookings at least once"""
+    return _backfill_marker_ref(user_id).get().exists
+
+
+def rebuild_user_summaries(user_id):
+    """Rebuild every summary for a user from their bookings and mark them backfilled"""
+    showtimes = {}
+    summaries = []
+    bookings = FirestoreService.get_user_bookings(user_id) + archive.get_user_bookings(user_id)
+    for booking in bookings:
+        showtime_id = booking['showtime_id']
+        if showtime_id not in showtimes:
+            showtimes[showtime_id] = (
+                FirestoreService.get_showtime(showtime_id) or archive.get_showtime(showtime_id) or {}
+            )
+        summaries.append(save_summary(booking, showtimes[showtime_id]))
+    summaries.sort(key=lambda summary: str(summary['booking_date']), reverse=True)
+    # New bookings write their own summaries, so one rebuild per user is enough
+    _backfill_marker_ref(user_id).set({'backfilled_at': timezone.now(), 'count': len(summaries)})
+    return summaries
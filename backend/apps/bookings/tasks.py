@@ -0,0 +1,115 @@
+"""
+Post-payment side effects, run by the background task workers.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from backend.apps.bookings import summaries, tickets
+from backend.apps.tasks.queue import QueueFull
+from backend.apps.tasks.registry import task
+from backend.apps.users import profiles
+from backend.utils.clients import get_auth, get_firestore
+from backend.utils.firebase_utils import FirestoreService
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_COLLECTION = 'bookings'
+
+
+def _email_of(user_id, profile):
+    """The profile's email, or the Firebase Auth account's for profiles created without one"""
+    if profile.get('email'):
+        return profile['email']
+    try:
+        return get_auth().get_user(user_id).email
+    except Exception as e:
+        logger.warning('No email for user %s: %s', user_id, e)
+        return None
+
+
+def confirmation_message(summary):
+    seats = ', '.join(summary['seats'])
+    return (
+        f"Your booking for {summary['movie_title']} is confirmed. "
+        f"Showtime: {summary['showtime']}. Seats: {seats}. "
+        f"Booking reference: {summary['id']}."
+    )
+
+
+def _mark_notified(booking_id, channel):
+    """Record a delivered channel on the booking, so a retry does not deliver it again"""
+    get_firestore().collection(BOOKINGS_COLLECTION).document(booking_id).update({
+        f'notified.{channel}': timezone.now()
+    })
+
+
+@task(priority=1, max_retries=5)
+def send_booking_confirmation(booking_id):
+    """Notify the user of a confirmed booking on each channel they opted into and not yet notified"""
+    booking = FirestoreService.get_booking(booking_id)
+    if not booking:
+        return
+    profile = profiles.get_user_profile(booking['user_id']) or {}
+    preferences = profile.get('notification_preferences', {})
+    notified = booking.get('notified') or {}
+    message = confirmation_message(summaries.build_summary(booking))
+
+    if preferences.get('email', True) and 'email' not in notified:
+        email = _email_of(booking['user_id'], profile)
+        if email:
+            send_mail(
+                'Your booking is confirmed',
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [email],
+            )
+            _mark_notified(booking_id, 'email')
+
+    if preferences.get('sms', False) and profile.get('phone_number') and 'sms' not in notified:
+        sms_backend = getattr(settings, 'SMS_BACKEND', None)
+        if sms_backend:
+            import_string(sms_backend)(profile['phone_number'], message)
+            _mark_notified(booking_id, 'sms')
+        else:
+            logger.info('SMS_BACKEND not configured; skipping SMS for booking %s', booking_id)
+
+
+@task(priority=5, max_retries=3)
+def refresh_booking_summary(booking_id):
+    """Rebuild a booking's history projection from the booking itself"""
+    booking = FirestoreService.get_booking(booking_id)
+    if booking:
+        summaries.save_summary(booking)
+
+
+@task(priority=7, max_retries=3)
+def render_booking_ticket(booking_id):
+    """Render a confirmed booking's ticket so the first download is served from cache"""
+    booking = FirestoreService.get_booking(booking_id)
+    if booking and booking.get('status') == 'confirmed':
+        tickets.get_ticket(booking)
+
+
+def enqueue_post_payment(booking_id):
+    """
+    Queue the follow-up tasks of a newly confirmed booking.
+
+    Each task is queued on its own, so a full queue only drops the tasks it
+    rejects; the summary refresh then runs inline, since booking history
+    would otherwise show the booking as pending.
+    """
+    for follow_up in (send_booking_confirmation, refresh_booking_summary, render_booking_ticket):
+        try:
+            follow_up.enqueue(booking_id)
+        except QueueFull:
+            if follow_up is not refresh_booking_summary:
+                logger.warning('Task queue full; %s for booking %s not queued', follow_up.name, booking_id)
+                continue
+            try:
+                refresh_booking_summary(booking_id)
+            except Exception as e:
+                logger.error('Could not refresh the summary of booking %s: %s', booking_id, e)
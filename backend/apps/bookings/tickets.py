@@ -0,0 +1,315 @@
+"""
+Server-side ticket rendering.
+
+Tickets are rendered to PNG or PDF with a QR code encoding the booking id and
+seats. Rendering is CPU-bound, so batches run in a process pool. Rendered
+files are cached on disk under a key derived from the ticket's content
+(booking, showtime, seats, status and renderer version): a changed booking
+gets a new file, and an unchanged one is never rendered twice. The key is
+also the download's ETag. The cache is kept under ``TICKET_CACHE_MAX_MB`` by
+deleting the least recently used files (a hit refreshes a file's mtime).
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+
+from backend.apps.archive import loader as archive
+from backend.apps.movies import layouts
+from backend.utils.clients import get_firestore
+from backend.utils.firebase_utils import FirestoreService
+
+RENDERER_VERSION = 1
+FORMATS = {'png': 'image/png', 'pdf': 'application/pdf'}
+
+BOOKINGS_COLLECTION = 'bookings'
+
+WIDTH, HEIGHT = 900, 420
+
+# Prune once this many bytes have been written since the last prune
+PRUNE_EVERY_FRACTION = 0.05
+# Prune down to this fraction of the limit, so pruning is not needed again right away
+PRUNE_TO_FRACTION = 0.9
+
+_written = 0
+_prune_lock = threading.Lock()
+
+
+def seat_index(showtime):
+    """Map seat ids to display labels for an already materialized showtime"""
+    return {seat['id']: f"{seat['row']}{seat['number']}" for seat in showtime.get('seats', [])}
+
+
+def ticket_data(booking, showtime, seats=None):
+    """Everything printed on a ticket, as plain JSON-serialisable values"""
+    if seats is None:
+        seats = seat_index(showtime)
+    start_time = showtime.get('start_time')
+    if isinstance(start_time, datetime):
+        start_time = start_time.isoformat()
+    seat_ids = list(booking.get('seat_ids', []))
+    return {
+        'booking_id': booking['id'],
+        'movie_title': showtime.get('movie_title', ''),
+        'start_time': start_time or '',
+        'screen_number': showtime.get('screen_number', ''),
+        'seats': [seats.get(seat_id, seat_id) for seat_id in seat_ids],
+        'seat_ids': seat_ids,
+        'amount': float(booking.get('total_amount') or 0),
+        'status': booking.get('status', ''),
+    }
+
+
+def cache_key(data, fmt):
+    canonical = json.dumps({**data, 'renderer': RENDERER_VERSION, 'format': fmt}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cache_path(key, fmt):
+    return os.path.join(settings.TICKET_CACHE_DIR, key[:2], f'{key}.{fmt}')
+
+
+def _cache_max_bytes():
+    return getattr(settings, 'TICKET_CACHE_MAX_MB', 1024) * 1024 * 1024
+
+
+def _cached(path):
+    """Whether a rendered ticket is cached, marking it recently used"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def prune_cache(max_bytes=None):
+    """Delete least recently used tickets until the cache fits in ``max_bytes``; returns files removed"""
+    max_bytes = _cache_max_bytes() if max_bytes is None else max_bytes
+    files = []
+    for root, _, names in os.walk(settings.TICKET_CACHE_DIR):
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes * PRUNE_TO_FRACTION:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _note_written(size):
+    global _written
+    with _prune_lock:
+        _written += size
+        if _written < _cache_max_bytes() * PRUNE_EVERY_FRACTION:
+            return
+        _written = 0
+        prune_cache()
+
+
+@functools.lru_cache(maxsize=None)
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size default font
+        return ImageFont.load_default()
+
+
+LABELS = ('Showtime', 'Screen', 'Seats', 'Amount', 'Booking')
+
+
+@functools.lru_cache(maxsize=1)
+def _background():
+    """The parts of a ticket that never change, drawn once per process"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (WIDTH, HEIGHT), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, WIDTH, 70], fill='#1976d2')
+    draw.text((30, 18), 'Movie Ticket', fill='white', font=_font(32))
+    for i, label in enumerate(LABELS):
+        draw.text((30, 150 + i * 40), label, fill='#757575', font=_font(18))
+
+    # Dashed tear line between the stub and the QR code
+    for x in range(HEIGHT // 20):
+        draw.line([(600, 80 + x * 16), (600, 88 + x * 16)], fill='#bdbdbd', width=2)
+    return image
+
+
+def render_ticket(data, fmt='png'):
+    """Render one ticket and return the file bytes (pure; safe to run in a worker process)"""
+    import qrcode
+    from PIL import Image, ImageDraw
+
+    image = _background().copy()
+    draw = ImageDraw.Draw(image)
+    draw.text((30, 95), data['movie_title'], fill='black', font=_font(30))
+    values = (
+        data['start_time'].replace('T', ' ')[:16],
+        str(data['screen_number']),
+        ', '.join(data['seats']),
+        f"${data['amount']:.2f}",
+        data['booking_id'],
+    )
+    for i, value in enumerate(values):
+        draw.text((150, 150 + i * 40), value, fill='black', font=_font(20))
+
+    payload = json.dumps({'b': data['booking_id'], 's': data['seat_ids']}, separators=(',', ':'))
+    # A fixed mask skips qrcode's scoring of all eight patterns, the slowest step
+    qr = qrcode.QRCode(border=1, box_size=8, error_correction=qrcode.constants.ERROR_CORRECT_M, mask_pattern=0)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    qr_image = qr.make_image(fill_color='black', back_color='white').convert('RGB')
+    qr_image = qr_image.resize((250, 250), Image.NEAREST)
+    image.paste(qr_image, (625, 110))
+
+    buffer = io.BytesIO()
+    if fmt == 'pdf':
+        image.save(buffer, format='PDF', resolution=150)
+    else:
+        image.save(buffer, format='PNG', compress_level=3)
+    return buffer.getvalue()
+
+
+def _store(key, fmt, content):
+    path = cache_path(key, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+    _note_written(len(content))
+    return path
+
+
+def with_movie_title(showtime):
+    """The showtime, with its movie's title filled in when the showtime lacks one"""
+    if not showtime.get('movie_title') and showtime.get('movie_id'):
+        movie = FirestoreService.get_movie(showtime['movie_id']) or {}
+        showtime = {**showtime, 'movie_title': movie.get('title', '')}
+    return showtime
+
+
+def booking_ticket_data(booking, showtime=None):
+    """Ticket data for a booking, loading its showtime (hot or archived) when not given"""
+    if showtime is None:
+        showtime = (
+            FirestoreService.get_showtime(booking['showtime_id'])
+            or archive.get_showtime(booking['showtime_id'])
+            or {}
+        )
+    return ticket_data(booking, layouts.materialize(with_movie_title(showtime)))
+
+
+def open_ticket(data, fmt='png'):
+    """Open the rendered ticket for ``data``, rendering it if it is not cached"""
+    key = cache_key(data, fmt)
+    path = cache_path(key, fmt)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        # Opened straight away: the handle stays readable even if a prune removes the file
+        return open(_store(key, fmt, render_ticket(data, fmt)), 'rb')
+    _cached(path)
+    return f
+
+
+def get_ticket(booking, showtime=None, fmt='png'):
+    """Return the path of a booking's rendered ticket, rendering it if not cached"""
+    data = booking_ticket_data(booking, showtime)
+    key = cache_key(data, fmt)
+    path = cache_path(key, fmt)
+    if not _cached(path):
+        path = _store(key, fmt, render_ticket(data, fmt))
+    return path
+
+
+def _render_item(item):
+    data, fmt = item
+    return render_ticket(data, fmt)
+
+
+def render_batch(bookings, showtime, fmt='png', processes=None):
+    """
+    Render tickets for many bookings of one showtime in a process pool.
+
+    Returns ``{'rendered': n, 'cached': n, 'paths': {booking_id: path}}``.
+    """
+    showtime = layouts.materialize(with_movie_title(showtime))
+    seats = seat_index(showtime)
+    paths = {}
+    todo = []
+    for booking in bookings:
+        data = ticket_data(booking, showtime, seats)
+        key = cache_key(data, fmt)
+        path = cache_path(key, fmt)
+        paths[booking['id']] = path
+        if not _cached(path):
+            todo.append((key, data))
+
+    if todo:
+        processes = processes or getattr(settings, 'TICKET_RENDER_PROCESSES', None) or os.cpu_count()
+        if processes > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                chunksize = max(1, len(todo) // (processes * 4))
+                rendered = pool.map(_render_item, [(data, fmt) for _, data in todo], chunksize=chunksize)
+                for (key, _), content in zip(todo, rendered):
+                    _store(key, fmt, content)
+        else:
+            for key, data in todo:
+                _store(key, fmt, render_ticket(data, fmt))
+
+    return {'rendered': len(todo), 'cached': len(paths) - len(todo), 'paths': paths}
+
+
+def confirmed_bookings(showtime_id):
+    query = (
+        get_firestore().collection(BOOKINGS_COLLECTION)
+        .where('showtime_id', '==', showtime_id)
+        .where('status', '==', 'confirmed')
+    )
+    return [{'id': doc.id, **doc.to_dict()} for doc in query.stream()]
+
+
+def render_showtime(showtime_id, fmt='png', processes=None):
+    """Pre-render tickets for every confirmed booking of a showtime"""
+    showtime = FirestoreService.get_showtime(showtime_id)
+    if not showtime:
+        raise ValueError(f'Showtime {showtime_id} not found')
+    return render_batch(confirmed_bookings(showtime_id), showtime, fmt, processes)
+
+
+def upcoming_showtime_ids(within):
+    """Ids of showtimes starting between now and ``within`` (a timedelta) from now"""
+    from django.utils import timezone
+    now = timezone.now()
+    query = (
+        get_firestore().collection('showtimes')
+        .where('start_time', '>=', now)
+        .where('start_time', '<=', now + within)
+    )
+    return [doc.id for doc in query.select([]).stream()]
@@ -1,13 +1,23 @@
+import logging
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-import stripe
-from django.conf import settings
-from .serializers import BookingSerializer, PaymentSerializer
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from .serializers import (
+    BookingSerializer, BookingSummarySerializer, PaymentSerializer,
+    BulkBookingCreateSerializer, BulkBookingIdsSerializer
+)
+from . import bulk, payments, summaries, tasks, tickets
+from backend.apps.archive import loader as archive
 from backend.utils.firebase_utils import FirestoreService
+from backend.utils.clients import get_stripe
+from backend.utils.idempotency import idempotent, get_idempotency_key
+from backend.apps.movies.seat_sharding import apply_seat_command, SeatConflict, HOLD, BOOK, RELEASE, EXPIRE
+from backend.utils.resilience import dependency, DependencyUnavailable, on_late_success, unavailable_response
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 class BookingViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -15,8 +25,16 @@ class BookingViewSet(viewsets.ViewSet):
     def list(self, request):
         """Get all bookings for the current user"""
         try:
-            bookings = FirestoreService.get_user_bookings(request.user.id)
-            serializer = BookingSerializer(bookings, many=True)
+            booking_summaries = summaries.get_user_summaries(request.user.id)
+            if not summaries.is_backfilled(request.user.id):
+                # Users with bookings from before the projection existed, who
+                # may already have summaries of bookings made since
+                rebuilt = {summary['id']: summary for summary in summaries.rebuild_user_summaries(request.user.id)}
+                booking_summaries = list(rebuilt.values()) + [
+                    summary for summary in booking_summaries if summary['id'] not in rebuilt
+                ]
+                booking_summaries.sort(key=lambda summary: str(summary['booking_date']), reverse=True)
+            serializer = BookingSummarySerializer(booking_summaries, many=True)
             return Response(serializer.data)
         except Exception as e:
             return Response(
@@ -27,7 +45,8 @@ class BookingViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """Get a specific booking"""
         try:
-            booking = FirestoreService.get_booking(pk)
+            # Bookings of long-finished showtimes live in the archive
+            booking = FirestoreService.get_booking(pk) or archive.get_booking(pk)
             if not booking:
                 return Response(
                     {'error': 'Booking not found'},
@@ -49,6 +68,7 @@ class BookingViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @idempotent
     def create(self, request):
         """Create a new booking"""
         try:
@@ -66,18 +86,46 @@ class BookingViewSet(viewsets.ViewSet):
 
             # Create booking in Firestore
             booking = FirestoreService.create_booking(booking_data)
-
-            # Update seat status to 'selected'
-            FirestoreService.update_seats_status(
-                booking_data['showtime_id'],
-                booking_data['seat_ids'],
-                'selected'
-            )
+            summaries.save_summary({**booking_data, **booking})
+
+            # Hold the seats (status 'selected') for this booking
+            try:
+                dependency('seats').call(
+                    apply_seat_command,
+                    booking_data['showtime_id'],
+                    HOLD,
+                    booking_data['seat_ids'],
+                    booking_id=booking['id'],
+                    user_id=request.user.id
+                )
+            except (SeatConflict, DependencyUnavailable) as e:
+                FirestoreService.update_booking_status(booking['id'], {
+                    'status': 'cancelled'
+                })
+                summaries.update_summary(request.user.id, booking['id'], {
+                    'status': 'cancelled'
+                })
+                if isinstance(e, DependencyUnavailable):
+                    # A hold abandoned at the deadline may still land; expire it if it does
+                    on_late_success(e, lambda _: apply_seat_command(
+                        booking_data['showtime_id'],
+                        EXPIRE,
+                        booking_data['seat_ids'],
+                        booking_id=booking['id'],
+                        user_id=request.user.id
+                    ))
+                    return unavailable_response(e)
+                return Response(
+                    {'error': str(e), 'seat_ids': e.seat_ids},
+                    status=status.HTTP_409_CONFLICT
+                )
 
             return Response(
                 BookingSerializer(booking).data,
                 status=status.HTTP_201_CREATED
             )
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -85,6 +133,7 @@ class BookingViewSet(viewsets.ViewSet):
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def create_payment_intent(self, request, pk=None):
         """Create Stripe PaymentIntent for a booking"""
         try:
@@ -95,14 +144,17 @@ class BookingViewSet(viewsets.ViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Create PaymentIntent
-            intent = stripe.PaymentIntent.create(
+            # Create PaymentIntent (Stripe deduplicates retries on the same key)
+            idempotency_key = get_idempotency_key(request)
+            intent = dependency('payments').call(
+                get_stripe().PaymentIntent.create,
                 amount=int(booking['total_amount'] * 100),  # Convert to cents
                 currency='usd',
                 metadata={
                     'booking_id': pk,
                     'user_id': request.user.id
-                }
+                },
+                idempotency_key=f'payment-intent-{pk}-{idempotency_key}' if idempotency_key else None
             )
 
             # Update booking with payment intent ID
@@ -114,6 +166,8 @@ class BookingViewSet(viewsets.ViewSet):
                 'clientSecret': intent.client_secret,
                 'amount': booking['total_amount']
             })
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -121,6 +175,7 @@ class BookingViewSet(viewsets.ViewSet):
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def confirm_payment(self, request, pk=None):
         """Confirm payment for a booking"""
         try:
@@ -131,6 +186,15 @@ class BookingViewSet(viewsets.ViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
+            if booking['status'] == 'confirmed':
+                return Response({'status': 'payment confirmed'})
+
+            if booking['status'] == 'cancelled':
+                return Response(
+                    {'error': 'Booking is cancelled'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             payment_intent_id = booking.get('payment_intent_id')
             if not payment_intent_id:
                 return Response(
@@ -139,32 +203,39 @@ class BookingViewSet(viewsets.ViewSet):
                 )
 
             # Verify payment status with Stripe
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = dependency('payments').call(get_stripe().PaymentIntent.retrieve, payment_intent_id)
 
             if intent.status == 'succeeded':
-                # Update booking status
-                FirestoreService.update_booking_status(pk, {
-                    'status': 'confirmed',
-                    'payment_status': 'completed'
-                })
-
-                # Update seat status to 'booked'
-                FirestoreService.update_seats_status(
+                # Book the seats first; the booking only changes once they are ours.
+                # A booking abandoned at the deadline is confirmed later by the
+                # payment reconciler, which books the same seats again harmlessly.
+                dependency('seats').call(
+                    apply_seat_command,
                     booking['showtime_id'],
+                    BOOK,
                     booking['seat_ids'],
-                    'booked'
+                    booking_id=pk,
+                    user_id=request.user.id
                 )
 
-                # Create payment record
-                payment_data = {
-                    'booking_id': pk,
-                    'stripe_payment_intent_id': payment_intent_id,
-                    'amount': booking['total_amount'],
-                    'currency': 'usd',
-                    'payment_status': 'completed',
-                    'payment_method': intent.payment_method
-                }
-                FirestoreService.create_payment(payment_data)
+                # Confirm the booking and record its payment, unless a concurrent
+                # confirmation (e.g. the payment reconciler) already did
+                if pk not in payments.record_payments({pk: intent}):
+                    current = FirestoreService.get_booking(pk) or {}
+                    if current.get('status') == 'confirmed':
+                        return Response({'status': 'payment confirmed'})
+                    # The cancellation may have released the seats before they were booked here
+                    try:
+                        self._release_seats(booking, pk, request.user.id)
+                    except Exception as e:
+                        logger.error('Could not release seats of cancelled booking %s: %s', pk, e)
+                    return Response(
+                        {'error': 'Booking is cancelled'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                # Notifications and projections run in the background task workers
+                tasks.enqueue_post_payment(pk)
 
                 return Response({'status': 'payment confirmed'})
             else:
@@ -172,13 +243,86 @@ class BookingViewSet(viewsets.ViewSet):
                     {'error': 'Payment not succeeded'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        except SeatConflict as e:
+            return Response(
+                {'error': str(e), 'seat_ids': e.seat_ids},
+                status=status.HTTP_409_CONFLICT
+            )
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get'])
+    def ticket(self, request, pk=None):
+        """Download the rendered ticket for a confirmed booking (?kind=png|pdf)"""
+        try:
+            fmt = request.query_params.get('kind', 'png')
+            if fmt not in tickets.FORMATS:
+                return Response(
+                    {'error': f"Unsupported ticket kind '{fmt}'"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            booking = FirestoreService.get_booking(pk) or archive.get_booking(pk)
+            if not booking:
+                return Response(
+                    {'error': 'Booking not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            if booking.get('user_id') != request.user.id:
+                return Response(
+                    {'error': 'Not authorized to view this booking'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+            if booking['status'] != 'confirmed':
+                return Response(
+                    {'error': 'Tickets are only available for confirmed bookings'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            data = tickets.booking_ticket_data(booking)
+            # The cache key is a hash of the ticket's content, so it doubles as a strong validator
+            etag = f'"{tickets.cache_key(data, fmt)}"'
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            response = FileResponse(
+                tickets.open_ticket(data, fmt),
+                content_type=tickets.FORMATS[fmt],
+                filename=f'ticket-{pk}.{fmt}'
+            )
+            response['ETag'] = etag
+            return response
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _release_seats(self, booking, pk, user_id):
+        """Release a cancelled booking's seats, except those another booking has taken since"""
+        seat_ids = booking['seat_ids']
+        try:
+            dependency('seats').call(
+                apply_seat_command, booking['showtime_id'], RELEASE, seat_ids, booking_id=pk, user_id=user_id
+            )
+        except SeatConflict as e:
+            seat_ids = [seat_id for seat_id in seat_ids if seat_id not in e.seat_ids]
+            if seat_ids:
+                dependency('seats').call(
+                    apply_seat_command, booking['showtime_id'], RELEASE, seat_ids, booking_id=pk, user_id=user_id
+                )
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def cancel(self, request, pk=None):
         """Cancel a booking"""
         try:
@@ -195,25 +339,96 @@ class BookingViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Update booking status
-            FirestoreService.update_booking_status(pk, {
-                'status': 'cancelled'
-            })
+            # Cancel first, so a booking confirmed concurrently keeps its seats;
+            # cancelling again releases the seats of a release that failed
+            if booking['status'] == 'pending' and pk not in payments.cancel_pending([pk]):
+                current = FirestoreService.get_booking(pk) or {}
+                if current.get('status') == 'confirmed':
+                    return Response(
+                        {'error': 'Cannot cancel confirmed booking'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
 
-            # Release seats
-            FirestoreService.update_seats_status(
-                booking['showtime_id'],
-                booking['seat_ids'],
-                'available'
-            )
+            self._release_seats(booking, pk, request.user.id)
 
             return Response({'status': 'booking cancelled'})
+        except SeatConflict as e:
+            return Response(
+                {'error': str(e), 'seat_ids': e.seat_ids},
+                status=status.HTTP_409_CONFLICT
+            )
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk_create(self, request):
+        """Create several bookings, across showtimes, in one request"""
+        try:
+            serializer = BulkBookingCreateSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            results = bulk.create_bookings(request.user.id, serializer.validated_data['bookings'])
+            for result in results:
+                if 'booking' in result:
+                    result['booking'] = BookingSerializer(result['booking']).data
+            return Response(self._bulk_summary(results))
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk_confirm(self, request):
+        """Confirm payment for several bookings"""
+        try:
+            serializer = BulkBookingIdsSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            results = bulk.confirm_bookings(request.user.id, serializer.validated_data['booking_ids'])
+            return Response(self._bulk_summary(results))
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk_cancel(self, request):
+        """Cancel several bookings"""
+        try:
+            serializer = BulkBookingIdsSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            results = bulk.cancel_bookings(request.user.id, serializer.validated_data['booking_ids'])
+            return Response(self._bulk_summary(results))
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _bulk_summary(self, results):
+        succeeded = sum(1 for result in results if result['status_code'] < 300)
+        return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
+
 class PaymentViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
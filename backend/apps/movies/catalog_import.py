@@ -0,0 +1,262 @@
+"""
+Streaming bulk import of movies and showtimes.
+
+Records are read one at a time from JSONL or CSV, validated with
+``MovieSerializer``/``ShowTimeSerializer``, expanded into Firestore writes
+(showtimes reference a screen layout template and start with an empty seat
+overlay, see ``layouts``) and committed in batches of up to ``batch_size``
+writes, with several batches in flight at once. A template is written on its
+own before the first batch that references it, since batches may commit in
+any order. A checkpoint file records how many input records are fully committed so
+an interrupted import can resume where it stopped; writes use fixed document
+ids, so replaying a partially committed batch is harmless.
+"""
+import csv
+import datetime
+import decimal
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.utils import timezone
+
+from backend.apps.movies import layouts
+from backend.apps.movies.serializers import MovieSerializer, ShowTimeSerializer
+from backend.utils.clients import get_firestore
+
+MOVIES_COLLECTION = 'movies'
+SHOWTIMES_COLLECTION = 'showtimes'
+SEATS_COLLECTION = 'seats'
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+
+class ImportRecordError(Exception):
+    def __init__(self, line, errors):
+        self.line = line
+        self.errors = errors
+        super().__init__(f'record {line}: {errors}')
+
+
+def read_records(path, kind=None):
+    """Yield ``(kind, record)`` pairs from a JSONL or CSV file"""
+    if path.endswith('.csv'):
+        if kind is None:
+            raise ValueError('CSV input needs an explicit kind (movie or showtime)')
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                yield kind, {key: value for key, value in row.items() if value != ''}
+        return
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield kind or record.pop('type', None), record
+
+
+def to_firestore(value):
+    """Convert validated serializer output into Firestore-storable values"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: to_firestore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_firestore(item) for item in value]
+    return value
+
+
+class CatalogImporter:
+    """Validates records, expands them into writes and commits them in concurrent batches"""
+
+    def __init__(self, screen_layouts=None, batch_size=MAX_BATCH_WRITES, concurrency=8,
+                 dry_run=False, seat_docs=None, inline_seats=False, progress=None, progress_every=1000):
+        self.screen_layouts = screen_layouts or {}
+        self.batch_size = min(batch_size, MAX_BATCH_WRITES)
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.inline_seats = inline_seats
+        # Layout showtimes get seat documents mirrored as their seats change
+        # (SEAT_STATUS_MIRROR_DOCS), so by default only inline showtimes get one per seat
+        self.seat_docs = inline_seats if seat_docs is None else seat_docs
+        self.templates = set()
+        self.progress = progress
+        self.progress_every = progress_every
+        self.movie_titles = {}
+        self.stats = {'records': 0, 'movies': 0, 'showtimes': 0, 'layouts': 0, 'writes': 0,
+                      'batches': 0, 'errors': 0, 'skipped': 0}
+
+    def layout_for(self, record):
+        if record.get('layout'):
+            return record['layout']
+        screen = str(record.get('screen_number', ''))
+        return self.screen_layouts.get(screen, self.screen_layouts.get('default', layouts.DEFAULT_LAYOUT))
+
+    def prepare(self, line, kind, record):
+        """Validate one record and return its list of ``(path, data)`` writes"""
+        now = timezone.now()
+        if kind == 'movie':
+            serializer = MovieSerializer(data=record)
+            if not serializer.is_valid():
+                raise ImportRecordError(line, serializer.errors)
+            movie = to_firestore(dict(serializer.validated_data))
+            movie.pop('showtimes', None)
+            self.movie_titles[movie['id']] = movie['title']
+            self.stats['movies'] += 1
+            return [((MOVIES_COLLECTION, movie['id']), {**movie, 'updated_at': now})]
+
+        if kind == 'showtime':
+            layout = self.layout_for(record)
+            seats = layouts.generate_seats(layout)
+            record = {
+                'total_seats': len(seats),
+                'available_seats': len(seats),
+                **{key: value for key, value in record.items() if key != 'layout'},
+            }
+            serializer = ShowTimeSerializer(data=record)
+            if not serializer.is_valid():
+                raise ImportRecordError(line, serializer.errors)
+            showtime = to_firestore(dict(serializer.validated_data))
+            showtime['movie_title'] = record.get('movie_title') or self.movie_titles.get(showtime['movie_id'], '')
+            showtime['updated_at'] = now
+
+            writes = []
+            if self.inline_seats:
+                showtime['seats'] = seats
+            else:
+                layout_id = layouts.layout_id_for(layout)
+                if layout_id not in self.templates:
+                    self.save_template(layout_id, layout)
+                showtime['layout_id'] = layout_id
+                showtime['seat_overlay'] = {}
+            writes.append(((SHOWTIMES_COLLECTION, showtime['id']), showtime))
+            if self.seat_docs:
+                writes.extend(
+                    ((SHOWTIMES_COLLECTION, showtime['id'], SEATS_COLLECTION, seat['id']), seat)
+                    for seat in seats
+                )
+            self.stats['showtimes'] += 1
+            return writes
+
+        raise ImportRecordError(line, f'unknown record type {kind!r}')
+
+    def save_template(self, layout_id, layout):
+        """Write a layout template now, so it exists before any showtime that references it"""
+        if not self.dry_run:
+            layouts.save_layout(layout_id, layout)
+        self.templates.add(layout_id)
+        self.stats['layouts'] += 1
+        self.stats['writes'] += 1
+
+    def _commit(self, writes):
+        if self.dry_run:
+            return len(writes)
+        db = get_firestore()
+        batch = db.batch()
+        for path, data in writes:
+            batch.set(db.document(*path), data)
+        batch.commit()
+        return len(writes)
+
+    def run(self, records, skip=0, checkpoint=None):
+        """
+        Import ``(kind, record)`` pairs, skipping the first ``skip`` records.
+
+        ``checkpoint(records_done)`` is called whenever the number of fully
+        committed leading records advances.
+        """
+        start = time.perf_counter()
+        pending = {}       # future -> batch number
+        batch_ends = {}    # batch number -> records fully written once it commits
+        committed = set()
+        next_to_ack = 0
+        current, current_end = [], skip
+        batch_number = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        def flush():
+            nonlocal current, batch_number
+            if not current:
+                return
+            # Backpressure: never hold more than two rounds of batches in flight
+            while len(pending) >= self.concurrency * 2:
+                drain(wait(pending, return_when=FIRST_COMPLETED).done)
+            batch_ends[batch_number] = current_end
+            pending[executor.submit(self._commit, current)] = batch_number
+            batch_number += 1
+            self.stats['batches'] += 1
+            current = []
+
+        def drain(done):
+            nonlocal next_to_ack
+            for future in done:
+                number = pending.pop(future)
+                self.stats['writes'] += future.result()
+                committed.add(number)
+            advanced = False
+            while next_to_ack in committed:
+                committed.discard(next_to_ack)
+                next_to_ack += 1
+                advanced = True
+            if advanced and checkpoint:
+                checkpoint(batch_ends[next_to_ack - 1])
+
+        try:
+            for index, (kind, record) in enumerate(records):
+                if index < skip:
+                    self.stats['skipped'] += 1
+                    continue
+                self.stats['records'] += 1
+                try:
+                    writes = self.prepare(index + 1, kind, record)
+                except ImportRecordError as e:
+                    self.stats['errors'] += 1
+                    if self.progress:
+                        self.progress(f'  skipped {e}')
+                    writes = []
+
+                for write in writes:
+                    if len(current) >= self.batch_size:
+                        flush()
+                    current.append(write)
+                current_end = index + 1
+
+                if self.progress and self.stats['records'] % self.progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    self.progress(
+                        f"{self.stats['records']} records, {self.stats['writes']} writes committed, "
+                        f"{self.stats['records'] / elapsed:,.0f} records/s"
+                    )
+            flush()
+            if pending:
+                drain(wait(pending).done)
+            elif checkpoint:
+                checkpoint(current_end)
+        finally:
+            executor.shutdown(wait=True)
+
+        self.stats['seconds'] = time.perf_counter() - start
+        return self.stats
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get('records_done', 0)
+    return 0
+
+
+def save_checkpoint(path, records_done):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'records_done': records_done}, f)
+    os.replace(tmp, path)
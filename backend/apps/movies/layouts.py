@@ -0,0 +1,210 @@
+"""
+Screen seat layouts.
+
+A layout describes the physical seats of a screen:
+
+    {"rows": "A-J", "seats_per_row": 12, "aisles": [4, 8],
+     "seat_classes": {"premium": ["I", "J"]}}
+    {"rows": {"A": 10, "B": 12, "C": 12}}
+    {"rows": "A-AD", "seats_per_row": 30}
+
+Row ranges count like spreadsheet columns, so ``Z`` is followed by ``AA``.
+
+``aisles`` lists seat numbers with an aisle after them; ``seat_classes`` maps a
+class name to the rows it covers.
+
+Layouts are stored once as templates in ``screen_layouts/{layout_id}``.
+A showtime that references a template via ``layout_id`` stores only a
+``seat_overlay`` of ``{seat_id: status}`` for seats that are not available;
+``materialize`` merges the two back into the full seat list on demand, with
+the template and its expanded seats cached in memory. Showtimes without a
+``layout_id`` keep their inline ``seats`` list and are returned unchanged,
+as are showtimes whose template is missing but which still carry ``seats``.
+"""
+import hashlib
+import json
+import string
+
+from django.conf import settings
+
+from backend.utils.cache import TTLCache
+from backend.utils.clients import get_firestore
+
+LAYOUTS_COLLECTION = 'screen_layouts'
+SHOWTIMES_COLLECTION = 'showtimes'
+SEATS_COLLECTION = 'seats'
+
+DEFAULT_LAYOUT = {'rows': 'A-J', 'seats_per_row': 12}
+
+# Templates never change in place (a new layout gets a new id), so they can be cached for long
+_layout_cache = TTLCache(maxsize=256, ttl=getattr(settings, 'LAYOUT_CACHE_TTL', 3600))
+_seats_cache = TTLCache(maxsize=256, ttl=getattr(settings, 'LAYOUT_CACHE_TTL', 3600))
+_showtime_layouts = TTLCache(maxsize=10000, ttl=getattr(settings, 'LAYOUT_CACHE_TTL', 3600))
+
+
+class LayoutNotFound(ValueError):
+    """A showtime references a layout template that does not exist"""
+
+
+def _row_number(label):
+    """1-based position of a row label: ``A`` is 1, ``Z`` 26, ``AA`` 27"""
+    number = 0
+    for char in label:
+        if char not in string.ascii_uppercase:
+            raise ValueError(f'Invalid row label {label!r}')
+        number = number * 26 + string.ascii_uppercase.index(char) + 1
+    if not number:
+        raise ValueError('Empty row label')
+    return number
+
+
+def _row_label(number):
+    label = ''
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        label = string.ascii_uppercase[remainder] + label
+    return label
+
+
+def expand_rows(rows):
+    """Turn ``'A-J'`` (or ``'A-AD'``) or a list of row labels into a list of labels"""
+    if isinstance(rows, str):
+        if '-' in rows:
+            first, last = rows.split('-', 1)
+            return [
+                _row_label(number)
+                for number in range(_row_number(first.strip()), _row_number(last.strip()) + 1)
+            ]
+        return [row.strip() for row in rows.split(',') if row.strip()]
+    return list(rows)
+
+
+def row_sizes(layout):
+    """Return ``[(row_label, seat_count), ...]`` for a layout"""
+    rows = layout.get('rows', DEFAULT_LAYOUT['rows'])
+    if isinstance(rows, dict):
+        return [(row, int(count)) for row, count in rows.items()]
+    per_row = int(layout.get('seats_per_row', DEFAULT_LAYOUT['seats_per_row']))
+    return [(row, per_row) for row in expand_rows(rows)]
+
+
+def generate_seats(layout, status='available'):
+    """Expand a layout into seat dicts (``id``, ``row``, ``number``, ``status``)"""
+    aisles = set(layout.get('aisles', []))
+    row_classes = {
+        row: seat_class
+        for seat_class, rows in layout.get('seat_classes', {}).items()
+        for row in expand_rows(rows)
+    }
+
+    seats = []
+    for row, count in row_sizes(layout):
+        for number in range(1, count + 1):
+            seat = {'id': f'{row}{number}', 'row': row, 'number': number, 'status': status}
+            if aisles:
+                seat['aisle'] = number in aisles or (number - 1) in aisles
+            if row in row_classes:
+                seat['seat_class'] = row_classes[row]
+            seats.append(seat)
+    return seats
+
+
+def layout_capacity(layout):
+    return sum(count for _, count in row_sizes(layout))
+
+
+def layout_id_for(layout):
+    """Content-derived template id, so identical layouts share one template"""
+    digest = hashlib.sha1(json.dumps(layout, sort_keys=True).encode()).hexdigest()
+    return f'layout-{digest[:12]}'
+
+
+def save_layout(layout_id, layout):
+    get_firestore().collection(LAYOUTS_COLLECTION).document(layout_id).set(layout)
+    _layout_cache.set(layout_id, layout)
+    _seats_cache.delete(layout_id)
+
+
+def get_layout(layout_id):
+    """Get a layout template, from cache when possible"""
+    def load():
+        doc = get_firestore().collection(LAYOUTS_COLLECTION).document(layout_id).get()
+        return doc.to_dict() if doc.exists else None
+    return _layout_cache.get_or_set(layout_id, load)
+
+
+def _template_seats(layout_id):
+    def expand():
+        layout = get_layout(layout_id)
+        return tuple(generate_seats(layout)) if layout is not None else None
+    return _seats_cache.get_or_set(layout_id, expand)
+
+
+def materialize(showtime):
+    """Return the showtime with its full ``seats`` list and seat counts filled in"""
+    if not showtime or not showtime.get('layout_id'):
+        return showtime
+    seats = _template_seats(showtime['layout_id'])
+    if seats is None:
+        if showtime.get('seats'):
+            return showtime
+        raise LayoutNotFound(f"Screen layout {showtime['layout_id']} not found")
+
+    overlay = showtime.get('seat_overlay') or {}
+    if overlay:
+        merged = [
+            {**seat, 'status': overlay[seat['id']]} if seat['id'] in overlay else dict(seat)
+            for seat in seats
+        ]
+    else:
+        merged = [dict(seat) for seat in seats]
+
+    unavailable = sum(1 for status in overlay.values() if status != 'available')
+    return {
+        **showtime,
+        'seats': merged,
+        'total_seats': len(merged),
+        'available_seats': len(merged) - unavailable,
+    }
+
+
+def _layout_id_of(showtime_id):
+    """Layout id of a stored showtime ('' for inline-seat showtimes, None when it does not exist)"""
+    def load():
+        doc = (
+            get_firestore().collection(SHOWTIMES_COLLECTION).document(showtime_id)
+            .get(field_paths=['layout_id'])
+        )
+        # None is not cached, so a showtime created after a miss is found
+        if not doc.exists:
+            return None
+        return doc.to_dict().get('layout_id') or ''
+    return _showtime_layouts.get_or_set(showtime_id, load)
+
+
+def update_seat_status(showtime_id, seat_ids, status):
+    """
+    Record a status change in a template showtime's overlay.
+
+    Returns False for showtimes with inline seats, which the caller updates
+    the usual way. Available seats are removed from the overlay so it only
+    ever holds held or booked seats.
+    """
+    if not _layout_id_of(showtime_id):
+        return False
+
+    from firebase_admin import firestore
+
+    db = get_firestore()
+    showtime_ref = db.collection(SHOWTIMES_COLLECTION).document(showtime_id)
+    value = firestore.DELETE_FIELD if status == 'available' else status
+
+    batch = db.batch()
+    batch.update(showtime_ref, {f'seat_overlay.`{seat_id}`': value for seat_id in seat_ids})
+    if getattr(settings, 'SEAT_STATUS_MIRROR_DOCS', True):
+        # Clients subscribe to the seats subcollection for live updates
+        for seat_id in seat_ids:
+            batch.set(showtime_ref.collection(SEATS_COLLECTION).document(seat_id),
+                      {'status': status}, merge=True)
+    batch.commit()
+    return True
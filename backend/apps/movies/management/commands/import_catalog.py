@@ -0,0 +1,76 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.apps.movies import catalog_import
+
+
+class Command(BaseCommand):
+    help = 'Bulk import movies and showtimes (with generated seat maps) from JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file (records carry a "type") or CSV file')
+        parser.add_argument('--kind', choices=['movie', 'showtime'],
+                            help='Record type for every row (required for CSV)')
+        parser.add_argument('--layouts',
+                            help='JSON file mapping screen_number (or "default") to a seat layout')
+        parser.add_argument('--batch-size', type=int, default=catalog_import.MAX_BATCH_WRITES)
+        parser.add_argument('--concurrency', type=int, default=8)
+        seat_docs = parser.add_mutually_exclusive_group()
+        seat_docs.add_argument('--seat-docs', dest='seat_docs', action='store_true', default=None,
+                               help='Write a seats subcollection document per seat (default for --inline-seats)')
+        seat_docs.add_argument('--no-seat-docs', dest='seat_docs', action='store_false',
+                               help='Only store seats on the showtime document, not as a seats subcollection')
+        parser.add_argument('--inline-seats', action='store_true',
+                            help='Store the full seat list on each showtime instead of a layout template reference')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate and expand records without writing, and report throughput')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file for resuming (default: <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--progress-every', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        screen_layouts = {}
+        if options['layouts']:
+            with open(options['layouts']) as f:
+                screen_layouts = {str(key): value for key, value in json.load(f).items()}
+
+        checkpoint_path = None
+        skip = 0
+        if not options['dry_run']:
+            checkpoint_path = options['checkpoint'] or f"{options['path']}.checkpoint"
+            if not options['restart']:
+                skip = catalog_import.load_checkpoint(checkpoint_path)
+            if skip:
+                self.stdout.write(f'Resuming after {skip} committed records')
+
+        importer = catalog_import.CatalogImporter(
+            screen_layouts=screen_layouts,
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            dry_run=options['dry_run'],
+            seat_docs=options['seat_docs'],
+            inline_seats=options['inline_seats'],
+            progress=self.stdout.write,
+            progress_every=options['progress_every'],
+        )
+
+        try:
+            records = catalog_import.read_records(options['path'], options['kind'])
+            stats = importer.run(
+                records,
+                skip=skip,
+                checkpoint=(lambda done: catalog_import.save_checkpoint(checkpoint_path, done))
+                if checkpoint_path else None,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        seconds = stats['seconds'] or 1e-9
+        mode = 'Dry run' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}: {stats['movies']} movies, {stats['showtimes']} showtimes, {stats['layouts']} layouts, "
+            f"{stats['writes']} writes in {stats['batches']} batches, {stats['errors']} invalid records, "
+            f"{seconds:.1f}s ({stats['records'] / seconds:,.0f} records/s, {stats['writes'] / seconds:,.0f} writes/s)"
+        ))
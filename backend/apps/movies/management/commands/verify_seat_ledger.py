@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.apps.movies import seat_ledger
+from backend.utils.clients import get_firestore
+from backend.utils.firebase_utils import FirestoreService
+
+
+class Command(BaseCommand):
+    help = 'Compare each showtime\'s seat ledger with its stored seat map'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--showtime', action='append', dest='showtimes',
+                            help='Showtime id to check (repeatable); defaults to all ledgered showtimes')
+        parser.add_argument('--repair', action='store_true',
+                            help='Restore stored seat statuses and holders to the ledger state, recording the repair in the ledger')
+        parser.add_argument('--snapshot', action='store_true',
+                            help='Write a fresh snapshot and compact old ones after checking')
+
+    def handle(self, *args, **options):
+        showtime_ids = options['showtimes']
+        if not showtime_ids:
+            showtime_ids = [
+                doc.id for doc in
+                get_firestore().collection(seat_ledger.HEADS_COLLECTION).list_documents()
+            ]
+
+        mismatched = 0
+        for showtime_id in showtime_ids:
+            start = time.perf_counter()
+            seat_map, seq = seat_ledger.replay(showtime_id)
+            replay_ms = (time.perf_counter() - start) * 1000
+            if seat_map is None:
+                self.stdout.write(f'{showtime_id}: no ledger')
+                continue
+
+            showtime = FirestoreService.get_showtime(showtime_id)
+            if not showtime:
+                raise CommandError(f'Showtime {showtime_id} not found')
+
+            mismatches = seat_ledger.diff(seat_map, showtime)
+            self.stdout.write(
+                f'{showtime_id}: seq {seq}, {len(seat_map)} seats, '
+                f'replayed in {replay_ms:.1f} ms, {len(mismatches)} mismatches'
+            )
+            for seat_id, (expected, actual) in sorted(mismatches.items()):
+                self.stdout.write(f'  {seat_id}: ledger={expected} stored={actual}')
+
+            if mismatches:
+                mismatched += 1
+                if options['repair']:
+                    self._repair(showtime_id, seat_map, mismatches)
+
+            if options['snapshot']:
+                seat_ledger.take_snapshot(showtime_id)
+                seat_ledger.compact_snapshots(showtime_id)
+
+        if mismatched and not options['repair']:
+            raise CommandError(f'{mismatched} showtimes disagree with their ledger')
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(showtime_ids)} showtimes'))
+
+    def _repair(self, showtime_id, seat_map, mismatches):
+        # The last event on a seat names the booking holding it
+        holders = {}
+        for event in seat_ledger.events_after(showtime_id, 0):
+            for seat_id in event['seat_ids']:
+                holders[seat_id] = event.get('booking_id')
+
+        groups = {}
+        for seat_id in mismatches:
+            status = seat_map.get(seat_id)
+            if status in seat_ledger.STATUS_EVENT:
+                holder = holders.get(seat_id) if status != 'available' else None
+                groups.setdefault((status, holder), []).append(seat_id)
+        # Each repair is an event restating the ledger's state, written with
+        # the seats and their holders in one transaction
+        if groups:
+            seat_ledger.apply_changes(showtime_id, [
+                (seat_ledger.STATUS_EVENT[status], sorted(seat_ids), holder, None)
+                for (status, holder), seat_ids in groups.items()
+            ], check=False)
+        repaired = sum(len(seat_ids) for seat_ids in groups.values())
+        message = f'  repaired {repaired} seats'
+        if repaired < len(mismatches):
+            # Seats missing from the ledger have no status to restore
+            message += f', skipped {len(mismatches) - repaired} not in the ledger'
+        self.stdout.write(self.style.WARNING(message))
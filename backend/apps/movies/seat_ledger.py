@@ -0,0 +1,301 @@
+"""
+Append-only seat event ledger.
+
+Every change to a showtime's seats is recorded as an event under
+``showtimes/{showtime_id}/seat_events/{seq}``:
+
+    {'seq': 42, 'type': 'hold', 'seat_ids': [...], 'booking_id': ..., 'user_id': ..., 'at': ...}
+
+Seat changes and their events are written in the same transaction, so the
+ledger cannot drift from the stored seats and events are numbered in the
+order their writes were applied. The showtime also keeps ``seat_holders``,
+``{seat_id: booking_id}`` for held and booked seats, which ``apply_changes``
+checks so one booking cannot book or release another's seats.
+
+Every ``SEAT_LEDGER_SNAPSHOT_INTERVAL`` events the folded seat map is written
+as a snapshot under ``showtimes/{showtime_id}/seat_snapshots/{seq}``, so a
+showtime's state can be rebuilt from the latest snapshot plus a short tail of
+events. Snapshot 0 captures the seat map as it was when the ledger started.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from backend.apps.movies import layouts
+from backend.utils.clients import get_firestore
+
+SHOWTIMES_COLLECTION = 'showtimes'
+EVENTS_COLLECTION = 'seat_events'
+SNAPSHOTS_COLLECTION = 'seat_snapshots'
+HEADS_COLLECTION = 'seat_ledger_heads'
+
+HOLD = 'hold'
+RELEASE = 'release'
+BOOK = 'book'
+EXPIRE = 'expire'
+
+# Seat status each event type leaves behind
+EVENT_STATUS = {
+    HOLD: 'selected',
+    RELEASE: 'available',
+    BOOK: 'booked',
+    EXPIRE: 'available',
+}
+
+STATUS_EVENT = {
+    'selected': HOLD,
+    'available': RELEASE,
+    'booked': BOOK,
+}
+
+SNAPSHOT_INTERVAL = getattr(settings, 'SEAT_LEDGER_SNAPSHOT_INTERVAL', 200)
+
+
+def _seq_id(seq):
+    # Zero-padded so document ids sort in sequence order
+    return f'{seq:012d}'
+
+
+def _showtime_ref(showtime_id):
+    return get_firestore().collection(SHOWTIMES_COLLECTION).document(showtime_id)
+
+
+def seat_map_from_showtime(showtime):
+    """Return ``{seat_id: status}`` for a showtime document"""
+    showtime = layouts.materialize(showtime) or {}
+    return {seat['id']: seat.get('status', 'available') for seat in showtime.get('seats', [])}
+
+
+def apply_events(seat_map, events):
+    """Fold events (in sequence order) into a seat map, in place"""
+    for event in events:
+        new_status = EVENT_STATUS[event['type']]
+        for seat_id in event['seat_ids']:
+            seat_map[seat_id] = new_status
+    return seat_map
+
+
+def seat_conflicts(seat_map, holders, event_type, seat_ids, booking_id=None):
+    """
+    Return the seats of ``seat_ids`` that ``event_type`` cannot be applied to.
+
+    ``holders`` maps held or booked seats to their booking. A hold needs free
+    seats; a booking may not take seats booked or held by another booking; a
+    release or expiry may not free seats another booking holds.
+    """
+    conflicts = []
+    for seat_id in seat_ids:
+        current = seat_map.get(seat_id)
+        holder = holders.get(seat_id)
+        foreign = bool(holder and booking_id and holder != booking_id)
+        if current is None:
+            conflicts.append(seat_id)
+        elif event_type == HOLD and current != 'available':
+            conflicts.append(seat_id)
+        elif event_type == BOOK and (foreign or (current == 'booked' and not holder)):
+            conflicts.append(seat_id)
+        elif event_type in (RELEASE, EXPIRE) and current != 'available' and foreign:
+            conflicts.append(seat_id)
+    return conflicts
+
+
+def _seat_fields(showtime, seat_map, holders, seat_ids):
+    """Showtime field updates that store the new status and holder of ``seat_ids``"""
+    from firebase_admin import firestore
+
+    fields = {}
+    if showtime.get('layout_id'):
+        for seat_id in seat_ids:
+            status = seat_map[seat_id]
+            fields[f'seat_overlay.`{seat_id}`'] = firestore.DELETE_FIELD if status == 'available' else status
+    else:
+        seats = [
+            {**seat, 'status': seat_map.get(seat['id'], seat.get('status', 'available'))}
+            for seat in showtime.get('seats', [])
+        ]
+        fields['seats'] = seats
+        fields['available_seats'] = sum(1 for seat in seats if seat['status'] == 'available')
+    for seat_id in seat_ids:
+        fields[f'seat_holders.`{seat_id}`'] = holders.get(seat_id, firestore.DELETE_FIELD)
+    return fields
+
+
+def apply_changes(showtime_id, changes, check=True):
+    """
+    Change seats and append their events in a single transaction.
+
+    ``changes`` is ``[(event_type, seat_ids, booking_id, user_id), ...]``,
+    applied in order with one event each. With ``check`` a change whose seats
+    conflict (see ``seat_conflicts``) with the stored seat map is skipped.
+    Returns the conflicting seats of every change (``[]`` where applied).
+
+    The first change to a showtime also writes snapshot 0 and creates the
+    ledger head; ``create`` fails the transaction, which then retries, if
+    another writer started the ledger first.
+    """
+    from firebase_admin import firestore
+
+    for event_type, *_ in changes:
+        if event_type not in EVENT_STATUS:
+            raise ValueError(f'Unknown seat event type: {event_type}')
+
+    db = get_firestore()
+    showtime_ref = _showtime_ref(showtime_id)
+    head_ref = db.collection(HEADS_COLLECTION).document(showtime_id)
+    events_ref = showtime_ref.collection(EVENTS_COLLECTION)
+
+    @firestore.transactional
+    def _apply(transaction):
+        # Transactions read everything before writing
+        showtime_doc = showtime_ref.get(transaction=transaction)
+        head = head_ref.get(transaction=transaction)
+        if not showtime_doc.exists:
+            raise ValueError(f'Showtime {showtime_id} not found')
+        showtime = showtime_doc.to_dict()
+        seat_map = seat_map_from_showtime(showtime)
+        holders = dict(showtime.get('seat_holders') or {})
+        now = timezone.now()
+
+        if head.exists:
+            first_seq = seq = head.to_dict()['seq']
+        else:
+            first_seq = seq = 0
+            transaction.set(showtime_ref.collection(SNAPSHOTS_COLLECTION).document(_seq_id(0)), {
+                'seq': 0,
+                'seats': dict(seat_map),
+                'at': now,
+            })
+
+        results, changed = [], set()
+        for event_type, seat_ids, booking_id, user_id in changes:
+            conflicts = seat_conflicts(seat_map, holders, event_type, seat_ids, booking_id) if check else []
+            results.append(conflicts)
+            if conflicts:
+                continue
+            status = EVENT_STATUS[event_type]
+            for seat_id in seat_ids:
+                seat_map[seat_id] = status
+                if status == 'available':
+                    holders.pop(seat_id, None)
+                elif booking_id:
+                    holders[seat_id] = booking_id
+            changed.update(seat_ids)
+            seq += 1
+            transaction.set(events_ref.document(_seq_id(seq)), {
+                'seq': seq,
+                'type': event_type,
+                'seat_ids': list(seat_ids),
+                'booking_id': booking_id,
+                'user_id': user_id,
+                'at': now,
+            })
+
+        if changed:
+            transaction.update(showtime_ref, _seat_fields(showtime, seat_map, holders, changed))
+        if not head.exists:
+            transaction.create(head_ref, {'seq': seq})
+        elif seq != first_seq:
+            transaction.update(head_ref, {'seq': seq})
+        changed = {seat_id: seat_map[seat_id] for seat_id in changed}
+        return results, first_seq, seq, changed, bool(showtime.get('layout_id'))
+
+    results, first_seq, seq, changed, templated = _apply(db.transaction())
+
+    if changed and templated and getattr(settings, 'SEAT_STATUS_MIRROR_DOCS', True):
+        # Clients subscribe to the seats subcollection for live updates; it is
+        # derived from the overlay, so it is written after the transaction
+        _mirror_seats(showtime_id, changed)
+    if seq // SNAPSHOT_INTERVAL > first_seq // SNAPSHOT_INTERVAL:
+        take_snapshot(showtime_id)
+    return results
+
+
+def _mirror_seats(showtime_id, statuses):
+    db = get_firestore()
+    seats_ref = _showtime_ref(showtime_id).collection(layouts.SEATS_COLLECTION)
+    items = list(statuses.items())
+    for start in range(0, len(items), 500):
+        batch = db.batch()
+        for seat_id, status in items[start:start + 500]:
+            batch.set(seats_ref.document(seat_id), {'status': status}, merge=True)
+        batch.commit()
+
+
+def update_seats_status(showtime_id, seat_ids, status, booking_id=None, user_id=None, event_type=None):
+    """
+    Change seat status and record the change in the ledger, atomically.
+
+    Drop-in replacement for ``FirestoreService.update_seats_status``; the
+    event type is derived from ``status`` unless given (e.g. ``EXPIRE``).
+    """
+    apply_changes(showtime_id, [(event_type or STATUS_EVENT[status], list(seat_ids), booking_id, user_id)], check=False)
+
+
+def latest_snapshot(showtime_id, at_or_before=None):
+    """Return the newest snapshot, optionally no newer than sequence ``at_or_before``"""
+    from firebase_admin import firestore
+
+    query = _showtime_ref(showtime_id).collection(SNAPSHOTS_COLLECTION)
+    if at_or_before is not None:
+        query = query.where('seq', '<=', at_or_before)
+    query = query.order_by('seq', direction=firestore.Query.DESCENDING).limit(1)
+    for doc in query.stream():
+        return doc.to_dict()
+    return None
+
+
+def events_after(showtime_id, seq, up_to=None):
+    """Return events with sequence numbers greater than ``seq``, in order"""
+    query = _showtime_ref(showtime_id).collection(EVENTS_COLLECTION).where('seq', '>', seq)
+    if up_to is not None:
+        query = query.where('seq', '<=', up_to)
+    return [doc.to_dict() for doc in query.order_by('seq').stream()]
+
+
+def replay(showtime_id, up_to=None):
+    """
+    Rebuild a showtime's seat map from the latest snapshot and the event tail.
+
+    Returns ``(seat_map, seq)``; pass ``up_to`` to rebuild the state as of an
+    earlier sequence number. Returns ``(None, None)`` for unledgered showtimes.
+    """
+    snapshot = latest_snapshot(showtime_id, at_or_before=up_to)
+    if snapshot is None:
+        return None, None
+    tail = events_after(showtime_id, snapshot['seq'], up_to=up_to)
+    seat_map = apply_events(dict(snapshot['seats']), tail)
+    return seat_map, tail[-1]['seq'] if tail else snapshot['seq']
+
+
+def take_snapshot(showtime_id):
+    """Write a snapshot of the current folded state"""
+    seat_map, seq = replay(showtime_id)
+    if seat_map is None:
+        return None
+    snapshot = {'seq': seq, 'seats': seat_map, 'at': timezone.now()}
+    _showtime_ref(showtime_id).collection(SNAPSHOTS_COLLECTION).document(_seq_id(seq)).set(snapshot)
+    return snapshot
+
+
+def compact_snapshots(showtime_id, keep=3):
+    """Delete all but the newest ``keep`` snapshots (snapshot 0 is always kept)"""
+    from firebase_admin import firestore
+
+    snapshots_ref = _showtime_ref(showtime_id).collection(SNAPSHOTS_COLLECTION)
+    docs = list(snapshots_ref.order_by('seq', direction=firestore.Query.DESCENDING).stream())
+    deleted = 0
+    for doc in docs[keep:]:
+        if doc.to_dict()['seq'] != 0:
+            doc.reference.delete()
+            deleted += 1
+    return deleted
+
+
+def diff(ledger_map, showtime):
+    """Return ``{seat_id: (ledger_status, stored_status)}`` for disagreeing seats"""
+    stored = seat_map_from_showtime(showtime)
+    mismatches = {}
+    for seat_id in set(ledger_map) | set(stored):
+        expected, actual = ledger_map.get(seat_id), stored.get(seat_id)
+        if expected != actual:
+            mismatches[seat_id] = (expected, actual)
+    return mismatches
@@ -0,0 +1,497 @@
+"""
+Showtime-sharded seat ownership.
+
+With ``SEAT_SHARDING_ENABLED`` each worker process joins a consistent-hash
+ring of local workers. The worker that owns a showtime keeps its seat map in
+memory and applies hold/book/release commands one at a time on a single
+applier thread, so most conflicts are decided without a storage round trip.
+Commands for showtimes owned elsewhere are forwarded to the owner over a
+local socket (``multiprocessing.connection``).
+
+Membership is a directory (``SEAT_SHARD_DIR``, which must be set) of
+``<node>.addr`` files. Anyone who can write there can point workers at their
+own socket, and replies are unpickled, so the directory must belong to the
+worker's user and not be group or world writable; connections also
+authenticate with a key derived from ``SECRET_KEY``. Membership is
+per host: workers only join a ring with workers on the same machine, so with
+several hosts each host has its own owner for a showtime. Every write is
+therefore still checked against storage in the seat ledger transaction; an
+owner whose map turns out to be stale reloads it, as it does when ownership
+moves after workers join or leave.
+"""
+import atexit
+import bisect
+import hashlib
+import hmac
+import os
+import queue
+import socket
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Commands share their names with the seat ledger's event types
+HOLD = 'hold'
+BOOK = 'book'
+RELEASE = 'release'
+EXPIRE = 'expire'
+
+COMMAND_STATUS = {
+    HOLD: 'selected',
+    BOOK: 'booked',
+    RELEASE: 'available',
+    EXPIRE: 'available',
+}
+
+
+class SeatConflict(Exception):
+    """Raised when a seat command cannot be applied to the current seat map"""
+
+    def __init__(self, seat_ids):
+        self.seat_ids = seat_ids
+        super().__init__(f"Seats not available: {', '.join(seat_ids)}")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f'{node}#{i}')
+            bisect.insort(self._keys, key)
+            self._nodes[key] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f'{node}#{i}')
+            self._keys.remove(key)
+            del self._nodes[key]
+
+    def owner(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+class SeatOwner:
+    """
+    Holds seat maps for owned showtimes and applies commands sequentially.
+
+    ``loader(showtime_id)`` returns ``{seat_id: status}``, or
+    ``(seat_map, holders)`` with ``holders`` mapping held or booked seats to
+    their booking. ``persister(showtime_id, changes)`` writes
+    ``[(command, seat_ids, booking_id, user_id), ...]`` through to storage in
+    one transaction and returns the seats storage found in conflict for each
+    change. Commands queued while a batch is being applied are drained
+    together and written with one persister call per showtime, so each caller
+    only sees the outcome of its own showtime's write.
+
+    A map is reloaded from storage after ``max_age`` seconds, after a failed
+    write, and whenever storage rejects a change the map had accepted (which
+    means another host changed the showtime).
+    """
+
+    def __init__(self, loader, persister=None, max_age=None):
+        self.loader = loader
+        self.persister = persister
+        self.max_age = max_age
+        self.seat_maps = {}
+        self.holders = {}
+        self.loaded_at = {}
+        self.applied = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='seat-owner', daemon=True)
+        self._thread.start()
+
+    def submit(self, showtime_id, command, seat_ids, booking_id=None, user_id=None):
+        """Queue a command and return a Future resolving to the list of conflicting seats"""
+        future = Future()
+        self._queue.put((showtime_id, command, [(booking_id, list(seat_ids))], user_id, future, False))
+        return future
+
+    def submit_group(self, showtime_id, command, requests, user_id=None):
+        """
+        Queue one command for several bookings of a showtime.
+
+        ``requests`` is ``[(booking_id, seat_ids), ...]``; each booking is
+        checked and recorded on its own, and the seats of all that pass are
+        written in one transaction. Resolves to ``{booking_id: conflicting
+        seats}`` for those that did not.
+        """
+        future = Future()
+        requests = [(booking_id, list(seat_ids)) for booking_id, seat_ids in requests]
+        self._queue.put((showtime_id, command, requests, user_id, future, True))
+        return future
+
+    def drop(self, showtime_ids):
+        """Forget showtimes after ownership moved elsewhere"""
+        self._queue.put(('__drop__', list(showtime_ids)))
+
+    def _forget(self, showtime_id):
+        self.seat_maps.pop(showtime_id, None)
+        self.holders.pop(showtime_id, None)
+        self.loaded_at.pop(showtime_id, None)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.max_age is not None:
+                expired = time.monotonic() - self.max_age
+                for showtime_id, loaded_at in list(self.loaded_at.items()):
+                    if loaded_at < expired:
+                        self._forget(showtime_id)
+
+            # {showtime_id: [(item, results, [(index, change), ...]), ...]}
+            pending = {}
+            for item in batch:
+                if item[0] == '__drop__':
+                    for showtime_id in item[1]:
+                        self._forget(showtime_id)
+                    continue
+                showtime_id, command, requests, user_id, future, _ = item
+                results, accepted = [], []
+                try:
+                    for index, (booking_id, seat_ids) in enumerate(requests):
+                        conflicts = self._apply(showtime_id, command, seat_ids, booking_id)
+                        results.append(conflicts)
+                        if not conflicts:
+                            accepted.append((index, (command, seat_ids, booking_id, user_id)))
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+                pending.setdefault(showtime_id, []).append((item, results, accepted))
+
+            for showtime_id, jobs in pending.items():
+                changes = [change for _, _, accepted in jobs for _, change in accepted]
+                try:
+                    stored = (self.persister(showtime_id, changes) if self.persister and changes else None) or []
+                except Exception as e:
+                    # Nothing of this showtime's batch was written; storage is the source of truth on reload
+                    self._forget(showtime_id)
+                    for item, _, _ in jobs:
+                        item[4].set_exception(e)
+                    continue
+                if any(stored):
+                    self._forget(showtime_id)
+
+                position = 0
+                for item, results, accepted in jobs:
+                    for index, _ in accepted:
+                        if stored:
+                            results[index] = stored[position]
+                        position += 1
+                    _, _, requests, _, future, grouped = item
+                    self.applied += 1
+                    if grouped:
+                        future.set_result({
+                            booking_id: conflicts
+                            for (booking_id, _), conflicts in zip(requests, results) if conflicts
+                        })
+                    else:
+                        future.set_result(results[0])
+
+    def _apply(self, showtime_id, command, seat_ids, booking_id):
+        from backend.apps.movies.seat_ledger import seat_conflicts
+
+        seat_map = self.seat_maps.get(showtime_id)
+        if seat_map is None:
+            loaded = self.loader(showtime_id)
+            seat_map, holders = loaded if isinstance(loaded, tuple) else (loaded, {})
+            self.seat_maps[showtime_id] = seat_map = dict(seat_map)
+            self.holders[showtime_id] = dict(holders)
+            self.loaded_at[showtime_id] = time.monotonic()
+        holders = self.holders[showtime_id]
+
+        conflicts = seat_conflicts(seat_map, holders, command, seat_ids, booking_id)
+        if conflicts:
+            return conflicts
+
+        status = COMMAND_STATUS[command]
+        for seat_id in seat_ids:
+            seat_map[seat_id] = status
+            if status == 'available':
+                holders.pop(seat_id, None)
+            elif booking_id:
+                holders[seat_id] = booking_id
+        return []
+
+
+def shard_authkey():
+    """Connection key shared by this deployment's workers"""
+    return hmac.new(settings.SECRET_KEY.encode(), b'seat-shard', hashlib.sha256).digest()
+
+
+def check_shard_dir(path):
+    """Create the membership directory (mode 0700), refusing one that others could write to"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise ImproperlyConfigured(f'SEAT_SHARD_DIR {path} is not a directory')
+    if info.st_uid != os.getuid():
+        raise ImproperlyConfigured(f'SEAT_SHARD_DIR {path} is owned by another user')
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ImproperlyConfigured(f'SEAT_SHARD_DIR {path} is writable by other users')
+
+
+class SeatRouter:
+    """Routes seat commands to the owning worker, serving owned showtimes locally"""
+
+    def __init__(self, owner, shard_dir, authkey, node_id=None, refresh_interval=1.0):
+        self.owner = owner
+        self.shard_dir = shard_dir
+        self.node_id = node_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.authkey = authkey
+        self.refresh_interval = refresh_interval
+        self.address = os.path.join(shard_dir, f'{self.node_id}.sock')
+        self.ring = HashRing()
+        self._members = {}
+        self._refreshed_at = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._connections = threading.local()
+
+    def start(self, join=True):
+        """Start serving; with ``join=False`` the router only forwards commands"""
+        check_shard_dir(self.shard_dir)
+        if not join:
+            self.refresh(force=True)
+            return self
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self._serve, name='seat-router', daemon=True).start()
+        with open(os.path.join(self.shard_dir, f'{self.node_id}.addr'), 'w') as f:
+            f.write(f'{os.getpid()}\n{self.address}\n{socket.gethostname()}\n')
+        atexit.register(self.stop)
+        self.refresh(force=True)
+        return self
+
+    def stop(self):
+        try:
+            os.unlink(os.path.join(self.shard_dir, f'{self.node_id}.addr'))
+        except FileNotFoundError:
+            pass
+        if self._listener:
+            # Closing the listener also removes its socket file
+            listener, self._listener = self._listener, None
+            try:
+                listener.close()
+            except FileNotFoundError:
+                pass
+
+    def refresh(self, force=False):
+        """Re-read membership and rebuild the ring if workers joined or left"""
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            members = {}
+            for name in os.listdir(self.shard_dir):
+                if not name.endswith('.addr'):
+                    continue
+                path = os.path.join(self.shard_dir, name)
+                try:
+                    with open(path) as f:
+                        pid, address, *host = f.read().split()
+                    if host and host[0] != socket.gethostname():
+                        # Another host sharing the directory; its workers are not reachable from here
+                        continue
+                    if os.path.dirname(address) != self.shard_dir:
+                        # Workers only listen inside the membership directory
+                        continue
+                    os.kill(int(pid), 0)
+                except (OSError, ValueError):
+                    # Worker exited without cleaning up
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    continue
+                members[name[:-len('.addr')]] = address
+
+            if members.keys() != self._members.keys():
+                ring = HashRing(sorted(members))
+                moved = [
+                    showtime_id for showtime_id in list(self.owner.seat_maps)
+                    if ring.owner(showtime_id) != self.node_id
+                ]
+                self.ring = ring
+                if moved:
+                    self.owner.drop(moved)
+            self._members = members
+            self._refreshed_at = now
+
+    def execute(self, showtime_id, command, seat_ids, booking_id=None, user_id=None):
+        """Apply a command on the owning worker; raises ``SeatConflict`` on conflicts"""
+        conflicts = self._dispatch({
+            'showtime_id': showtime_id,
+            'command': command,
+            'seat_ids': list(seat_ids),
+            'booking_id': booking_id,
+            'user_id': user_id,
+        })
+        if conflicts:
+            raise SeatConflict(conflicts)
+
+    def execute_group(self, showtime_id, command, requests, user_id=None):
+        """Apply a command for several bookings on the owning worker; returns ``{booking_id: conflicts}``"""
+        return self._dispatch({
+            'showtime_id': showtime_id,
+            'command': command,
+            'requests': [(booking_id, list(seat_ids)) for booking_id, seat_ids in requests],
+            'user_id': user_id,
+        })
+
+    def _dispatch(self, message):
+        for _ in range(3):
+            self.refresh()
+            node = self.ring.owner(message['showtime_id'])
+            if node == self.node_id or node is None:
+                return self._submit(message).result()
+            try:
+                reply = self._forward(self._members[node], message)
+            except (OSError, EOFError, KeyError):
+                self.refresh(force=True)
+                continue
+            if reply.get('moved'):
+                self.refresh(force=True)
+                continue
+            if reply.get('error'):
+                raise RuntimeError(reply['error'])
+            return reply['conflicts']
+        raise RuntimeError(f"Could not reach the owner of showtime {message['showtime_id']}")
+
+    def _submit(self, message):
+        if 'requests' in message:
+            return self.owner.submit_group(
+                message['showtime_id'], message['command'], message['requests'], message.get('user_id'),
+            )
+        return self.owner.submit(
+            message['showtime_id'], message['command'], message['seat_ids'],
+            message.get('booking_id'), message.get('user_id'),
+        )
+
+    def _forward(self, address, message):
+        # Connections are reused per thread; a dead one is dropped and retried by the caller
+        connections = self._connections.__dict__
+        conn = connections.get(address)
+        if conn is None:
+            conn = connections[address] = Client(address, family='AF_UNIX', authkey=self.authkey)
+        try:
+            conn.send(message)
+            return conn.recv()
+        except (OSError, EOFError):
+            connections.pop(address, None)
+            conn.close()
+            raise
+
+    def _serve(self):
+        while self._listener:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self.refresh()
+                if self.ring.owner(message['showtime_id']) != self.node_id:
+                    conn.send({'moved': True})
+                    continue
+                try:
+                    conflicts = self._submit(message).result()
+                    conn.send({'conflicts': conflicts})
+                except Exception as e:
+                    conn.send({'error': str(e)})
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _load_seat_map(showtime_id):
+    from backend.apps.movies.seat_ledger import seat_map_from_showtime
+    from backend.utils.firebase_utils import FirestoreService
+
+    showtime = FirestoreService.get_showtime(showtime_id) or {}
+    return seat_map_from_showtime(showtime), dict(showtime.get('seat_holders') or {})
+
+
+def _persist(showtime_id, changes):
+    from backend.apps.movies import seat_ledger
+
+    return seat_ledger.apply_changes(showtime_id, changes)
+
+
+def get_router():
+    """Return this process's router, joining the ring on first use"""
+    global _router
+    if _router is None or _router.node_id != f'{socket.gethostname()}-{os.getpid()}':
+        with _router_lock:
+            if _router is None or _router.node_id != f'{socket.gethostname()}-{os.getpid()}':
+                shard_dir = getattr(settings, 'SEAT_SHARD_DIR', None)
+                if not shard_dir:
+                    raise ImproperlyConfigured('SEAT_SHARD_DIR must be set when SEAT_SHARDING_ENABLED is on')
+                owner = SeatOwner(_load_seat_map, _persist, max_age=getattr(settings, 'SEAT_SHARD_MAP_TTL', 60))
+                _router = SeatRouter(owner, shard_dir, shard_authkey()).start()
+    return _router
+
+
+def apply_seat_command(showtime_id, command, seat_ids, booking_id=None, user_id=None):
+    """
+    Hold, book, release or expire seats, raising ``SeatConflict`` if any seat is unavailable.
+
+    Routed through the owning worker when sharding is enabled; otherwise
+    checked and written in one seat ledger transaction.
+    """
+    if getattr(settings, 'SEAT_SHARDING_ENABLED', False):
+        return get_router().execute(showtime_id, command, seat_ids, booking_id, user_id)
+    conflicts = _persist(showtime_id, [(command, list(seat_ids), booking_id, user_id)])[0]
+    if conflicts:
+        raise SeatConflict(conflicts)
+
+
+def apply_seat_group(showtime_id, command, requests, user_id=None):
+    """
+    Hold, book, release or expire the seats of several bookings of one showtime.
+
+    ``requests`` is ``[(booking_id, seat_ids), ...]``. Each booking is checked
+    and recorded in the ledger on its own, but all of them are written in a
+    single transaction. Bookings whose seats conflict are skipped and
+    returned as ``{booking_id: conflicting seats}``.
+    """
+    if getattr(settings, 'SEAT_SHARDING_ENABLED', False):
+        return get_router().execute_group(showtime_id, command, requests, user_id)
+
+    changes = [(command, list(seat_ids), booking_id, user_id) for booking_id, seat_ids in requests]
+    results = _persist(showtime_id, changes)
+    return {booking_id: conflicts for (booking_id, _), conflicts in zip(requests, results) if conflicts}
@@ -5,6 +5,8 @@ class SeatSerializer(serializers.Serializer):
     row = serializers.CharField()
     number = serializers.IntegerField()
     status = serializers.CharField()
+    seat_class = serializers.CharField(required=False)
+    aisle = serializers.BooleanField(required=False)
 
 class ShowTimeSerializer(serializers.Serializer):
     id = serializers.CharField()
@@ -16,6 +18,7 @@ class ShowTimeSerializer(serializers.Serializer):
     total_seats = serializers.IntegerField()
     available_seats = serializers.IntegerField()
     screen_number = serializers.IntegerField()
+    layout_id = serializers.CharField(required=False)
     seats = SeatSerializer(many=True, read_only=True)
 
 class MovieSerializer(serializers.Serializer):
@@ -1,9 +1,43 @@
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from backend.apps.movies.serializers import MovieSerializer, ShowTimeSerializer
+from backend.apps.movies import layouts
 from backend.utils.firebase_utils import FirestoreService
+from backend.utils.resilience import dependency, DependencyUnavailable, unavailable_response, stale_response
+
+logger = logging.getLogger(__name__)
+
+# Seat maps change with every booking, so stale fallbacks keep only the schedule
+SEAT_FIELDS = ('seats', 'seat_overlay', 'seat_holders')
+
+
+def _without_seats(showtime):
+    if not showtime:
+        return showtime
+    return {key: value for key, value in showtime.items() if key not in SEAT_FIELDS}
+
+
+def _showtimes_without_seats(showtimes):
+    return [_without_seats(showtime) for showtime in showtimes]
+
+
+def _load_showtimes(movie_id):
+    showtimes = []
+    for showtime in FirestoreService.get_showtimes(movie_id):
+        try:
+            showtimes.append(layouts.materialize(showtime))
+        except layouts.LayoutNotFound as e:
+            # One broken showtime should not take the whole schedule down
+            logger.warning('Skipping showtime %s: %s', showtime.get('id'), e)
+    return showtimes
+
+
+def _load_showtime(showtime_id):
+    return layouts.materialize(FirestoreService.get_showtime(showtime_id))
 
 class MovieViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
@@ -11,9 +45,11 @@ class MovieViewSet(viewsets.ViewSet):
     def list(self, request):
         """Get all movies"""
         try:
-            movies = FirestoreService.get_movies()
+            movies, stale = dependency('catalog').call_with_fallback(('movies',), FirestoreService.get_movies)
             serializer = MovieSerializer(movies, many=True)
-            return Response(serializer.data)
+            return stale_response(serializer.data, stale)
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -23,14 +59,16 @@ class MovieViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """Get a specific movie"""
         try:
-            movie = FirestoreService.get_movie(pk)
+            movie, stale = dependency('catalog').call_with_fallback(('movie', pk), FirestoreService.get_movie, pk)
             if not movie:
                 return Response(
                     {'error': 'Movie not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             serializer = MovieSerializer(movie)
-            return Response(serializer.data)
+            return stale_response(serializer.data, stale)
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -41,9 +79,13 @@ class MovieViewSet(viewsets.ViewSet):
     def showtimes(self, request, pk=None):
         """Get showtimes for a specific movie"""
         try:
-            showtimes = FirestoreService.get_showtimes(pk)
+            showtimes, stale = dependency('catalog').call_with_fallback(
+                ('showtimes', pk), _load_showtimes, pk, keep=_showtimes_without_seats
+            )
             serializer = ShowTimeSerializer(showtimes, many=True)
-            return Response(serializer.data)
+            return stale_response(serializer.data, stale)
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -57,9 +99,13 @@ class ShowTimeViewSet(viewsets.ViewSet):
         """Get all showtimes"""
         try:
             movie_id = request.query_params.get('movie_id')
-            showtimes = FirestoreService.get_showtimes(movie_id)
+            showtimes, stale = dependency('catalog').call_with_fallback(
+                ('showtimes', movie_id), _load_showtimes, movie_id, keep=_showtimes_without_seats
+            )
             serializer = ShowTimeSerializer(showtimes, many=True)
-            return Response(serializer.data)
+            return stale_response(serializer.data, stale)
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -69,14 +115,23 @@ class ShowTimeViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """Get a specific showtime"""
         try:
-            showtime = FirestoreService.get_showtime(pk)
+            showtime, stale = dependency('catalog').call_with_fallback(
+                ('showtime', pk), _load_showtime, pk, keep=_without_seats
+            )
             if not showtime:
                 return Response(
                     {'error': 'Showtime not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             serializer = ShowTimeSerializer(showtime)
-            return Response(serializer.data)
+            return stale_response(serializer.data, stale)
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except layouts.LayoutNotFound as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -87,13 +142,21 @@ class ShowTimeViewSet(viewsets.ViewSet):
     def seats(self, request, pk=None):
         """Get seats for a specific showtime"""
         try:
-            showtime = FirestoreService.get_showtime(pk)
+            # Live availability: no stale fallback, a wrong seat map is worse than none
+            showtime = dependency('catalog').call(_load_showtime, pk)
             if not showtime:
                 return Response(
                     {'error': 'Showtime not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             return Response(showtime.get('seats', []))
+        except DependencyUnavailable as e:
+            return unavailable_response(e)
+        except layouts.LayoutNotFound as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -0,0 +1,70 @@
+import json
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from backend.apps.tasks import registry
+from backend.apps.tasks.worker import Worker, write_metrics
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers against the local task queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=0.5)
+        parser.add_argument('--stats-every', type=float, default=60.0,
+                            help='Seconds between metrics reports (0 to disable)')
+        parser.add_argument('--until-empty', action='store_true',
+                            help='Exit once no tasks are queued or running')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print queue depth per task type and exit')
+        parser.add_argument('--purge', action='store_true',
+                            help='Delete finished tasks older than a week and exit')
+
+    def handle(self, *args, **options):
+        queue = registry.get_queue()
+        if options['stats']:
+            self.stdout.write(json.dumps(queue.depth(), indent=2))
+            return
+        if options['purge']:
+            self.stdout.write(f'Purged {queue.purge()} finished tasks')
+            return
+
+        tasks = registry.autodiscover()
+        self.stdout.write(f"Registered tasks: {', '.join(sorted(tasks)) or 'none'}")
+
+        worker = Worker(
+            queue,
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: worker.stop())
+
+        reporter = None
+        if options['stats_every'] > 0:
+            reporter = threading.Thread(
+                target=self._report, args=(worker, options['stats_every']), daemon=True
+            )
+            reporter.start()
+
+        worker.run(until_empty=options['until_empty'])
+        self._print_metrics(worker)
+
+    def _report(self, worker, interval):
+        while not worker.wait_stopped(interval):
+            self._print_metrics(worker)
+
+    def _print_metrics(self, worker):
+        snapshot = worker.metrics.snapshot(worker.queue.depth())
+        write_metrics(snapshot)
+        for name, stats in snapshot.items():
+            self.stdout.write(
+                f"{name}: {stats['succeeded']} ok ({stats['per_second']}/s), {stats['retried']} retried, "
+                f"{stats['failed']} failed, avg run {stats['avg_run_ms']} ms, avg wait {stats['avg_wait_ms']} ms, "
+                f"queued {stats['queued']}, running {stats['running']}, dead {stats['dead']}"
+            )
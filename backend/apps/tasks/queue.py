@@ -0,0 +1,163 @@
+"""
+Durable local task queue backed by SQLite.
+
+Tasks survive process restarts. Workers claim tasks with a lease; a task
+whose worker dies is picked up again once its lease expires. Lower
+``priority`` values run first. Failed tasks are retried with exponential
+backoff until ``max_retries`` is exhausted, then kept with state ``failed``.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, priority, run_at);
+"""
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TaskQueue:
+    def __init__(self, path, max_depth=10000):
+        self.path = str(path)
+        self.max_depth = max_depth
+        self._local = threading.local()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, name, args=(), kwargs=None, priority=5, max_retries=5, delay=0,
+                block=False, timeout=5.0):
+        """
+        Add a task and return its id.
+
+        Raises ``QueueFull`` when ``max_depth`` tasks are already pending; with
+        ``block=True`` waits up to ``timeout`` seconds for room first.
+        """
+        payload = json.dumps({'args': list(args), 'kwargs': kwargs or {}})
+        deadline = time.monotonic() + timeout
+        while self.pending() >= self.max_depth:
+            if not block or time.monotonic() >= deadline:
+                raise QueueFull(f'Task queue is full ({self.max_depth} pending)')
+            time.sleep(0.05)
+
+        now = time.time()
+        cursor = self._conn().execute(
+            'INSERT INTO tasks (name, payload, priority, state, max_retries, run_at, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (name, payload, priority, QUEUED, max_retries, now + delay, now),
+        )
+        return cursor.lastrowid
+
+    def claim(self, limit=1, lease_seconds=60):
+        """Lease up to ``limit`` ready tasks (including ones whose lease expired)"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT * FROM tasks WHERE (state = ? AND run_at <= ?) OR (state = ? AND lease_until < ?) '
+                'ORDER BY priority, run_at LIMIT ?',
+                (QUEUED, now, RUNNING, now, limit),
+            ).fetchall()
+            conn.executemany(
+                'UPDATE tasks SET state = ?, attempts = attempts + 1, lease_until = ? WHERE id = ?',
+                [(RUNNING, now + lease_seconds, row['id']) for row in rows],
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        tasks = []
+        for row in rows:
+            payload = json.loads(row['payload'])
+            tasks.append({
+                'id': row['id'],
+                'name': row['name'],
+                'args': payload['args'],
+                'kwargs': payload['kwargs'],
+                'priority': row['priority'],
+                'attempts': row['attempts'] + 1,
+                'max_retries': row['max_retries'],
+                'created_at': row['created_at'],
+                'run_at': row['run_at'],
+            })
+        return tasks
+
+    def complete(self, task_id):
+        self._conn().execute(
+            'UPDATE tasks SET state = ?, finished_at = ?, lease_until = NULL WHERE id = ?',
+            (DONE, time.time(), task_id),
+        )
+
+    def fail(self, task, error, base_delay=2.0, max_delay=300.0):
+        """Schedule a retry with exponential backoff, or mark the task failed. Returns True if retried"""
+        retry = task['attempts'] <= task['max_retries']
+        if retry:
+            delay = min(base_delay * 2 ** (task['attempts'] - 1), max_delay)
+            self._conn().execute(
+                'UPDATE tasks SET state = ?, run_at = ?, lease_until = NULL, last_error = ? WHERE id = ?',
+                (QUEUED, time.time() + delay, error, task['id']),
+            )
+        else:
+            self._conn().execute(
+                'UPDATE tasks SET state = ?, finished_at = ?, lease_until = NULL, last_error = ? WHERE id = ?',
+                (FAILED, time.time(), error, task['id']),
+            )
+        return retry
+
+    def pending(self):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)', (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def depth(self):
+        """Return ``{task_name: {state: count}}`` for unfinished and failed tasks"""
+        rows = self._conn().execute(
+            'SELECT name, state, COUNT(*) AS n FROM tasks WHERE state != ? GROUP BY name, state', (DONE,)
+        ).fetchall()
+        depth = {}
+        for row in rows:
+            depth.setdefault(row['name'], {})[row['state']] = row['n']
+        return depth
+
+    def purge(self, older_than=7 * 24 * 3600):
+        """Delete finished tasks older than ``older_than`` seconds"""
+        cursor = self._conn().execute(
+            'DELETE FROM tasks WHERE state = ? AND finished_at < ?', (DONE, time.time() - older_than)
+        )
+        return cursor.rowcount
@@ -0,0 +1,75 @@
+"""
+Task registration and enqueueing.
+
+    from backend.apps.tasks.registry import task
+
+    @task(priority=1, max_retries=3)
+    def send_booking_confirmation(booking_id):
+        ...
+
+    send_booking_confirmation.enqueue(booking_id)
+
+Tasks live in each app's ``tasks.py`` and must take JSON-serialisable
+arguments. Lower priority numbers run first.
+"""
+import threading
+
+from django.conf import settings
+
+from backend.apps.tasks.queue import TaskQueue
+
+_registry = {}
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = TaskQueue(
+                    settings.TASK_QUEUE_PATH,
+                    max_depth=getattr(settings, 'TASK_QUEUE_MAX_DEPTH', 10000),
+                )
+    return _queue
+
+
+class Task:
+    def __init__(self, func, name, priority, max_retries):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_retries = max_retries
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, priority=None, delay=0, **kwargs):
+        """Queue the task to run in a worker; raises ``QueueFull`` under backpressure"""
+        return get_queue().enqueue(
+            self.name, args, kwargs,
+            priority=self.priority if priority is None else priority,
+            max_retries=self.max_retries,
+            delay=delay,
+        )
+
+
+def task(name=None, priority=5, max_retries=5):
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registered = Task(func, task_name, priority, max_retries)
+        _registry[task_name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def autodiscover():
+    """Import ``tasks`` modules of all installed apps so their tasks register"""
+    from django.utils.module_loading import autodiscover_modules
+    autodiscover_modules('tasks')
+    return dict(_registry)
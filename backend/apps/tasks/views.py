@@ -0,0 +1,22 @@
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from backend.apps.tasks import registry
+from backend.apps.tasks.worker import read_metrics
+
+
+class TaskViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        """Get queue depth per task type and the latest metrics of each worker"""
+        try:
+            return Response({
+                'depth': registry.get_queue().depth(),
+                'workers': read_metrics(),
+            })
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,177 @@
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+from backend.apps.tasks import registry
+
+logger = logging.getLogger(__name__)
+
+
+def metrics_path(worker_id=None):
+    """Metrics file of one worker process (``*`` matches every worker's)"""
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    return f'{settings.TASK_QUEUE_PATH}.metrics.{worker_id}.json'
+
+
+def write_metrics(snapshot):
+    """Publish this worker's metrics snapshot for the staff endpoint"""
+    path = metrics_path()
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({
+            'host': socket.gethostname(), 'pid': os.getpid(), 'at': time.time(), 'tasks': snapshot,
+        }, f)
+    os.replace(tmp, path)
+
+
+def read_metrics(max_age=600):
+    """Latest snapshot of each worker that reported within ``max_age`` seconds"""
+    workers = []
+    for path in glob.glob(metrics_path('*')):
+        try:
+            with open(path) as f:
+                metrics = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if time.time() - metrics.get('at', 0) <= max_age:
+            workers.append(metrics)
+    return sorted(workers, key=lambda metrics: (metrics.get('host', ''), metrics.get('pid', 0)))
+
+
+def run_task(name, args, kwargs):
+    """Execute one task by name (module-level so process pools can pickle it)"""
+    return registry.get_task(name)(*args, **kwargs)
+
+
+def _init_process():
+    import django
+    django.setup()
+    registry.autodiscover()
+
+
+class TaskMetrics:
+    """Per-task-type counters and timings for one worker"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, outcome, seconds, wait_seconds):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                'succeeded': 0, 'retried': 0, 'failed': 0,
+                'run_seconds': 0.0, 'wait_seconds': 0.0,
+            })
+            stats[outcome] += 1
+            stats['run_seconds'] += seconds
+            stats['wait_seconds'] += wait_seconds
+
+    def snapshot(self, depth=None):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        depth = depth or {}
+        report = {}
+        with self._lock:
+            names = set(self._stats) | set(depth)
+            for name in sorted(names):
+                stats = self._stats.get(name, {})
+                runs = sum(stats.get(key, 0) for key in ('succeeded', 'retried', 'failed'))
+                report[name] = {
+                    'succeeded': stats.get('succeeded', 0),
+                    'retried': stats.get('retried', 0),
+                    'failed': stats.get('failed', 0),
+                    'per_second': round(stats.get('succeeded', 0) / elapsed, 3),
+                    'avg_run_ms': round(stats.get('run_seconds', 0) * 1000 / runs, 1) if runs else None,
+                    'avg_wait_ms': round(stats.get('wait_seconds', 0) * 1000 / runs, 1) if runs else None,
+                    'queued': depth.get(name, {}).get('queued', 0),
+                    'running': depth.get(name, {}).get('running', 0),
+                    'dead': depth.get(name, {}).get('failed', 0),
+                }
+        return report
+
+
+class Worker:
+    """
+    Pulls tasks from the queue and runs them on a thread or process pool.
+
+    Only as many tasks are claimed as there are free slots, so the queue
+    itself absorbs bursts and unclaimed tasks stay available to other workers.
+    """
+
+    def __init__(self, queue=None, concurrency=4, pool='thread', poll_interval=0.5, lease_seconds=60):
+        self.queue = queue or registry.get_queue()
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.metrics = TaskMetrics()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        if pool == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='task')
+
+    def stop(self):
+        self._stop.set()
+
+    def wait_stopped(self, timeout=None):
+        """Block until ``stop()`` is called or ``timeout`` seconds pass; returns whether it was called"""
+        return self._stop.wait(timeout)
+
+    def run(self, until_empty=False):
+        try:
+            while not self._stop.is_set():
+                # Wait for one free slot, then take any others that are free too
+                if not self._slots.acquire(timeout=self.poll_interval):
+                    continue
+                free = 1
+                while free < self.concurrency and self._slots.acquire(blocking=False):
+                    free += 1
+                tasks = self.queue.claim(limit=free, lease_seconds=self.lease_seconds)
+                for _ in range(free - len(tasks)):
+                    self._slots.release()
+
+                for task in tasks:
+                    self._submit(task)
+
+                if not tasks:
+                    if until_empty and self.queue.pending() == 0:
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def _submit(self, task):
+        started = time.monotonic()
+        # From when this attempt became due, so retry backoff does not count as waiting
+        wait_seconds = max(time.time() - task.get('run_at', task['created_at']), 0)
+        try:
+            future = self.executor.submit(run_task, task['name'], task['args'], task['kwargs'])
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._finished(task, f, started, wait_seconds))
+
+    def _finished(self, task, future, started, wait_seconds):
+        seconds = time.monotonic() - started
+        try:
+            error = future.exception()
+            if error is None:
+                self.queue.complete(task['id'])
+                outcome = 'succeeded'
+            else:
+                message = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+                retried = self.queue.fail(task, message)
+                outcome = 'retried' if retried else 'failed'
+                logger.warning('Task %s (%s) %s: %s', task['id'], task['name'], outcome, error)
+            self.metrics.record(task['name'], outcome, seconds, wait_seconds)
+        finally:
+            self._slots.release()
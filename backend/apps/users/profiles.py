@@ -0,0 +1,75 @@
+"""
+Cached access to user profiles.
+
+Profiles are read on every login and most profile requests but change rarely,
+so reads go through a per-process TTL cache. Whole-profile writes go to
+Firestore and then drop the cached entry, since what the write returns may
+be partial; field updates patch the cached copy. Either way a worker sees its
+own writes; other workers see them once their entry expires.
+"""
+import copy
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend.utils.cache import TTLCache
+from backend.utils.clients import get_firestore
+from backend.utils.firebase_utils import FirestoreService
+
+USERS_COLLECTION = 'users'
+
+profile_cache = TTLCache(
+    maxsize=getattr(settings, 'PROFILE_CACHE_MAX_SIZE', 10000),
+    ttl=getattr(settings, 'PROFILE_CACHE_TTL', 300),
+)
+
+
+class ProfileNotFound(Exception):
+    pass
+
+
+def get_user_profile(user_id):
+    """Get a user's profile, from cache when possible"""
+    profile = profile_cache.get_or_set(
+        user_id, lambda: FirestoreService.get_user_profile(user_id)
+    )
+    return copy.deepcopy(profile)
+
+
+def update_user_profile(user_id, profile_data):
+    """Write a profile to Firestore and drop the cached copy; the next read fetches the stored profile"""
+    profile = FirestoreService.update_user_profile(user_id, profile_data)
+    profile_cache.delete(user_id)
+    return profile
+
+
+def update_profile_fields(user_id, prefix, fields):
+    """
+    Update individual nested fields of a profile without reading it first.
+
+    ``update_profile_fields(uid, 'notification_preferences', {'sms': True})``
+    writes only ``notification_preferences.sms``. Raises ``ProfileNotFound``
+    if the profile document does not exist.
+    """
+    from firebase_admin import firestore
+    from google.api_core.exceptions import NotFound
+
+    updates = {f'{prefix}.{name}': value for name, value in fields.items()}
+    updates['updated_at'] = firestore.SERVER_TIMESTAMP
+
+    try:
+        get_firestore().collection(USERS_COLLECTION).document(user_id).update(updates)
+    except NotFound:
+        profile_cache.delete(user_id)
+        raise ProfileNotFound(user_id)
+
+    # Patch the cached copy in place rather than re-reading the document
+    cached = profile_cache.get(user_id)
+    if cached is None:
+        return get_user_profile(user_id)
+
+    profile = copy.deepcopy(cached)
+    profile.setdefault(prefix, {}).update(fields)
+    profile['updated_at'] = timezone.now()
+    profile_cache.set(user_id, profile)
+    return copy.deepcopy(profile)
@@ -3,10 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import update_session_auth_hash
-from .serializers import UserSerializer, ProfileSerializer, UserRegistrationSerializer, PasswordChangeSerializer
-from backend.utils.firebase_utils import FirestoreService
-import firebase_admin
-from firebase_admin import auth
+from .serializers import UserSerializer, ProfileSerializer, UserRegistrationSerializer, PasswordChangeSerializer, NotificationPreferencesSerializer
+from backend.utils.clients import get_auth
+from . import profiles
 
 class UserViewSet(viewsets.ViewSet):
     def get_permissions(self):
@@ -17,7 +16,7 @@ class UserViewSet(viewsets.ViewSet):
     def list(self, request):
         """Get current user's profile"""
         try:
-            user_profile = FirestoreService.get_user_profile(request.user.id)
+            user_profile = profiles.get_user_profile(request.user.id)
             if not user_profile:
                 return Response(
                     {'error': 'Profile not found'},
@@ -44,7 +43,7 @@ class UserViewSet(viewsets.ViewSet):
             serializer.is_valid(raise_exception=True)
 
             # Create user in Firebase Auth
-            user = auth.create_user(
+            user = get_auth().create_user(
                 email=serializer.validated_data['email'],
                 password=serializer.validated_data['password'],
                 display_name=f"{serializer.validated_data['first_name']} {serializer.validated_data['last_name']}"
@@ -52,6 +51,7 @@ class UserViewSet(viewsets.ViewSet):
 
             # Create user profile in Firestore
             profile_data = {
+                'email': serializer.validated_data['email'],
                 'first_name': serializer.validated_data['first_name'],
                 'last_name': serializer.validated_data['last_name'],
                 'phone_number': serializer.validated_data.get('phone_number', ''),
@@ -62,7 +62,7 @@ class UserViewSet(viewsets.ViewSet):
                     'sms': False
                 }
             }
-            FirestoreService.update_user_profile(user.uid, profile_data)
+            profiles.update_user_profile(user.uid, profile_data)
 
             return Response(
                 {'message': 'User registered successfully'},
@@ -86,11 +86,11 @@ class UserViewSet(viewsets.ViewSet):
                 )
 
             # Verify the Firebase ID token
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = get_auth().verify_id_token(id_token)
             firebase_uid = decoded_token['uid']
 
             # Get or create user profile
-            user_profile = FirestoreService.get_user_profile(firebase_uid)
+            user_profile = profiles.get_user_profile(firebase_uid)
             if not user_profile:
                 # Create new profile if it doesn't exist
                 profile_data = {
@@ -104,7 +104,7 @@ class UserViewSet(viewsets.ViewSet):
                         'sms': False
                     }
                 }
-                user_profile = FirestoreService.update_user_profile(firebase_uid, profile_data)
+                user_profile = profiles.update_user_profile(firebase_uid, profile_data)
 
             return Response({
                 'user': {
@@ -127,7 +127,7 @@ class UserViewSet(viewsets.ViewSet):
             serializer.is_valid(raise_exception=True)
 
             # Update password in Firebase Auth
-            auth.update_user(
+            get_auth().update_user(
                 request.user.id,
                 password=serializer.validated_data['new_password']
             )
@@ -145,7 +145,7 @@ class ProfileViewSet(viewsets.ViewSet):
     def list(self, request):
         """Get current user's profile"""
         try:
-            profile = FirestoreService.get_user_profile(request.user.id)
+            profile = profiles.get_user_profile(request.user.id)
             if not profile:
                 return Response(
                     {'error': 'Profile not found'},
@@ -166,7 +166,7 @@ class ProfileViewSet(viewsets.ViewSet):
             serializer = ProfileSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
 
-            profile = FirestoreService.update_user_profile(
+            profile = profiles.update_user_profile(
                 request.user.id,
                 serializer.validated_data
             )
@@ -182,24 +182,25 @@ class ProfileViewSet(viewsets.ViewSet):
     def update_notification_preferences(self, request):
         """Update notification preferences"""
         try:
-            preferences = request.data.get('notification_preferences', {})
-            
-            profile = FirestoreService.get_user_profile(request.user.id)
-            if not profile:
+            preferences = NotificationPreferencesSerializer(
+                data=request.data.get('notification_preferences', {}),
+                partial=True
+            )
+            preferences.is_valid(raise_exception=True)
+
+            # Update only the submitted preference fields, without a read-modify-write
+            try:
+                updated_profile = profiles.update_profile_fields(
+                    request.user.id,
+                    'notification_preferences',
+                    preferences.validated_data
+                )
+            except profiles.ProfileNotFound:
                 return Response(
                     {'error': 'Profile not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Update only notification preferences
-            current_preferences = profile.get('notification_preferences', {})
-            current_preferences.update(preferences)
-            
-            updated_profile = FirestoreService.update_user_profile(
-                request.user.id,
-                {'notification_preferences': current_preferences}
-            )
-
             return Response(ProfileSerializer(updated_profile).data)
         except Exception as e:
             return Response(
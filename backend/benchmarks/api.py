@@ -0,0 +1,474 @@
+"""
+View and serializer microbenchmarks with regression baselines.
+
+Builds synthetic fixtures (a large catalog, showtimes with big seat maps, a
+user with a long booking history) in the in-memory backend from
+``memory_backend``, then times every case: viewset actions through the DRF
+test client, and the serializers on their own. Each case reports mean, p50
+and p95 wall time and the peak memory allocated per call (``tracemalloc``),
+and is compared with the committed baseline (``api_baseline.json``). The
+exit status is 1 if any case is slower or allocates more than the baseline
+by more than the thresholds.
+
+Actions whose cost is an external call (Stripe payments, Firebase Auth,
+ticket rendering, analytics scans) are covered by their own benchmarks or
+left out.
+
+Usage:
+    python -m backend.benchmarks.api
+    python -m backend.benchmarks.api --only bookings --iterations 100
+    python -m backend.benchmarks.api --threshold 0.5 --alloc-threshold 0.05
+    python -m backend.benchmarks.api --update-baseline
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+BASELINE = Path(__file__).resolve().parent / 'api_baseline.json'
+
+USER_ID = 'bench-user'
+GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Sci-Fi', 'Animation']
+
+
+class Case:
+
+    def __init__(self, name, run, setup=None, expect=200):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.expect = expect
+
+    def call(self, arg):
+        result = self.run(arg)
+        status_code = getattr(result, 'status_code', None)
+        if status_code is not None and status_code != self.expect:
+            raise RuntimeError(f'{self.name}: expected HTTP {self.expect}, got {status_code}: {result.content[:300]!r}')
+        return result
+
+
+def build_fixtures(backend, movies, showtimes_per_movie, rows, seats_per_row, history, seed=7):
+    """Write the synthetic catalog, seat maps and booking history; returns ids the cases use"""
+    from django.utils import timezone
+
+    from backend.apps.bookings import summaries
+    from backend.apps.movies import layouts
+
+    rng = random.Random(seed)
+    db = backend.db
+    now = timezone.now().replace(microsecond=0)
+
+    layout = {
+        'rows': 'A-' + 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[rows - 1],
+        'seats_per_row': seats_per_row,
+        'aisles': [seats_per_row // 4, seats_per_row - seats_per_row // 4],
+        'seat_classes': {'premium': ['A', 'B']},
+    }
+    layout_id = layouts.layout_id_for(layout)
+    layouts.save_layout(layout_id, layout)
+    seats = layouts.generate_seats(layout)
+    seat_ids = [seat['id'] for seat in seats]
+
+    showtimes = []
+    for m in range(movies):
+        movie_id = f'movie-{m:05d}'
+        title = f'Benchmark Feature {m}'
+        db.collection('movies').document(movie_id).set({
+            'title': title,
+            'description': 'A synthetic film used to benchmark the API. ' * 6,
+            'duration': 90 + m % 60,
+            'language': 'en',
+            'release_date': f'2026-{1 + m % 12:02d}-{1 + m % 28:02d}',
+            'poster_url': f'https://images.example.com/posters/{movie_id}.jpg',
+            'genre': GENRES[m % len(GENRES)],
+            'rating': round(5 + m % 50 / 10, 1),
+        })
+        for k in range(showtimes_per_movie):
+            showtime_id = f'showtime-{m:05d}-{k}'
+            start = now + timedelta(hours=3 * k + m % 24)
+            overlay = {seat_id: 'booked' for seat_id in rng.sample(seat_ids, len(seat_ids) * 3 // 10)}
+            showtime = {
+                'movie_id': movie_id,
+                'movie_title': title,
+                'start_time': start,
+                'end_time': start + timedelta(minutes=120),
+                'price': 12.5,
+                'screen_number': 1 + (m + k) % 12,
+                'layout_id': layout_id,
+                'seat_overlay': overlay,
+                'total_seats': len(seat_ids),
+                'available_seats': len(seat_ids) - len(overlay),
+            }
+            db.collection('showtimes').document(showtime_id).set(showtime)
+            showtimes.append({'id': showtime_id, **showtime})
+
+    # Older showtimes keep their seats inline rather than in a layout overlay
+    inline_seats = layouts.generate_seats(layout)
+    for seat in rng.sample(inline_seats, len(inline_seats) * 3 // 10):
+        seat['status'] = 'booked'
+    db.collection('showtimes').document('showtime-inline').set({
+        'movie_id': 'movie-00000',
+        'movie_title': 'Benchmark Feature 0',
+        'start_time': now,
+        'end_time': now + timedelta(minutes=120),
+        'price': 12.5,
+        'screen_number': 1,
+        'seats': inline_seats,
+        'total_seats': len(inline_seats),
+        'available_seats': sum(1 for seat in inline_seats if seat['status'] == 'available'),
+    })
+
+    db.collection('users').document(USER_ID).set({
+        'email': 'bench@example.com',
+        'first_name': 'Bench',
+        'last_name': 'Mark',
+        'phone_number': '+15550100',
+        'preferred_language': 'en',
+        'notification_preferences': {'email': True, 'push': True, 'sms': False},
+        'created_at': now,
+        'updated_at': now,
+    })
+
+    booking_id = payment_id = None
+    for i in range(history):
+        showtime = rng.choice(showtimes)
+        confirmed = i % 5 != 0
+        booking = backend.service.create_booking({
+            'user_id': USER_ID,
+            'showtime_id': showtime['id'],
+            'seat_ids': rng.sample(seat_ids, 2 + i % 5),
+            'total_amount': 12.5 * (2 + i % 5),
+            'status': 'confirmed' if confirmed else 'cancelled',
+            'payment_status': 'completed' if confirmed else 'pending',
+            'payment_intent_id': f'pi_{i:08d}',
+        })
+        summaries.save_summary(booking, showtime)
+        if confirmed:
+            payment = backend.service.create_payment({
+                'booking_id': booking['id'],
+                'stripe_payment_intent_id': booking['payment_intent_id'],
+                'amount': booking['total_amount'],
+                'currency': 'usd',
+                'payment_status': 'completed',
+                'payment_method': f'pm_{i:08d}',
+            })
+            booking_id, payment_id = booking['id'], payment['id']
+
+    return {
+        'movie_id': 'movie-00000',
+        'showtime_id': showtimes[0]['id'],
+        # Seats the booking cases hold and release, so the fixture's booked seats stay booked
+        'free_seat_ids': [seat_id for seat_id in seat_ids if seat_id not in showtimes[0]['seat_overlay']],
+        'booking_id': booking_id,
+        'payment_id': payment_id,
+        'seat_ids': seat_ids,
+        'showtimes': showtimes,
+    }
+
+
+def api_cases(backend, fixtures):
+    from rest_framework.test import APIClient
+
+    from backend.apps.movies.seat_sharding import HOLD, apply_seat_command
+    from backend.utils.authentication import FirebaseUser
+
+    client = APIClient()
+    client.force_authenticate(user=FirebaseUser({'uid': USER_ID, 'email': 'bench@example.com'}))
+
+    movie_id = fixtures['movie_id']
+    showtime_id = fixtures['showtime_id']
+    free_seat_ids = fixtures['free_seat_ids']
+    seat_ids = fixtures['seat_ids']
+
+    def booking_request(i):
+        seats = [free_seat_ids[(4 * i + n) % len(free_seat_ids)] for n in range(4)]
+        return {
+            # The serializer requires these even though the view overrides them
+            'id': 'new', 'user_id': USER_ID, 'status': 'pending', 'payment_status': 'pending',
+            'showtime_id': showtime_id, 'seat_ids': seats, 'total_amount': '50.00',
+        }
+
+    # Bookings for the cancel cases hold their seats, as created bookings do, so
+    # releasing them passes the holder check; they use a showtime of their own
+    cancel_showtime = fixtures['showtimes'][5]
+    cancel_seats = [seat_id for seat_id in seat_ids if seat_id not in cancel_showtime['seat_overlay']]
+
+    def pending_booking(i):
+        seats = [cancel_seats[(4 * i + n) % len(cancel_seats)] for n in range(4)]
+        booking = backend.service.create_booking({
+            'user_id': USER_ID, 'showtime_id': cancel_showtime['id'], 'seat_ids': seats,
+            'total_amount': 50.0, 'status': 'pending', 'payment_status': 'pending',
+        })
+        apply_seat_command(cancel_showtime['id'], HOLD, seats, booking['id'], USER_ID)
+        return booking['id']
+
+    # A group order: one seat in each of 4 showtimes for 5 people, on seats no case books
+    group_showtimes = fixtures['showtimes'][1:5]
+    group_seats = [
+        [seat_id for seat_id in seat_ids if seat_id not in showtime['seat_overlay']]
+        for showtime in group_showtimes
+    ]
+
+    def bulk_request(i):
+        return {'bookings': [
+            {
+                'showtime_id': showtime['id'],
+                'seat_ids': [seats[(5 * i + person) % len(seats)]],
+                'total_amount': '12.50',
+            }
+            for showtime, seats in zip(group_showtimes, group_seats) for person in range(5)
+        ]}
+
+    def pending_bookings(i):
+        return [pending_booking(20 * i + n) for n in range(20)]
+
+    return [
+        Case('movies.list', lambda _: client.get('/api/movies/')),
+        Case('movies.retrieve', lambda _: client.get(f'/api/movies/{movie_id}/')),
+        Case('movies.showtimes', lambda _: client.get(f'/api/movies/{movie_id}/showtimes/')),
+        Case('showtimes.list', lambda _: client.get('/api/showtimes/', {'movie_id': movie_id})),
+        Case('showtimes.retrieve', lambda _: client.get(f'/api/showtimes/{showtime_id}/')),
+        Case('showtimes.seats', lambda _: client.get(f'/api/showtimes/{showtime_id}/seats/')),
+        Case('showtimes.seats.inline', lambda _: client.get('/api/showtimes/showtime-inline/seats/')),
+        Case('bookings.list', lambda _: client.get('/api/bookings/')),
+        Case('bookings.retrieve', lambda _: client.get(f'/api/bookings/{fixtures["booking_id"]}/')),
+        Case('bookings.create', lambda i: client.post('/api/bookings/', booking_request(i), format='json'),
+             expect=201),
+        Case('bookings.cancel', lambda booking_id: client.post(f'/api/bookings/{booking_id}/cancel/'),
+             setup=pending_booking),
+        Case('bookings.bulk_create', lambda i: client.post('/api/bookings/bulk_create/', bulk_request(i), format='json')),
+        Case('bookings.bulk_cancel', lambda booking_ids: client.post(
+            '/api/bookings/bulk_cancel/', {'booking_ids': booking_ids}, format='json',
+        ), setup=pending_bookings),
+        Case('payments.list', lambda _: client.get('/api/payments/')),
+        Case('payments.retrieve', lambda _: client.get(f'/api/payments/{fixtures["payment_id"]}/')),
+        Case('profiles.list', lambda _: client.get('/api/profiles/')),
+        Case('profiles.update_notification_preferences', lambda i: client.patch(
+            '/api/profiles/update_notification_preferences/',
+            {'notification_preferences': {'sms': i % 2 == 0}}, format='json',
+        )),
+    ]
+
+
+def serializer_cases(backend, fixtures):
+    from backend.apps.bookings import summaries
+    from backend.apps.bookings.serializers import BookingSerializer, BookingSummarySerializer
+    from backend.apps.movies import layouts
+    from backend.apps.movies.serializers import MovieSerializer, ShowTimeSerializer
+
+    movies = backend.service.get_movies()
+    showtime = layouts.materialize(backend.service.get_showtime(fixtures['showtime_id']))
+    booking = backend.service.get_booking(fixtures['booking_id'])
+    payment = backend.service.get_payment(fixtures['payment_id'])
+    wanted = set(booking['seat_ids'])
+    detailed = {
+        **booking,
+        'showtime_details': showtime,
+        'seats_details': [seat for seat in showtime['seats'] if seat['id'] in wanted],
+        'payment_details': payment,
+    }
+    history = summaries.get_user_summaries(USER_ID)
+    create_data = {
+        'id': 'new', 'user_id': USER_ID, 'status': 'pending', 'payment_status': 'pending',
+        'showtime_id': fixtures['showtime_id'], 'seat_ids': fixtures['seat_ids'][:20], 'total_amount': '250.00',
+    }
+
+    def validate(_):
+        serializer = BookingSerializer(data=create_data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    return [
+        Case('serializers.movie.many', lambda _: MovieSerializer(movies, many=True).data),
+        Case('serializers.showtime.seat_map', lambda _: ShowTimeSerializer(showtime).data),
+        Case('serializers.booking.nested', lambda _: BookingSerializer(detailed).data),
+        Case('serializers.booking.validate', validate),
+        Case('serializers.booking_summary.history', lambda _: BookingSummarySerializer(history, many=True).data),
+    ]
+
+
+def calibrate(rounds=5):
+    """Milliseconds for a fixed pure-Python workload, to factor out machine speed and load"""
+    def workload():
+        rows = [{'id': f'seat-{i}', 'row': chr(65 + i % 26), 'number': i, 'status': 'available'} for i in range(20000)]
+        json.dumps(sorted(rows, key=lambda row: (row['row'], -row['number'])))
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        workload()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def measure(case, iterations, warmup, alloc_iterations):
+    counter = itertools.count()
+
+    def next_arg():
+        i = next(counter)
+        return case.setup(i) if case.setup else i
+
+    for _ in range(warmup):
+        case.call(next_arg())
+
+    gc.collect()
+    calibration_ms = calibrate()
+    timings = []
+    for _ in range(iterations):
+        arg = next_arg()
+        started = time.perf_counter()
+        case.call(arg)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            arg = next_arg()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            case.call(arg)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+        'peak_kb': round(statistics.median(peaks), 1) if peaks else None,
+        'calibration_ms': round(calibration_ms, 3),
+    }
+
+
+def compare(stats, baseline, threshold, alloc_threshold):
+    """
+    Return ``(time_delta, alloc_delta, regressed)``; deltas are fractions or None.
+
+    Median times are scaled by the ratio of the calibration times taken next
+    to each measurement, so a slower machine is not a regression. Run-to-run
+    noise in wall time is still tens of percent, hence the loose default
+    time threshold; peak allocation is nearly deterministic.
+    """
+    if not baseline:
+        return None, None, False
+    time_delta = None
+    if baseline.get('p50_ms') and baseline.get('calibration_ms'):
+        speed = stats['calibration_ms'] / baseline['calibration_ms']
+        time_delta = stats['p50_ms'] / speed / baseline['p50_ms'] - 1
+    alloc_delta = None
+    if baseline.get('peak_kb') and stats['peak_kb'] is not None:
+        alloc_delta = stats['peak_kb'] / baseline['peak_kb'] - 1
+    regressed = (
+        (time_delta is not None and time_delta > threshold)
+        or (alloc_delta is not None and alloc_delta > alloc_threshold)
+    )
+    return time_delta, alloc_delta, regressed
+
+
+def _delta(value):
+    return f'{value * 100:+6.0f}%' if value is not None else '      -'
+
+
+def setup_django(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    # Allows the test client's host and keeps email in memory
+    setup_test_environment()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--settings', default='backend.core.settings_api',
+                        help='Settings module, unless DJANGO_SETTINGS_MODULE is set')
+    parser.add_argument('--only', action='append', help='Run cases whose name contains this (repeatable)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--alloc-iterations', type=int, default=3)
+    parser.add_argument('--movies', type=int, default=300)
+    parser.add_argument('--showtimes', type=int, default=4, help='Showtimes per movie')
+    parser.add_argument('--rows', type=int, default=20, choices=range(1, 27), metavar='1-26')
+    parser.add_argument('--seats-per-row', type=int, default=30)
+    parser.add_argument('--history', type=int, default=500, help='Bookings in the user\'s history')
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=1.0,
+                        help='Fail if median time (calibrated) exceeds the baseline by more than this fraction')
+    parser.add_argument('--alloc-threshold', type=float, default=0.10,
+                        help='Fail if peak allocation exceeds the baseline by more than this fraction')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write the results as the new baseline instead of comparing')
+    args = parser.parse_args(argv)
+
+    setup_django(args.settings)
+    from backend.benchmarks.memory_backend import MemoryBackend
+
+    fixture_sizes = {
+        'movies': args.movies, 'showtimes': args.showtimes, 'rows': args.rows,
+        'seats_per_row': args.seats_per_row, 'history': args.history,
+    }
+    backend = MemoryBackend().install()
+    started = time.perf_counter()
+    fixtures = build_fixtures(backend, args.movies, args.showtimes, args.rows, args.seats_per_row, args.history)
+    print(f'fixtures: {args.movies} movies, {args.movies * args.showtimes} showtimes of '
+          f'{args.rows * args.seats_per_row} seats, {args.history} bookings '
+          f'({time.perf_counter() - started:.1f}s)')
+
+    cases = api_cases(backend, fixtures) + serializer_cases(backend, fixtures)
+    if args.only:
+        cases = [case for case in cases if any(part in case.name for part in args.only)]
+
+    baseline = {}
+    if args.baseline.exists() and not args.update_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get('fixtures') != fixture_sizes:
+            print(f'fixture sizes differ from {args.baseline.name}; not comparing')
+            baseline = {}
+
+    print(f'\n{"case":<45} {"mean ms":>9} {"p50 ms":>9} {"p95 ms":>9} {"peak KB":>9} {"time":>7} {"alloc":>7}')
+    results = {}
+    regressions = []
+    for case in cases:
+        stats = measure(case, args.iterations, args.warmup, args.alloc_iterations)
+        results[case.name] = stats
+        time_delta, alloc_delta, regressed = compare(
+            stats, baseline.get('cases', {}).get(case.name), args.threshold, args.alloc_threshold
+        )
+        if regressed:
+            regressions.append(case.name)
+        print(f'{case.name:<45} {stats["mean_ms"]:>9.2f} {stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} '
+              f'{stats["peak_kb"]:>9.1f} {_delta(time_delta)} {_delta(alloc_delta)}'
+              f'{"  REGRESSION" if regressed else ""}')
+
+    if args.update_baseline:
+        previous = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        # Keep cases that were filtered out of this run
+        kept = previous.get('cases', {}) if previous.get('fixtures') == fixture_sizes else {}
+        args.baseline.write_text(json.dumps({
+            'python': platform.python_version(),
+            'fixtures': fixture_sizes,
+            'cases': {**kept, **results},
+        }, indent=2, sort_keys=True) + '\n')
+        print(f'\nbaseline written to {args.baseline}')
+        return 0
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) over the baseline: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
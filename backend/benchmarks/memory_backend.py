@@ -0,0 +1,426 @@
+"""
+In-memory stand-in for Firestore, for benchmarks.
+
+``MemoryFirestore`` implements the subset of the Firestore client API the
+backend uses (documents, subcollections, queries with ``where``/``order_by``/
+``limit``/``start_after``, batches and ``firestore.transactional``
+transactions, ``DELETE_FIELD`` and ``SERVER_TIMESTAMP``), and
+``MemoryFirestoreService`` mirrors ``FirestoreService`` on top of it.
+``MemoryBackend.install()`` points both at the in-memory store for the rest of
+the process, so views and serializers can be timed without network calls;
+when ``backend.utils.firebase_utils`` cannot be imported it registers one.
+
+Documents are deep-copied on every read and write, the way a real client
+hands out freshly decoded dicts.
+"""
+import copy
+import itertools
+import operator
+import sys
+import types
+import uuid
+
+from django.utils import timezone
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'not-in': lambda value, options: value not in options,
+    'array_contains': lambda value, item: item in (value or []),
+}
+
+
+def split_field_path(path):
+    """``'seat_overlay.`A1`'`` -> ``['seat_overlay', 'A1']``"""
+    parts, current, quoted = [], '', False
+    for char in path:
+        if char == '`':
+            quoted = not quoted
+        elif char == '.' and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def _sentinels():
+    from firebase_admin import firestore
+    return firestore.DELETE_FIELD, firestore.SERVER_TIMESTAMP
+
+
+def _resolve(value):
+    _, server_timestamp = _sentinels()
+    if value is server_timestamp:
+        return timezone.now()
+    if isinstance(value, dict):
+        return {key: _resolve(item) for key, item in value.items()}
+    return copy.deepcopy(value)
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in split_field_path(field):
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+class MemoryDocument:
+    def __init__(self, db, collection_path, doc_id):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f'{collection_path}/{doc_id}'
+
+    @property
+    def _docs(self):
+        return self._db.documents.setdefault(self._collection_path, {})
+
+    def collection(self, name):
+        return MemoryQuery(self._db, f'{self.path}/{name}')
+
+    def get(self, field_paths=None, transaction=None):
+        data = self._docs.get(self.id)
+        if data is not None and field_paths is not None:
+            data = {field: data[field] for field in field_paths if field in data}
+        return MemorySnapshot(self, copy.deepcopy(data))
+
+    def create(self, data):
+        from google.api_core.exceptions import AlreadyExists
+
+        if self.id in self._docs:
+            raise AlreadyExists(f'Document already exists: {self.path}')
+        self._docs[self.id] = _resolve(data)
+
+    def set(self, data, merge=False):
+        if merge and self.id in self._docs:
+            self._merge(self._docs[self.id], data)
+        else:
+            self._docs[self.id] = _resolve(data)
+
+    def update(self, data):
+        from google.api_core.exceptions import NotFound
+
+        if self.id not in self._docs:
+            raise NotFound(f'No document to update: {self.path}')
+        delete_field, _ = _sentinels()
+        stored = self._docs[self.id]
+        for path, value in data.items():
+            *parents, leaf = split_field_path(path)
+            target = stored
+            for part in parents:
+                target = target.setdefault(part, {})
+            if value is delete_field:
+                target.pop(leaf, None)
+            else:
+                target[leaf] = _resolve(value)
+
+    def delete(self):
+        self._docs.pop(self.id, None)
+
+    def _merge(self, target, data):
+        delete_field, _ = _sentinels()
+        for key, value in data.items():
+            if value is delete_field:
+                target.pop(key, None)
+            elif isinstance(value, dict) and isinstance(target.get(key), dict):
+                self._merge(target[key], value)
+            else:
+                target[key] = _resolve(value)
+
+
+class MemoryQuery:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, db, path, filters=(), orders=(), limit=None, start_after=None):
+        self._db = db
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters, 'orders': self._orders,
+            'limit': self._limit, 'start_after': self._start_after,
+        }
+        state.update(changes)
+        return MemoryQuery(self._db, self._path, **state)
+
+    def document(self, doc_id=None):
+        return MemoryDocument(self._db, self._path, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return timezone.now(), ref
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, OPERATORS[op], value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction == self.DESCENDING),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, cursor):
+        return self._copy(start_after=cursor)
+
+    def select(self, fields):
+        return self
+
+    def list_documents(self):
+        return [self.document(doc_id) for doc_id in list(self._db.documents.get(self._path, {}))]
+
+    def _sort_key(self, doc_id, data, field):
+        if field == '__name__':
+            return (1, doc_id)
+        # Missing values sort first instead of failing to compare
+        return (0,) if data.get(field) is None else (1, data[field])
+
+    def stream(self, transaction=None):
+        rows = [
+            (doc_id, data) for doc_id, data in self._db.documents.get(self._path, {}).items()
+            if all(field in data and test(data[field], value) for field, test, value in self._filters)
+        ]
+        rows.sort(key=lambda row: row[0])
+        for field, descending in reversed(self._orders):
+            rows.sort(key=lambda row: self._sort_key(row[0], row[1], field), reverse=descending)
+        if self._start_after is not None:
+            cursor = self._start_after
+            cursor_id = getattr(cursor, 'id', None)
+            for position, (doc_id, _) in enumerate(rows):
+                if doc_id == cursor_id:
+                    rows = rows[position + 1:]
+                    break
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [MemorySnapshot(self.document(doc_id), copy.deepcopy(data)) for doc_id, data in rows]
+
+    def get(self, transaction=None):
+        return self.stream()
+
+
+class MemoryBatch:
+    def __init__(self):
+        self._writes = []
+
+    def create(self, reference, data):
+        self._writes.append((reference.create, (data,), {}))
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference.set, (data,), {'merge': merge}))
+
+    def update(self, reference, data):
+        self._writes.append((reference.update, (data,), {}))
+
+    def delete(self, reference):
+        self._writes.append((reference.delete, (), {}))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        for write, args, kwargs in writes:
+            write(*args, **kwargs)
+        return writes
+
+
+class MemoryTransaction(MemoryBatch):
+    """Enough of ``Transaction`` for ``firestore.transactional`` to drive it"""
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self):
+        super().__init__()
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self):
+        # Single-threaded benchmarks have no contention, so no conflict checks
+        return self.commit()
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class MemoryFirestore:
+    def __init__(self):
+        self.documents = {}
+
+    def collection(self, name):
+        return MemoryQuery(self, name)
+
+    def document(self, path):
+        collection_path, doc_id = path.rsplit('/', 1)
+        return MemoryDocument(self, collection_path, doc_id)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            yield reference.get(field_paths=field_paths)
+
+    def batch(self):
+        return MemoryBatch()
+
+    def transaction(self, **kwargs):
+        return MemoryTransaction()
+
+
+class MemoryFirestoreService:
+    """``FirestoreService`` over a ``MemoryFirestore``"""
+
+    def __init__(self, db):
+        self.db = db
+        self._ids = itertools.count(1)
+        # Stands in for the Firestore index on payments.booking_id
+        self._payment_by_booking = {}
+        self._indexed_payments = 0
+
+    def _get(self, collection, doc_id):
+        if not doc_id:
+            return None
+        doc = self.db.collection(collection).document(doc_id).get()
+        return {**doc.to_dict(), 'id': doc.id} if doc.exists else None
+
+    def _create(self, collection, data):
+        now = timezone.now()
+        doc_id = f'{collection[:-1]}-{next(self._ids):08d}'
+        # Like Firestore, the document id is not part of the stored fields
+        record = {**{key: value for key, value in data.items() if key != 'id'}, 'created_at': now, 'updated_at': now}
+        self.db.collection(collection).document(doc_id).set(record)
+        return {**record, 'id': doc_id}
+
+    def get_movies(self):
+        return [{**doc.to_dict(), 'id': doc.id} for doc in self.db.collection('movies').stream()]
+
+    def get_movie(self, movie_id):
+        return self._get('movies', movie_id)
+
+    def get_showtimes(self, movie_id=None):
+        query = self.db.collection('showtimes')
+        if movie_id:
+            query = query.where('movie_id', '==', movie_id)
+        return [{**doc.to_dict(), 'id': doc.id} for doc in query.order_by('start_time').stream()]
+
+    def get_showtime(self, showtime_id):
+        return self._get('showtimes', showtime_id)
+
+    def update_seats_status(self, showtime_id, seat_ids, status):
+        ref = self.db.collection('showtimes').document(showtime_id)
+        showtime = ref.get().to_dict()
+        wanted = set(seat_ids)
+        for seat in showtime.get('seats', []):
+            if seat['id'] in wanted:
+                seat['status'] = status
+        ref.update({
+            'seats': showtime.get('seats', []),
+            'available_seats': sum(1 for seat in showtime.get('seats', []) if seat['status'] == 'available'),
+        })
+        return True
+
+    def create_booking(self, booking_data):
+        return self._create('bookings', booking_data)
+
+    def get_booking(self, booking_id):
+        return self._get('bookings', booking_id)
+
+    def get_user_bookings(self, user_id):
+        query = self.db.collection('bookings').where('user_id', '==', user_id)
+        return [{**doc.to_dict(), 'id': doc.id} for doc in query.stream()]
+
+    def update_booking_status(self, booking_id, fields):
+        self.db.collection('bookings').document(booking_id).update({**fields, 'updated_at': timezone.now()})
+        return True
+
+    def create_payment(self, payment_data):
+        return self._create('payments', payment_data)
+
+    def get_payment(self, key):
+        """Payment by id, or the payment of a booking"""
+        payments = self.db.documents.get('payments', {})
+        if len(payments) != self._indexed_payments:
+            # Payments are also written straight to the collection, keyed by PaymentIntent
+            self._payment_by_booking = {}
+            for payment_id, payment in payments.items():
+                self._payment_by_booking.setdefault(payment.get('booking_id'), payment_id)
+            self._indexed_payments = len(payments)
+        return self._get('payments', key) or self._get('payments', self._payment_by_booking.get(key))
+
+    def get_user_profile(self, user_id):
+        return self._get('users', user_id)
+
+    def update_user_profile(self, user_id, profile_data):
+        ref = self.db.collection('users').document(user_id)
+        ref.set({**profile_data, 'updated_at': timezone.now()}, merge=True)
+        return {'id': user_id, **ref.get().to_dict()}
+
+
+# Modules that bind ``get_firestore`` at import time, including lazily imported ones
+PATCHED_MODULES = [
+    'backend.core.urls',
+    'backend.apps.movies.seat_ledger',
+    'backend.apps.movies.seat_sharding',
+    'backend.apps.bookings.reconciliation',
+    'backend.apps.archive.archiver',
+]
+
+
+class MemoryBackend:
+
+    def __init__(self):
+        self.db = MemoryFirestore()
+        self.service = MemoryFirestoreService(self.db)
+
+    def install(self):
+        """Route ``FirestoreService`` and every ``get_firestore`` in the backend to this store"""
+        import importlib
+
+        from backend.utils import clients
+        try:
+            from backend.utils.firebase_utils import FirestoreService
+        except ImportError:
+            # Without the Firebase helpers (e.g. no credentials module in this
+            # checkout), register an empty service for the views to import
+            FirestoreService = type('FirestoreService', (), {})
+            module = types.ModuleType('backend.utils.firebase_utils')
+            module.FirestoreService = FirestoreService
+            sys.modules[module.__name__] = module
+            import backend.utils
+            backend.utils.firebase_utils = module
+
+        for name in PATCHED_MODULES:
+            importlib.import_module(name)
+
+        original = clients.get_firestore
+        memory_client = lambda app=None: self.db  # noqa: E731
+        for name, module in list(sys.modules.items()):
+            if name.startswith('backend.') and getattr(module, 'get_firestore', None) is original:
+                module.get_firestore = memory_client
+
+        for name in dir(self.service):
+            if not name.startswith('_') and callable(getattr(self.service, name)):
+                setattr(FirestoreService, name, staticmethod(getattr(self.service, name)))
+        return self
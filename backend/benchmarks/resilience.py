@@ -0,0 +1,123 @@
+"""
+Dependency guard behaviour under injected faults.
+
+Drives a fault-injected stand-in dependency (a few milliseconds per call)
+from ``--clients`` threads through four phases: healthy, failing, hanging
+and recovered. For each phase it reports latency percentiles and how calls
+ended (ok, stale fallback, rejected), plus the breaker state, so the effect
+of deadlines, the circuit breaker with half-open probing, the bulkhead and
+last-known-good fallback can be seen directly. The hanging phase is also run
+unguarded for comparison.
+
+Usage:
+    python -m backend.benchmarks.resilience --clients 16 --seconds 2 --timeout 0.2
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+
+from backend.utils.resilience import Dependency, DependencyUnavailable, FaultInjector
+
+
+def stand_in(key, latency=0.003):
+    """Pretend catalog read"""
+    time.sleep(latency)
+    return {'key': key, 'loaded_at': time.time()}
+
+
+def drive(call, clients, seconds, think=0.001):
+    outcomes = {'ok': 0, 'stale': 0, 'rejected': 0, 'error': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            key = ('movies', (n + i) % 4)
+            started = time.perf_counter()
+            try:
+                outcome = call(key)
+            except DependencyUnavailable:
+                outcome = 'rejected'
+            except Exception:
+                outcome = 'error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(elapsed)
+            i += 1
+            # Without think time, fast rejections spin and starve threads of the GIL
+            time.sleep(think)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes, latencies
+
+
+def report(label, outcomes, latencies, seconds, state=None):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    worst = latencies[-1] * 1000 if latencies else 0
+    counts = ', '.join(f'{key} {value}' for key, value in outcomes.items() if value)
+    suffix = f', breaker {state}' if state else ''
+    print(f'{label:<20} {len(latencies) / seconds:8.0f} calls/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  max {worst:7.1f} ms  '
+          f'[{counts}]{suffix}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=0.2, help='Per-call deadline')
+    parser.add_argument('--concurrency', type=int, default=8, help='Bulkhead size')
+    parser.add_argument('--reset', type=float, default=0.5, help='Seconds the breaker stays open')
+    args = parser.parse_args(argv)
+
+    faults = FaultInjector(hang_seconds=args.timeout * 5)
+    dep = Dependency(
+        'catalog', timeout=args.timeout, max_concurrency=args.concurrency,
+        failure_threshold=5, reset_timeout=args.reset, faults=faults,
+    )
+
+    def guarded(key):
+        _, stale = dep.call_with_fallback(key, stand_in, key)
+        return 'stale' if stale else 'ok'
+
+    phases = [
+        ('healthy', {}),
+        ('failing', {'error': 1.0}),
+        ('hanging', {'hang': 1.0}),
+        ('recovered', {}),
+    ]
+    for label, settings in phases:
+        faults.error = settings.get('error', 0.0)
+        faults.hang = settings.get('hang', 0.0)
+        # Start each phase with a closed breaker so the deadline is visible too
+        dep.breaker.record_success()
+        outcomes, latencies = drive(guarded, args.clients, args.seconds)
+        report(label, outcomes, latencies, args.seconds, dep.breaker.state)
+        if label == 'hanging':
+            # Let abandoned hung calls finish before measuring recovery
+            time.sleep(faults.hang_seconds)
+
+    unguarded_faults = FaultInjector(hang=1.0, hang_seconds=args.timeout * 5)
+
+    def unguarded(key):
+        unguarded_faults('catalog')
+        stand_in(key)
+        return 'ok'
+
+    outcomes, latencies = drive(unguarded, args.clients, args.seconds)
+    report('hanging, unguarded', outcomes, latencies, args.seconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Seat command throughput under showtime-sharded ownership.
+
+Starts ``--workers`` owner processes on a shared ring and ``--clients``
+forwarding processes that hammer ``--showtimes`` hot showtimes with
+hold/release pairs. Seat maps are synthetic and writes are not persisted, so
+this measures the routing and sequential-apply ceiling, not storage.
+
+Usage:
+    python -m backend.benchmarks.seat_sharding --workers 4 --clients 8 --showtimes 1
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from backend.apps.movies.seat_sharding import (
+    HOLD, RELEASE, SeatConflict, SeatOwner, SeatRouter,
+)
+
+ROWS = 'ABCDEFGHIJKLMNOPQRST'
+
+
+def synthetic_seat_map(showtime_id, rows=20, per_row=30):
+    return {f'{row}{n}': 'available' for row in ROWS[:rows] for n in range(1, per_row + 1)}
+
+
+def run_owner(shard_dir, authkey, node_id, ready, stop):
+    router = SeatRouter(SeatOwner(synthetic_seat_map), shard_dir, authkey, node_id=node_id).start()
+    ready.set()
+    stop.wait()
+    router.stop()
+
+
+def run_client(shard_dir, authkey, node_id, showtime_ids, duration, results):
+    router = SeatRouter(SeatOwner(synthetic_seat_map), shard_dir, authkey, node_id=node_id).start(join=False)
+    seats = list(synthetic_seat_map(None))
+    rng = random.Random(node_id)
+    done = conflicts = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        showtime_id = rng.choice(showtime_ids)
+        seat_ids = rng.sample(seats, 2)
+        booking_id = f'{node_id}-{done}'
+        try:
+            router.execute(showtime_id, HOLD, seat_ids, booking_id=booking_id)
+            router.execute(showtime_id, RELEASE, seat_ids, booking_id=booking_id)
+            done += 2
+        except SeatConflict:
+            conflicts += 1
+            done += 1
+    results.put((done, conflicts))
+
+
+def bench_in_process(seconds):
+    """Baseline: submit commands straight to one owner with no IPC"""
+    owner = SeatOwner(synthetic_seat_map)
+    seats = list(synthetic_seat_map(None))
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        seat_ids = seats[done % len(seats):done % len(seats) + 2] or seats[:2]
+        owner.submit('hot', HOLD, seat_ids, booking_id=str(done)).result()
+        owner.submit('hot', RELEASE, seat_ids, booking_id=str(done)).result()
+        done += 2
+    return done / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--showtimes', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    print(f'in-process owner: {bench_in_process(min(args.seconds, 2.0)):,.0f} commands/sec')
+
+    # mkdtemp creates the directory with mode 0700; the key only lives for this run
+    shard_dir = tempfile.mkdtemp(prefix='seat-bench-')
+    authkey = os.urandom(32)
+    stop = multiprocessing.Event()
+    owners = []
+    for i in range(args.workers):
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=run_owner, args=(shard_dir, authkey, f'owner-{i}', ready, stop))
+        process.start()
+        ready.wait()
+        owners.append(process)
+
+    showtime_ids = [f'showtime-{i}' for i in range(args.showtimes)]
+    results = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(
+            target=run_client,
+            args=(shard_dir, authkey, f'client-{i}', showtime_ids, args.seconds, results),
+        )
+        for i in range(args.clients)
+    ]
+    for process in clients:
+        process.start()
+    totals = [results.get() for _ in clients]
+    for process in clients:
+        process.join()
+
+    stop.set()
+    for process in owners:
+        process.join()
+
+    commands = sum(done for done, _ in totals)
+    conflicts = sum(conflict for _, conflict in totals)
+    rate = commands / args.seconds
+    print(f'{args.workers} owners, {args.clients} clients, {args.showtimes} showtimes')
+    print(f'  {rate:,.0f} commands/sec total, {rate / args.showtimes:,.0f} per showtime, '
+          f'{conflicts} conflicts')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Worker startup benchmark.
+
+Boots Django and loads the URLconf (and therefore every view module) in a
+fresh interpreter under ``python -X importtime``, then reports the wall time
+and an import-time breakdown by top-level package.
+
+Usage:
+    python -m backend.benchmarks.startup
+    python -m backend.benchmarks.startup --settings backend.core.settings_api --max-ms 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+BOOT_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+DEFAULT_PROFILES = ['backend.core.settings', 'backend.core.settings_api']
+
+
+def parse_importtime(stderr):
+    """Return a list of (module, self_us, cumulative_us) from ``-X importtime`` output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_once(settings_module):
+    """Boot one interpreter and return (wall_ms, importtime rows)"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        tail = [l for l in result.stderr.splitlines() if not l.startswith('import time:')]
+        raise RuntimeError(f'{settings_module} failed to boot:\n' + '\n'.join(tail[-20:]))
+    return wall_ms, parse_importtime(result.stderr)
+
+
+def breakdown(rows):
+    """Sum self time per top-level package, in milliseconds"""
+    totals = defaultdict(int)
+    for name, self_us, _ in rows:
+        totals[name.split('.')[0]] += self_us
+    return {package: us / 1000 for package, us in totals.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--settings', action='append',
+                        help='Settings module to profile (repeatable)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-ms', type=float,
+                        help='Fail if the median boot time of any profile exceeds this')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for settings_module in args.settings or DEFAULT_PROFILES:
+        timings = []
+        rows = []
+        for _ in range(args.runs):
+            wall_ms, rows = run_once(settings_module)
+            timings.append(wall_ms)
+        median_ms = statistics.median(timings)
+
+        print(f'\n{settings_module}')
+        print(f'  boot median {median_ms:.1f} ms  (min {min(timings):.1f}, max {max(timings):.1f}, runs {args.runs})')
+        print(f'  {"package":<30} {"self ms":>10}')
+        packages = sorted(breakdown(rows).items(), key=lambda item: item[1], reverse=True)
+        for package, ms in packages[:args.top]:
+            print(f'  {package:<30} {ms:>10.1f}')
+
+        if args.max_ms is not None and median_ms > args.max_ms:
+            print(f'  REGRESSION: {median_ms:.1f} ms > {args.max_ms:.1f} ms')
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Ticket rendering throughput.
+
+Renders ``--tickets`` synthetic tickets serially and then across a process
+pool, the way ``render_tickets`` pre-renders a showtime, and reports
+tickets/sec for each. Nothing is written to the ticket cache.
+
+Usage:
+    python -m backend.benchmarks.tickets --tickets 400 --processes 8 --format pdf
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.apps.bookings.tickets import FORMATS, _render_item, render_ticket
+
+ROWS = 'ABCDEFGHIJKLMNOPQRST'
+
+
+def synthetic_tickets(count):
+    tickets = []
+    for i in range(count):
+        row = ROWS[i % len(ROWS)]
+        seat_ids = [f'{row}{n}' for n in range(1, 2 + i % 4)]
+        tickets.append({
+            'booking_id': f'booking-{i:06d}',
+            'movie_title': 'The Benchmark Returns',
+            'start_time': '2026-10-19T19:30:00',
+            'screen_number': 1 + i % 8,
+            'seats': seat_ids,
+            'seat_ids': seat_ids,
+            'amount': 12.5 * len(seat_ids),
+            'status': 'confirmed',
+        })
+    return tickets
+
+
+def bench_serial(tickets, fmt):
+    started = time.perf_counter()
+    size = sum(len(render_ticket(data, fmt)) for data in tickets)
+    return time.perf_counter() - started, size
+
+
+def bench_pool(tickets, fmt, processes):
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunksize = max(1, len(tickets) // (processes * 4))
+        size = sum(len(content) for content in
+                   pool.map(_render_item, [(data, fmt) for data in tickets], chunksize=chunksize))
+    return time.perf_counter() - started, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=200)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--format', choices=sorted(FORMATS), default='png', dest='fmt')
+    args = parser.parse_args(argv)
+
+    tickets = synthetic_tickets(args.tickets)
+    render_ticket(tickets[0], args.fmt)  # warm imports and fonts
+
+    serial, size = bench_serial(tickets, args.fmt)
+    print(f'serial:      {args.tickets / serial:8.1f} tickets/sec '
+          f'({serial * 1000 / args.tickets:.1f} ms each, {size / args.tickets / 1024:.0f} KiB avg)')
+
+    pooled, _ = bench_pool(tickets, args.fmt, args.processes)
+    print(f'{args.processes} processes: {args.tickets / pooled:8.1f} tickets/sec '
+          f'({serial / pooled:.1f}x serial, pool start-up included)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,9 +31,13 @@ INSTALLED_APPS = [
     'backend.apps.movies',
     'backend.apps.bookings',
     'backend.apps.users',
+    'backend.apps.analytics',
+    'backend.apps.tasks',
+    'backend.apps.archive',
 ]
 
 MIDDLEWARE = [
+    'backend.utils.tracing.TracingMiddleware',  # Removes itself unless TRACING_ENABLED
     'corsheaders.middleware.CorsMiddleware',  # Must be before CommonMiddleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -129,6 +133,13 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+]
+CORS_EXPOSE_HEADERS = [
+    'idempotent-replayed',
+    'x-trace-id',
+    'x-served-stale',
+    'retry-after',
 ]
 
 # Stripe settings
@@ -150,6 +161,100 @@ FIREBASE_CONFIG = {
     "universe_domain": "googleapis.com"
 }
 
+# User profile cache (per process)
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '300'))  # seconds
+PROFILE_CACHE_MAX_SIZE = int(os.getenv('PROFILE_CACHE_MAX_SIZE', '10000'))
+
+# Seat ledger: write a snapshot every N seat events per showtime
+SEAT_LEDGER_SNAPSHOT_INTERVAL = int(os.getenv('SEAT_LEDGER_SNAPSHOT_INTERVAL', '200'))
+
+# Showtime-sharded seat ownership across local worker processes
+SEAT_SHARDING_ENABLED = os.getenv('SEAT_SHARDING_ENABLED', 'False') == 'True'
+SEAT_SHARD_DIR = os.getenv('SEAT_SHARD_DIR')  # required with sharding; private to the workers' user (mode 0700)
+SEAT_SHARD_MAP_TTL = float(os.getenv('SEAT_SHARD_MAP_TTL', '60'))  # seconds before an owner reloads a seat map
+
+# Staff analytics reports
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '300'))  # seconds
+ANALYTICS_PAGE_SIZE = int(os.getenv('ANALYTICS_PAGE_SIZE', '5000'))
+
+# Screen layout templates
+LAYOUT_CACHE_TTL = int(os.getenv('LAYOUT_CACHE_TTL', '3600'))  # seconds
+# Mirror seat status changes to showtimes/{id}/seats documents for live clients
+SEAT_STATUS_MIRROR_DOCS = os.getenv('SEAT_STATUS_MIRROR_DOCS', 'True') == 'True'
+
+# Idempotency-Key deduplication for booking actions
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))  # seconds
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+# Also record keys in Firestore so retries reaching another worker are deduplicated
+IDEMPOTENCY_SHARED = os.getenv('IDEMPOTENCY_SHARED', 'True') == 'True'
+
+# Background tasks (run with `python manage.py run_task_worker`)
+TASK_QUEUE_PATH = os.getenv('TASK_QUEUE_PATH', os.path.join(BASE_DIR, 'var', 'tasks.sqlite3'))
+TASK_QUEUE_MAX_DEPTH = int(os.getenv('TASK_QUEUE_MAX_DEPTH', '10000'))
+
+# Booking notifications
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'bookings@localhost')
+SMS_BACKEND = os.getenv('SMS_BACKEND')  # dotted path to a callable(phone_number, message)
+
+# Rendered tickets (PNG/PDF), cached by content hash
+TICKET_CACHE_DIR = os.getenv('TICKET_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'tickets'))
+TICKET_RENDER_PROCESSES = int(os.getenv('TICKET_RENDER_PROCESSES', '0'))  # 0 = one per CPU
+TICKET_CACHE_MAX_MB = int(os.getenv('TICKET_CACHE_MAX_MB', '1024'))  # least recently used tickets are deleted past this
+
+# Request tracing (spans for Firestore, Stripe and serializers; staff view at /api/traces/)
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False') == 'True'
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '0.1'))
+TRACING_BUFFER_SIZE = int(os.getenv('TRACING_BUFFER_SIZE', '200'))
+# Calls slower than these (milliseconds) are logged to the backend.tracing logger
+TRACING_SLOW_MS = {
+    'request': int(os.getenv('TRACING_SLOW_MS_REQUEST', '1000')),
+    'firestore': int(os.getenv('TRACING_SLOW_MS_FIRESTORE', '250')),
+    'firestore.client': int(os.getenv('TRACING_SLOW_MS_FIRESTORE', '250')),
+    'stripe': int(os.getenv('TRACING_SLOW_MS_STRIPE', '1000')),
+    'serializer': int(os.getenv('TRACING_SLOW_MS_SERIALIZER', '50')),
+}
+
+# Backend dependency limits: per-call deadline (seconds), bulkhead size and
+# circuit breaker (consecutive failures to open, seconds before a probe)
+CIRCUIT_BREAKER_FAILURES = int(os.getenv('CIRCUIT_BREAKER_FAILURES', '5'))
+CIRCUIT_BREAKER_RESET = float(os.getenv('CIRCUIT_BREAKER_RESET', '30'))
+DEPENDENCIES = {
+    'catalog': {
+        'timeout': float(os.getenv('CATALOG_TIMEOUT', '3')),
+        'max_concurrency': int(os.getenv('CATALOG_MAX_CONCURRENCY', '32')),
+        'failure_threshold': CIRCUIT_BREAKER_FAILURES,
+        'reset_timeout': CIRCUIT_BREAKER_RESET,
+    },
+    'seats': {
+        'timeout': float(os.getenv('SEATS_TIMEOUT', '5')),
+        'max_concurrency': int(os.getenv('SEATS_MAX_CONCURRENCY', '16')),
+        'failure_threshold': CIRCUIT_BREAKER_FAILURES,
+        'reset_timeout': CIRCUIT_BREAKER_RESET,
+    },
+    'payments': {
+        'timeout': float(os.getenv('PAYMENTS_TIMEOUT', '10')),
+        'max_concurrency': int(os.getenv('PAYMENTS_MAX_CONCURRENCY', '8')),
+        'failure_threshold': CIRCUIT_BREAKER_FAILURES,
+        'reset_timeout': CIRCUIT_BREAKER_RESET,
+    },
+}
+# Local fault injection, e.g. "catalog:error=0.5,latency=2;payments:hang=1"
+FAULT_INJECTION = os.getenv('FAULT_INJECTION', '')
+
+# Cold storage for finished showtimes and their bookings (see archive_records)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(BASE_DIR, 'var', 'archive'))
+ARCHIVE_BUCKET = os.getenv('ARCHIVE_BUCKET')  # Cloud Storage bucket; local ARCHIVE_DIR when unset
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '7'))
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv('ARCHIVE_CACHE_SEGMENTS', '32'))
+ARCHIVE_CACHE_BLOCKS = int(os.getenv('ARCHIVE_CACHE_BLOCKS', '1024'))
+ARCHIVE_SEGMENT_RECORDS = int(os.getenv('ARCHIVE_SEGMENT_RECORDS', '5000'))
+ARCHIVE_CACHE_TTL = int(os.getenv('ARCHIVE_CACHE_TTL', '3600'))  # seconds
+
+# Bulk booking endpoints (/api/bookings/bulk_create/, bulk_confirm/, bulk_cancel/)
+BOOKING_BULK_MAX_ITEMS = int(os.getenv('BOOKING_BULK_MAX_ITEMS', '100'))  # at most 166
+BOOKING_BULK_CONCURRENCY = int(os.getenv('BOOKING_BULK_CONCURRENCY', '8'))  # parallel Stripe lookups
+
 # Firebase Client Configuration (for frontend)
 FIREBASE_CLIENT_CONFIG = {
     'apiKey': os.getenv('REACT_APP_FIREBASE_API_KEY'),
@@ -0,0 +1,43 @@
+"""
+API-only settings profile.
+
+Trims the apps, middleware and template machinery the REST API does not use
+so that worker processes start faster. Select it with
+``DJANGO_SETTINGS_MODULE=backend.core.settings_api``.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    # Third party apps
+    'rest_framework',
+    'corsheaders',
+    # Local apps
+    'backend.apps.movies',
+    'backend.apps.bookings',
+    'backend.apps.users',
+    'backend.apps.analytics',
+    'backend.apps.tasks',
+    'backend.apps.archive',
+]
+
+MIDDLEWARE = [
+    'backend.utils.tracing.TracingMiddleware',
+    'corsheaders.middleware.CorsMiddleware',  # Must be before CommonMiddleware
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+TEMPLATES = []
+
+# Without sessions, requests authenticate with Firebase ID tokens
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'backend.utils.authentication.FirebaseAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
@@ -1,9 +1,12 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from backend.apps.movies.views import MovieViewSet, ShowTimeViewSet
 from backend.apps.bookings.views import BookingViewSet, PaymentViewSet
 from backend.apps.users.views import UserViewSet, ProfileViewSet
+from backend.apps.analytics.views import AnalyticsViewSet
+from backend.apps.tasks.views import TaskViewSet
+from backend.utils.tracing import TraceViewSet
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -13,9 +16,16 @@ router.register(r'bookings', BookingViewSet, basename='booking')
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'profiles', ProfileViewSet, basename='profile')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'tasks', TaskViewSet, basename='task')
+router.register(r'traces', TraceViewSet, basename='trace')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
 ]
+
+# The admin is only mounted when its app is installed (not in the API-only profile)
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin
+    urlpatterns.append(path('admin/', admin.site.urls))
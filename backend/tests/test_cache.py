@@ -0,0 +1,67 @@
+import threading
+import time
+
+from backend.utils.cache import TTLCache
+
+
+def run_together(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    calls = []
+    results = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'report': len(calls)}
+
+    run_together(8, lambda: results.append(cache.get_or_set('report', load)))
+
+    assert len(calls) == 1
+    assert results == [{'report': 1}] * 8
+    assert len(cache) == 1
+
+
+def test_waiters_get_the_loader_error_and_nothing_is_cached():
+    cache = TTLCache()
+    calls = []
+    errors = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        raise ConnectionError('backend down')
+
+    def get():
+        try:
+            cache.get_or_set('report', load)
+        except ConnectionError as e:
+            errors.append(e)
+
+    run_together(4, get)
+
+    assert len(calls) == 1
+    assert len(errors) == 4
+    assert 'report' not in cache
+    assert cache.get_or_set('report', lambda: 'rebuilt') == 'rebuilt'
+
+
+def test_none_is_not_cached():
+    cache = TTLCache()
+    assert cache.get_or_set('missing', lambda: None) is None
+    assert cache.get_or_set('missing', lambda: 'found') == 'found'
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.01)
+    cache.set('key', 'value')
+    time.sleep(0.02)
+    assert cache.get('key') is None
+    assert 'key' not in cache
@@ -0,0 +1,178 @@
+import threading
+import time
+
+import pytest
+
+from backend.utils.resilience import (
+    CLOSED, HALF_OPEN, OPEN, Dependency, DependencyUnavailable, FaultInjector, on_late_success,
+)
+
+
+class StandIn:
+    """A dependency whose calls can be made to fail, or held until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+        self.gate = None
+
+    def __call__(self, value='ok'):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.failing:
+            raise ConnectionError('stand-in down')
+        return value
+
+
+def make_dependency(**options):
+    options = {'timeout': 1.0, 'failure_threshold': 2, 'reset_timeout': 0.1, **options}
+    return Dependency('stand-in', **options)
+
+
+def call_in_thread(dep, fn, *args):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['value'] = dep.call(fn, *args)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    dep = make_dependency()
+    stand_in = StandIn()
+    stand_in.failing = True
+
+    for _ in range(2):
+        with pytest.raises(DependencyUnavailable):
+            dep.call(stand_in)
+    assert dep.breaker.state == OPEN
+
+    with pytest.raises(DependencyUnavailable, match='circuit open') as error:
+        dep.call(stand_in)
+    assert error.value.retry_after >= 1
+    assert stand_in.calls == 2
+
+
+def test_caller_errors_do_not_open_breaker():
+    dep = make_dependency()
+
+    def decline():
+        raise ValueError('card declined')
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            dep.call(decline)
+    assert dep.breaker.state == CLOSED
+
+
+def test_half_open_admits_one_probe_and_closes_on_success():
+    dep = make_dependency()
+    stand_in = StandIn()
+    stand_in.failing = True
+    for _ in range(2):
+        with pytest.raises(DependencyUnavailable):
+            dep.call(stand_in)
+    time.sleep(0.15)
+
+    stand_in.failing = False
+    stand_in.gate = threading.Event()
+    thread, outcome = call_in_thread(dep, stand_in)
+    wait_for(lambda: stand_in.calls == 3)
+    assert dep.breaker.state == HALF_OPEN
+
+    with pytest.raises(DependencyUnavailable, match='probe in flight'):
+        dep.call(stand_in)
+
+    stand_in.gate.set()
+    thread.join()
+    assert outcome == {'value': 'ok'}
+    assert dep.breaker.state == CLOSED
+    assert dep.call(stand_in, 'again') == 'again'
+
+
+def test_failed_probe_reopens_breaker():
+    dep = make_dependency()
+    stand_in = StandIn()
+    stand_in.failing = True
+    for _ in range(2):
+        with pytest.raises(DependencyUnavailable):
+            dep.call(stand_in)
+    time.sleep(0.15)
+
+    with pytest.raises(DependencyUnavailable, match='stand-in down'):
+        dep.call(stand_in)
+    assert dep.breaker.state == OPEN
+    with pytest.raises(DependencyUnavailable, match='circuit open'):
+        dep.call(stand_in)
+
+
+def test_bulkhead_rejects_calls_over_the_limit():
+    dep = make_dependency(max_concurrency=1, queue_timeout=0.01)
+    stand_in = StandIn()
+    stand_in.gate = threading.Event()
+    thread, outcome = call_in_thread(dep, stand_in)
+    wait_for(lambda: stand_in.calls == 1)
+
+    with pytest.raises(DependencyUnavailable, match='too many concurrent calls'):
+        dep.call(stand_in)
+    assert dep.rejected == 1
+    # Rejections are load shedding, not dependency failures
+    assert dep.breaker.failures == 0
+
+    stand_in.gate.set()
+    thread.join()
+    assert outcome == {'value': 'ok'}
+    assert dep.call(stand_in, 'after') == 'after'
+
+
+def test_deadline_expiry_and_late_success():
+    dep = make_dependency(timeout=0.05, faults=FaultInjector(hang=1.0, hang_seconds=0.2))
+    late = threading.Event()
+    started = time.monotonic()
+
+    with pytest.raises(DependencyUnavailable, match='no response within') as error:
+        dep.call(lambda: 'held')
+    assert time.monotonic() - started < 0.2
+    assert dep.breaker.failures == 1
+
+    results = []
+    assert on_late_success(error.value, lambda result: (results.append(result), late.set()))
+    assert late.wait(2)
+    assert results == ['held']
+
+
+def test_late_success_ignores_rejections():
+    assert not on_late_success(DependencyUnavailable('stand-in', 'circuit open'), lambda result: None)
+
+
+def test_fallback_serves_kept_value_while_unavailable():
+    dep = make_dependency(failure_threshold=1)
+    stand_in = StandIn()
+    showtime = {'id': 's1', 'price': 10, 'seats': [{'id': 'A1', 'status': 'available'}]}
+
+    def without_seats(value):
+        return {key: item for key, item in value.items() if key != 'seats'}
+
+    value, stale = dep.call_with_fallback(('showtime', 's1'), stand_in, showtime, keep=without_seats)
+    assert (value, stale) == (showtime, False)
+
+    stand_in.failing = True
+    value, stale = dep.call_with_fallback(('showtime', 's1'), stand_in, showtime, keep=without_seats)
+    assert (value, stale) == ({'id': 's1', 'price': 10}, True)
+
+    with pytest.raises(DependencyUnavailable):
+        dep.call_with_fallback(('showtime', 's2'), stand_in, showtime)
@@ -0,0 +1,44 @@
+from rest_framework import authentication, exceptions
+
+from backend.utils.clients import get_auth
+
+
+class FirebaseUser:
+    """Minimal user object backed by a decoded Firebase ID token"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, decoded_token):
+        self.id = decoded_token['uid']
+        self.email = decoded_token.get('email', '')
+        self.is_staff = bool(decoded_token.get('staff', False))
+        self.claims = decoded_token
+
+    def __str__(self):
+        return self.id
+
+
+class FirebaseAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate requests carrying ``Authorization: Bearer <Firebase ID token>``.
+
+    Used by the API-only settings profile, which runs without sessions.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid authorization header')
+
+        try:
+            decoded_token = get_auth().verify_id_token(header[1].decode())
+        except Exception as e:
+            raise exceptions.AuthenticationFailed(str(e))
+
+        return (FirebaseUser(decoded_token), None)
+
+    def authenticate_header(self, request):
+        return self.keyword
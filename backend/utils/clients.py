@@ -0,0 +1,64 @@
+"""
+Lazily initialised clients for third-party services.
+
+Importing ``stripe`` and ``firebase_admin`` is expensive, so views should
+fetch them through these helpers instead of importing them at module level.
+The first call pays the import and configuration cost; later calls return the
+cached client.
+"""
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_stripe = None
+_firebase_app = None
+
+
+def get_stripe():
+    """Return the ``stripe`` module configured with the secret key"""
+    global _stripe
+    if _stripe is None:
+        with _lock:
+            if _stripe is None:
+                import stripe
+                stripe.api_key = settings.STRIPE_SECRET_KEY
+                # Socket timeout matching the payments deadline, so abandoned
+                # calls do not hold a bulkhead slot for Stripe's 80s default
+                payments = getattr(settings, 'DEPENDENCIES', {}).get('payments', {})
+                if 'timeout' in payments:
+                    stripe.default_http_client = stripe.new_default_http_client(timeout=payments['timeout'])
+                _stripe = stripe
+    return _stripe
+
+
+def get_firebase_app():
+    """Return the default Firebase app, initialising it on first use"""
+    global _firebase_app
+    if _firebase_app is None:
+        with _lock:
+            if _firebase_app is None:
+                import firebase_admin
+                from firebase_admin import credentials
+
+                try:
+                    _firebase_app = firebase_admin.get_app()
+                except ValueError:
+                    _firebase_app = firebase_admin.initialize_app(
+                        credentials.Certificate(settings.FIREBASE_CONFIG)
+                    )
+    return _firebase_app
+
+
+def get_auth():
+    """Return the ``firebase_admin.auth`` module bound to the default app"""
+    get_firebase_app()
+    from firebase_admin import auth
+    return auth
+
+
+def get_firestore():
+    """Return a Firestore client for the default app"""
+    app = get_firebase_app()
+    from firebase_admin import firestore
+    return firestore.client(app)
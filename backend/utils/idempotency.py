@@ -0,0 +1,212 @@
+"""
+``Idempotency-Key`` support for unsafe API actions.
+
+A request carrying an ``Idempotency-Key`` header is executed at most once per
+user, action and key. Repeats get the stored response back (marked with an
+``Idempotent-Replayed: true`` header); concurrent duplicates in the same
+process wait for the first execution instead of running again. Completed
+responses, with the headers the view set (e.g. ``Retry-After``), are kept in
+a bounded in-process cache and, when ``IDEMPOTENCY_SHARED`` is on, in
+Firestore so retries landing on another worker are deduplicated too. Server
+errors (5xx) are not stored or replayed: a duplicate that was waiting on a
+failed execution runs the request itself.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend.utils.cache import TTLCache
+from backend.utils.clients import get_firestore
+
+HEADER = 'Idempotency-Key'
+KEYS_COLLECTION = 'idempotency_keys'
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize=10000, ttl=24 * 3600, shared=True, wait_timeout=10.0):
+        self.ttl = ttl
+        self.shared = shared
+        self.wait_timeout = wait_timeout
+        self._completed = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def execute(self, key, fingerprint, fn):
+        """
+        Run ``fn()`` (returning ``(status_code, data, headers)``) once for ``key``.
+
+        Returns ``(status_code, data, headers, replayed)``.
+        """
+        while True:
+            cached = self._completed.get(key)
+            if cached is not None:
+                return self._replay(cached, fingerprint)
+
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+
+            if not leader:
+                try:
+                    record = future.result()
+                except Exception:
+                    continue
+                if record['status'] >= 500:
+                    # The first execution failed; that is not a result to replay
+                    continue
+                return self._replay(record, fingerprint)
+
+            try:
+                record = self._run(key, fingerprint, fn)
+                future.set_result(record)
+                return record['status'], record['data'], record.get('headers', {}), record.get('replayed', False)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def _replay(self, record, fingerprint):
+        if record['fingerprint'] != fingerprint:
+            return (
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                {'error': f'{HEADER} was already used with a different request'},
+                {},
+                False,
+            )
+        return record['status'], record['data'], record.get('headers', {}), True
+
+    def _run(self, key, fingerprint, fn):
+        if self.shared:
+            existing = self._reserve(key, fingerprint)
+            if existing is not None:
+                return existing
+
+        try:
+            status_code, data, headers = fn()
+        except BaseException:
+            if self.shared:
+                self._doc(key).delete()
+            raise
+
+        record = {'status': status_code, 'data': data, 'headers': headers, 'fingerprint': fingerprint}
+        if status_code < 500:
+            self._completed.set(key, record)
+            if self.shared:
+                self._doc(key).set({
+                    'state': 'completed',
+                    'status': status_code,
+                    'data': json.dumps(data, cls=JSONEncoder),
+                    'headers': headers,
+                    'fingerprint': fingerprint,
+                    'expires_at': timezone.now() + timedelta(seconds=self.ttl),
+                })
+        elif self.shared:
+            self._doc(key).delete()
+        return record
+
+    def _doc(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return get_firestore().collection(KEYS_COLLECTION).document(digest)
+
+    def _reserve(self, key, fingerprint):
+        """
+        Claim ``key`` across workers. Returns None if this process should run
+        the request, or the record to answer with otherwise.
+        """
+        from google.api_core.exceptions import AlreadyExists
+
+        doc_ref = self._doc(key)
+        reservation = {
+            'state': 'in_progress',
+            'fingerprint': fingerprint,
+            'expires_at': timezone.now() + timedelta(seconds=max(self.wait_timeout * 3, 60)),
+        }
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                doc_ref.create(reservation)
+                return None
+            except AlreadyExists:
+                pass
+
+            snapshot = doc_ref.get()
+            stored = snapshot.to_dict() if snapshot.exists else None
+            if stored is None:
+                continue
+            if stored['expires_at'] <= timezone.now():
+                # Abandoned reservation or expired result: start over
+                doc_ref.delete()
+                continue
+            if stored['state'] == 'completed':
+                record = {
+                    'status': stored['status'],
+                    'data': json.loads(stored['data']),
+                    'headers': stored.get('headers') or {},
+                    'fingerprint': stored['fingerprint'],
+                }
+                self._completed.set(key, record)
+                status_code, data, headers, replayed = self._replay(record, fingerprint)
+                return {
+                    'status': status_code, 'data': data, 'headers': headers,
+                    'fingerprint': fingerprint, 'replayed': replayed,
+                }
+            if time.monotonic() >= deadline:
+                return {
+                    'status': status.HTTP_409_CONFLICT,
+                    'data': {'error': f'A request with this {HEADER} is still in progress'},
+                    'fingerprint': fingerprint,
+                }
+            time.sleep(0.1)
+
+
+store = IdempotencyStore(
+    maxsize=getattr(settings, 'IDEMPOTENCY_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'IDEMPOTENCY_TTL', 24 * 3600),
+    shared=getattr(settings, 'IDEMPOTENCY_SHARED', True),
+)
+
+
+def get_idempotency_key(request):
+    return request.headers.get(HEADER) or None
+
+
+def idempotent(view_method):
+    """Deduplicate a ViewSet action on the request's ``Idempotency-Key`` header"""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = get_idempotency_key(request)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        scope = ':'.join(str(part) for part in (
+            request.user.id, self.basename, view_method.__name__, kwargs.get('pk', ''), key
+        ))
+        fingerprint = hashlib.sha256(
+            json.dumps(request.data, cls=JSONEncoder, sort_keys=True).encode()
+        ).hexdigest()
+
+        def run():
+            response = view_method(self, request, *args, **kwargs)
+            # The renderer sets the content type; everything else the view set is kept
+            headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+            return response.status_code, response.data, headers
+
+        status_code, data, headers, replayed = store.execute(scope, fingerprint, run)
+        if replayed:
+            headers = {**headers, 'Idempotent-Replayed': 'true'}
+        return Response(data, status=status_code, headers=headers)
+    return wrapper
@@ -0,0 +1,302 @@
+"""
+Deadlines, circuit breakers and bulkheads for backend dependencies.
+
+Each named dependency in ``settings.DEPENDENCIES`` (``catalog`` reads,
+``seats`` writes, ``payments`` calls) gets:
+
+* a bulkhead: at most ``max_concurrency`` calls in flight, so a slow
+  dependency cannot take every request thread with it;
+* a deadline: callers stop waiting after ``timeout`` seconds (the call keeps
+  its bulkhead slot until it actually returns);
+* a circuit breaker: after ``failure_threshold`` consecutive failures calls
+  are rejected immediately for ``reset_timeout`` seconds, then a single
+  probe is let through (half-open) to decide whether to close again.
+
+Rejections and failures surface as ``DependencyUnavailable``, which views turn
+into a 503 with ``Retry-After``. Read paths can use ``call_with_fallback`` to
+serve the last value that loaded successfully while the dependency is down.
+
+``FAULT_INJECTION`` (e.g. ``catalog:error=0.5,latency=2;payments:hang=1``)
+makes a dependency fail, slow down or hang locally to exercise all of this.
+"""
+import contextvars
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class DependencyUnavailable(Exception):
+    """
+    A dependency call was rejected, timed out or failed.
+
+    For a timeout, ``pending`` is the future of the call that was given up
+    on; it may still complete (see ``on_late_success``).
+    """
+
+    def __init__(self, dependency, reason, retry_after=1, pending=None):
+        self.dependency = dependency
+        self.reason = reason
+        self.retry_after = retry_after
+        self.pending = pending
+        super().__init__(f'{dependency} unavailable: {reason}')
+
+
+class InjectedFault(ConnectionError):
+    """Raised by fault injection in place of a real dependency error"""
+
+
+def is_dependency_failure(error):
+    """Whether an exception means the dependency itself is unhealthy (not e.g. a card decline)"""
+    if isinstance(error, OSError):  # includes ConnectionError and TimeoutError
+        return True
+    google_exceptions = sys.modules.get('google.api_core.exceptions')
+    if google_exceptions and isinstance(error, (
+        google_exceptions.ServerError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.RetryError,
+    )):
+        return True
+    stripe = sys.modules.get('stripe')
+    if stripe and isinstance(error, (stripe.APIConnectionError, stripe.APIError, stripe.RateLimitError)):
+        return True
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        return max(1, int(self.opened_at + self.reset_timeout - time.monotonic() + 0.999))
+
+    def acquire(self):
+        """Admit a call or raise ``DependencyUnavailable``; returns True for a half-open probe"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() < self.opened_at + self.reset_timeout:
+                    raise DependencyUnavailable(self.name, 'circuit open', self.retry_after())
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise DependencyUnavailable(self.name, 'circuit half-open, probe in flight')
+                self._probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        logger.warning('Circuit for %s %s -> %s', self.name, self.state, state)
+        self.state = state
+
+
+class FaultInjector:
+    """Injects errors, latency or hangs ahead of real calls"""
+
+    def __init__(self, error=0.0, latency=0.0, hang=0.0, hang_seconds=60.0):
+        self.error = error
+        self.latency = latency
+        self.hang = hang
+        self.hang_seconds = hang_seconds
+
+    def __call__(self, name):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.hang and random.random() < self.hang:
+            time.sleep(self.hang_seconds)
+        if self.error and random.random() < self.error:
+            raise InjectedFault(f'injected fault in {name}')
+
+
+def parse_fault_injection(spec):
+    """Parse ``name:error=0.5,latency=2;other:hang=1`` into ``{name: FaultInjector}``"""
+    faults = {}
+    for part in filter(None, (spec or '').split(';')):
+        name, _, options = part.partition(':')
+        values = dict(option.split('=', 1) for option in filter(None, options.split(',')))
+        faults[name.strip()] = FaultInjector(**{key.strip(): float(value) for key, value in values.items()})
+    return faults
+
+
+class Dependency:
+    """Bulkhead, deadline and circuit breaker around calls to one dependency"""
+
+    def __init__(self, name, timeout=5.0, max_concurrency=16, failure_threshold=5,
+                 reset_timeout=30.0, queue_timeout=0.05, stale_ttl=24 * 3600, faults=None):
+        self.name = name
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.faults = faults
+        self.stale = TTLCache(maxsize=1024, ttl=stale_ttl)
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f'dep-{name}')
+
+    def _invoke(self, fn, args, kwargs):
+        if self.faults is not None:
+            self.faults(self.name)
+        return fn(*args, **kwargs)
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` under this dependency's limits; dependency failures raise ``DependencyUnavailable``"""
+        probe = self.breaker.acquire()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            if probe:
+                self.breaker.release_probe()
+            self.rejected += 1
+            raise DependencyUnavailable(self.name, 'too many concurrent calls')
+
+        # Run on the dependency's own pool so the caller can stop waiting at the
+        # deadline; the context copy keeps tracing spans attached to the request.
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, self._invoke, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            if probe:
+                self.breaker.release_probe()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.breaker.record_failure()
+            raise DependencyUnavailable(self.name, f'no response within {self.timeout}s', pending=future)
+        except Exception as e:
+            if is_dependency_failure(e):
+                self.breaker.record_failure()
+                raise DependencyUnavailable(self.name, str(e)) from e
+            # The dependency answered; the error is the caller's to handle
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def call_with_fallback(self, key, fn, *args, keep=None, **kwargs):
+        """
+        Like ``call``, but remember each result under ``key`` and return the
+        last good value while the dependency is unavailable.
+
+        ``keep(value)``, when given, picks the part of a result that is safe
+        to serve stale. Returns ``(value, stale)``.
+        """
+        try:
+            value = self.call(fn, *args, **kwargs)
+        except DependencyUnavailable:
+            value = self.stale.get(key)
+            if value is None:
+                raise
+            logger.info('Serving stale %s for %s', self.name, key)
+            return value, True
+        if value is not None:
+            self.stale.set(key, keep(value) if keep else value)
+        return value, False
+
+    def snapshot(self):
+        return {
+            'state': self.breaker.state,
+            'failures': self.breaker.failures,
+            'rejected': self.rejected,
+            'stale_entries': len(self.stale),
+        }
+
+
+_dependencies = {}
+_lock = threading.Lock()
+
+
+def dependency(name):
+    """Return the shared ``Dependency`` configured for ``name`` in ``settings.DEPENDENCIES``"""
+    dep = _dependencies.get(name)
+    if dep is None:
+        with _lock:
+            dep = _dependencies.get(name)
+            if dep is None:
+                options = dict(getattr(settings, 'DEPENDENCIES', {}).get(name, {}))
+                faults = parse_fault_injection(getattr(settings, 'FAULT_INJECTION', ''))
+                dep = _dependencies[name] = Dependency(name, faults=faults.get(name), **options)
+    return dep
+
+
+def on_late_success(error, callback):
+    """
+    Run ``callback(result)`` if the call a deadline gave up on succeeds after all.
+
+    Writes that cannot be safely repeated use this to undo themselves once the
+    caller has already reported failure. Returns False when nothing is pending
+    (the call was rejected before it started, or failed outright).
+    """
+    future = getattr(error, 'pending', None)
+    if future is None:
+        return False
+
+    def done(finished):
+        if finished.cancelled() or finished.exception() is not None:
+            return
+        try:
+            callback(finished.result())
+        except Exception:
+            logger.exception('Compensating a late %s call failed', error.dependency)
+
+    future.add_done_callback(done)
+    return True
+
+
+def unavailable_response(error):
+    """503 response for a ``DependencyUnavailable``"""
+    return Response(
+        {'error': str(error), 'dependency': error.dependency},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def stale_response(data, stale):
+    """Response for a fallback read, flagged when it is last-known-good data"""
+    response = Response(data)
+    if stale:
+        response['X-Served-Stale'] = 'true'
+    return response
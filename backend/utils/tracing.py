@@ -0,0 +1,387 @@
+"""
+Lightweight request tracing.
+
+When ``TRACING_ENABLED`` is on, ``TracingMiddleware`` wraps every
+FirestoreService method, the underlying Firestore client calls, Stripe API
+requests and serializer ``data``/``is_valid`` in spans. Each request gets a
+trace whose spans record their parent, so a slow checkout shows whether
+``get_booking``, the seat write, ``PaymentIntent.retrieve`` or serialization
+took the time.
+
+Sampling is decided once per request (head-based, ``TRACING_SAMPLE_RATE``);
+sampled traces are kept in an in-process ring buffer served to staff at
+``/api/traces/``. Calls slower than their kind's threshold in
+``TRACING_SLOW_MS`` are logged as JSON to the ``backend.tracing`` logger
+whether or not the request was sampled.
+
+When tracing is disabled nothing is patched and the middleware removes
+itself, so the request path is unchanged.
+"""
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+
+logger = logging.getLogger('backend.tracing')
+
+MAX_SPANS_PER_TRACE = 1000
+
+_current = contextvars.ContextVar('tracing_span', default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+
+class Trace:
+    """All spans recorded for one request"""
+
+    def __init__(self, name, sampled, attrs=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.sampled = sampled
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.duration = None
+        self._ids = itertools.count(1)
+
+    def record(self, span, duration, error):
+        if not self.sampled:
+            return
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return
+        self.spans.append({
+            'id': span.id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'kind': span.kind,
+            'start_ms': round((span.start - self.origin) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+            'attrs': span.attrs,
+            'error': f'{type(error).__name__}: {error}' if error else None,
+        })
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'spans': len(self.spans),
+            'dropped': self.dropped,
+            **self.attrs,
+        }
+
+    def as_dict(self):
+        return {**self.summary(), 'spans': self.spans}
+
+
+class span:
+    """
+    Time a block as a child of the current span.
+
+    Outside a traced request only the slow-call threshold is checked.
+    """
+
+    __slots__ = ('name', 'kind', 'attrs', 'id', 'parent_id', 'trace', 'start', '_token')
+
+    def __init__(self, name, kind='internal', **attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+
+    def _start(self, make_current=True):
+        parent = _current.get()
+        self.trace = parent.trace if parent is not None else None
+        self.parent_id = parent.id if parent is not None else None
+        self.id = next(self.trace._ids) if self.trace is not None and self.trace.sampled else None
+        self._token = _current.set(self) if make_current and self.trace is not None else None
+        self.start = time.perf_counter()
+        return self
+
+    def _finish(self, error=None):
+        duration = time.perf_counter() - self.start
+        if self._token is not None:
+            _current.reset(self._token)
+        if self.trace is not None:
+            self.trace.record(self, duration, error)
+        threshold = _thresholds().get(self.kind)
+        if threshold is not None and duration * 1000 >= threshold:
+            _log_slow(self, duration, threshold, error)
+
+    def __enter__(self):
+        return self._start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc)
+        return False
+
+
+class _RootSpan:
+    """Stand-in parent for a trace's top-level spans"""
+
+    __slots__ = ('trace', 'id')
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.id = None
+
+
+def current_trace():
+    current = _current.get()
+    return current.trace if current is not None else None
+
+
+@functools.lru_cache(maxsize=1)
+def _thresholds():
+    return dict(getattr(settings, 'TRACING_SLOW_MS', {}))
+
+
+def _log_slow(span, duration, threshold, error):
+    trace = span.trace
+    logger.warning(json.dumps({
+        'event': 'slow_call',
+        'kind': span.kind,
+        'name': span.name,
+        'duration_ms': round(duration * 1000, 3),
+        'threshold_ms': threshold,
+        'trace_id': trace.id if trace is not None else None,
+        'sampled': trace.sampled if trace is not None else False,
+        'request': trace.name if trace is not None else None,
+        'error': type(error).__name__ if error else None,
+        **{key: value for key, value in span.attrs.items() if isinstance(value, (str, int, float, bool))},
+    }, default=str))
+
+
+class TraceBuffer:
+    """Fixed-size ring buffer of finished sampled traces"""
+
+    def __init__(self, size):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self):
+        with self._lock:
+            return list(reversed(self._traces))
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.id == trace_id:
+                    return trace
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+buffer = TraceBuffer(getattr(settings, 'TRACING_BUFFER_SIZE', 200))
+
+
+# Instrumentation
+
+def traced(fn, name, kind, describe=None, iterate=None):
+    """Wrap ``fn`` so each call runs in a span; ``describe(args, kwargs)`` adds attributes"""
+    if getattr(fn, '__traced__', False):
+        return fn
+    if iterate is None:
+        iterate = inspect.isgeneratorfunction(fn)
+
+    if iterate:
+        # Streams (Firestore ``stream``) are timed until exhausted or closed,
+        # without becoming the current span while the caller iterates.
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = span(name, kind, **(describe(args, kwargs) if describe else {}))._start(make_current=False)
+            try:
+                yield from fn(*args, **kwargs)
+            except BaseException as e:
+                current._finish(None if isinstance(e, GeneratorExit) else e)
+                raise
+            current._finish()
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind, **(describe(args, kwargs) if describe else {})):
+                return fn(*args, **kwargs)
+
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def _patch_class(cls, names, kind, describe=None, prefix=None):
+    prefix = prefix or cls.__name__
+    for attr in names:
+        raw = cls.__dict__.get(attr)
+        if raw is None:
+            continue
+        iterate = True if attr == 'stream' else None
+        if isinstance(raw, (staticmethod, classmethod)):
+            wrapped = traced(raw.__func__, f'{prefix}.{attr}', kind, describe, iterate)
+            setattr(cls, attr, type(raw)(wrapped))
+        elif callable(raw):
+            setattr(cls, attr, traced(raw, f'{prefix}.{attr}', kind, describe, iterate))
+
+
+def _path_of(args, kwargs):
+    target = args[0] if args else None
+    path = getattr(target, 'path', None) or getattr(target, '_path', None)
+    if isinstance(path, tuple):
+        path = '/'.join(path)
+    return {'path': path} if isinstance(path, str) else {}
+
+
+def _instrument_firestore_service():
+    from backend.utils.firebase_utils import FirestoreService
+    names = [name for name in vars(FirestoreService) if not name.startswith('_')]
+    _patch_class(FirestoreService, names, 'firestore')
+
+
+def _instrument_firestore_client():
+    try:
+        from google.cloud.firestore_v1 import batch, collection, document, query
+    except ImportError:
+        return
+    _patch_class(document.DocumentReference, ['get', 'set', 'update', 'create', 'delete'],
+                 'firestore.client', _path_of)
+    _patch_class(collection.CollectionReference, ['add', 'stream', 'get', 'list_documents'],
+                 'firestore.client', _path_of)
+    _patch_class(query.Query, ['stream', 'get'], 'firestore.client')
+    _patch_class(batch.WriteBatch, ['commit'], 'firestore.client')
+
+
+def _instrument_stripe():
+    try:
+        from stripe import api_requestor
+    except ImportError:
+        return
+
+    def describe(args, kwargs):
+        method = args[1] if len(args) > 1 else kwargs.get('method')
+        url = args[2] if len(args) > 2 else kwargs.get('url')
+        return {'method': str(method).upper(), 'url': url}
+
+    _patch_class(api_requestor.APIRequestor, ['request'], 'stripe', describe, prefix='stripe')
+
+
+def _instrument_serializers():
+    from rest_framework import serializers
+
+    base = serializers.BaseSerializer
+    data = base.__dict__['data']
+
+    def describe(args, kwargs):
+        return {'serializer': type(args[0]).__name__}
+
+    base.data = property(traced(data.fget, 'serializer.data', 'serializer', describe))
+    _patch_class(base, ['is_valid'], 'serializer', describe, prefix='serializer')
+
+
+def install():
+    """Patch the instrumented call sites (idempotent)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _instrument_firestore_service()
+        _instrument_firestore_client()
+        _instrument_stripe()
+        _instrument_serializers()
+        _installed = True
+
+
+class TracingMiddleware:
+    """Start a trace per request; a no-op removed from the stack when tracing is off"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRACING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        install()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'TRACING_SAMPLE_RATE', 0.1)
+
+    def __call__(self, request):
+        trace = Trace(
+            f'{request.method} {request.path}',
+            sampled=random.random() < self.sample_rate,
+            attrs={'method': request.method, 'path': request.path},
+        )
+        token = _current.set(_RootSpan(trace))
+        root = span('request', 'request', method=request.method, path=request.path)
+        root._start()
+        error = None
+        try:
+            response = self.get_response(request)
+            trace.attrs['status'] = response.status_code
+            if trace.sampled:
+                response['X-Trace-Id'] = trace.id
+            return response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            root._finish(error)
+            trace.duration = time.perf_counter() - trace.origin
+            _current.reset(token)
+            if trace.sampled:
+                buffer.add(trace)
+
+
+class TraceViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        """Get recent sampled traces, slowest-first with ?sort=duration"""
+        try:
+            traces = buffer.recent()
+            min_ms = request.query_params.get('min_ms')
+            if min_ms:
+                traces = [t for t in traces if t.duration * 1000 >= float(min_ms)]
+            if request.query_params.get('sort') == 'duration':
+                traces.sort(key=lambda t: t.duration, reverse=True)
+            return Response({
+                'enabled': getattr(settings, 'TRACING_ENABLED', False),
+                'sample_rate': getattr(settings, 'TRACING_SAMPLE_RATE', 0.1),
+                'traces': [t.summary() for t in traces],
+            })
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def retrieve(self, request, pk=None):
+        """Get one trace with all of its spans"""
+        try:
+            trace = buffer.get(pk)
+            if trace is None:
+                return Response(
+                    {'error': 'Trace not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(trace.as_dict())
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )